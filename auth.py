@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared authorization for FileStore Bot plugins
+
+Admin and ban checks read the live sets in the database, so admins added
+with /add_admin and users banned with /ban take effect immediately. The
+filters are async, so Pyrogram evaluates them on the event loop instead of
+handing each check to its thread pool.
+"""
+
+from pyrogram import Client, filters
+from config import Config
+
+def is_admin(client: Client, user_id: int) -> bool:
+    """Owner, configured admins (loaded into the database) and admins added at runtime"""
+    return user_id == Config.OWNER_ID or user_id in client.db.admins
+
+def is_banned(client: Client, user_id: int) -> bool:
+    """Banned users, excluding admins"""
+    return user_id in client.db.banned_users and not is_admin(client, user_id)
+
+async def admin_filter(_, client: Client, update) -> bool:
+    return bool(update.from_user) and is_admin(client, update.from_user.id)
+
+async def banned_filter(_, client: Client, update) -> bool:
+    return bool(update.from_user) and is_banned(client, update.from_user.id)
+
+# Work on messages and callback queries alike
+admin_only = filters.create(admin_filter, "AdminFilter")
+banned = filters.create(banned_filter, "BannedFilter")
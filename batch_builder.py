@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming batch builder for FileStore Bot
+
+Scans a message range or ID list in chunks as a background job, marking
+media-bearing messages in a BatchManifest. Memory stays bounded by the
+manifest bitmap, progress is reported by editing the status message, and
+every chunk is checkpointed to JSON so unfinished jobs resume after a
+restart.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from pyrogram.errors import FloodWait
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config import Config
+from database.models import BatchManifest
+from helper_func import encode_link, LINK_BATCH, has_media, get_media_meta
+
+logger = logging.getLogger(__name__)
+
+# Telegram returns at most 200 messages per get_messages call
+MANIFEST_CHUNK_SIZE = 200
+PROGRESS_INTERVAL = 5  # seconds between progress edits
+
+class BatchBuilder:
+    def __init__(self, client, checkpoint_dir: Optional[str] = None, max_jobs: int = 2):
+        self.client = client
+        self.checkpoint_dir = checkpoint_dir or Config.BATCH_CHECKPOINT_DIR
+        
+        self.jobs: Dict[int, Dict] = {}  # job_id -> job state
+        self.tasks: Dict[int, asyncio.Task] = {}  # job_id -> running task
+        self.semaphore = asyncio.Semaphore(max_jobs)
+    
+    async def submit(self, user_id: int, chat_id: int, status_message_id: int, channel_id, channel_link: str,
+                     first_message_id: Optional[int] = None, last_message_id: Optional[int] = None,
+                     message_ids: Optional[List[int]] = None) -> int:
+        """Queue a batch build job and return its ID"""
+        if message_ids:
+            manifest = BatchManifest.from_ids(channel_id, message_ids)
+        else:
+            manifest = BatchManifest.from_range(channel_id, first_message_id, last_message_id)
+        
+        job_id = self.client.db.id_allocator.next_id()
+        job = {
+            'job_id': job_id,
+            'user_id': user_id,
+            'chat_id': chat_id,
+            'status_message_id': status_message_id,
+            'channel_id': channel_id,
+            'channel_link': channel_link,
+            'batch_type': 'custom' if message_ids else 'range',
+            'first_message_id': manifest.first_message_id,
+            'last_message_id': manifest.last_message_id,
+            'message_ids': message_ids,
+            'position': 0,
+            'processed': 0,
+            'skipped': 0,
+            'errors': 0,
+            'started_at': time.time()
+        }
+        
+        self._checkpoint(job, manifest)
+        self._start(job, manifest)
+        return job_id
+    
+    async def resume(self) -> int:
+        """Restart jobs left unfinished by a previous run"""
+        if not os.path.isdir(self.checkpoint_dir):
+            return 0
+        
+        resumed = 0
+        for name in os.listdir(self.checkpoint_dir):
+            if not name.endswith(".json"):
+                continue
+            
+            path = os.path.join(self.checkpoint_dir, name)
+            try:
+                with open(path) as f:
+                    job = json.load(f)
+                manifest = self._manifest(job)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable batch checkpoint {path}: {e}")
+                continue
+            
+            self._start(job, manifest)
+            resumed += 1
+        
+        if resumed:
+            logger.info(f"Resumed {resumed} batch build jobs")
+        return resumed
+    
+    async def cancel(self, job_id: int) -> bool:
+        """Cancel a running job and discard its checkpoint"""
+        task = self.tasks.pop(job_id, None)
+        if not task:
+            return False
+        
+        task.cancel()
+        self.jobs.pop(job_id, None)
+        self._remove_checkpoint(job_id)
+        return True
+    
+    async def stop(self):
+        """Stop all jobs, keeping their checkpoints for resume"""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+    
+    def _start(self, job: Dict, manifest: BatchManifest):
+        """Run a job in the background"""
+        self.jobs[job['job_id']] = job
+        self.tasks[job['job_id']] = asyncio.create_task(self._run(job, manifest))
+    
+    def _manifest(self, job: Dict) -> BatchManifest:
+        """Rebuild a job's manifest from its checkpoint"""
+        if job['message_ids']:
+            manifest = BatchManifest.from_ids(job['channel_id'], job['message_ids'])
+        else:
+            manifest = BatchManifest.from_range(job['channel_id'], job['first_message_id'], job['last_message_id'])
+        
+        if job.get('media_bitmap'):
+            manifest.media_bitmap = bytearray(base64.b64decode(job['media_bitmap']))
+        return manifest
+    
+    def _checkpoint_path(self, job_id: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"{job_id}.json")
+    
+    def _checkpoint(self, job: Dict, manifest: BatchManifest):
+        """Atomically persist a job's progress"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        job['media_bitmap'] = base64.b64encode(manifest.media_bitmap).decode()
+        
+        path = self._checkpoint_path(job['job_id'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+    
+    def _remove_checkpoint(self, job_id: int):
+        try:
+            os.remove(self._checkpoint_path(job_id))
+        except FileNotFoundError:
+            pass
+    
+    async def _run(self, job: Dict, manifest: BatchManifest):
+        """Scan the remaining chunks of a job, then save the batch"""
+        try:
+            async with self.semaphore:
+                last_report = 0.0
+                
+                while job['position'] < len(manifest):
+                    await self._scan_chunk(job, manifest)
+                    self._checkpoint(job, manifest)
+                    
+                    if time.time() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.time()
+                        await self._report_progress(job, manifest)
+                
+                await self._finish(job, manifest)
+        
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch build job {job['job_id']} failed: {e}")
+            await self._edit_status(job, f"❌ Error creating batch: {str(e)}")
+            self._remove_checkpoint(job['job_id'])
+        finally:
+            self.tasks.pop(job['job_id'], None)
+            self.jobs.pop(job['job_id'], None)
+    
+    async def _scan_chunk(self, job: Dict, manifest: BatchManifest):
+        """Fetch the next chunk of messages and mark the media-bearing ones"""
+        positions = range(job['position'], min(job['position'] + MANIFEST_CHUNK_SIZE, len(manifest)))
+        message_ids = [manifest.message_id_at(position) for position in positions]
+        
+        try:
+            messages = await self.client.get_messages(manifest.channel_id, message_ids)
+        except FloodWait as e:
+            # Retry the same chunk after the wait
+            await asyncio.sleep(e.value)
+            return
+        except Exception as e:
+            logger.error(f"Error fetching messages {message_ids[0]}-{message_ids[-1]}: {e}")
+            job['errors'] += len(message_ids)
+            job['position'] = positions[-1] + 1
+            return
+        
+        by_id = {channel_msg.id: channel_msg for channel_msg in messages if channel_msg}
+        for position, msg_id in zip(positions, message_ids):
+            channel_msg = by_id.get(msg_id)
+            if not has_media(channel_msg):
+                job['skipped'] += 1
+                continue
+            
+            manifest.set_media(position)
+            await self.client.db.cache_message_meta(manifest.channel_id, msg_id, get_media_meta(channel_msg))
+            job['processed'] += 1
+        
+        job['position'] = positions[-1] + 1
+        
+        # Small delay to avoid flood
+        await asyncio.sleep(0.5)
+    
+    async def _edit_status(self, job: Dict, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Edit the job's status message, ignoring edit failures"""
+        try:
+            await self.client.edit_message_text(
+                job['chat_id'], job['status_message_id'], text,
+                reply_markup=reply_markup, disable_web_page_preview=True
+            )
+        except Exception as e:
+            logger.debug(f"Could not update batch job status: {e}")
+    
+    async def _report_progress(self, job: Dict, manifest: BatchManifest):
+        """Show scan progress with a cancel button"""
+        progress = job['position'] / len(manifest) * 100
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_batch_job_{job['job_id']}")]
+        ])
+        
+        await self._edit_status(
+            job,
+            f"🔄 Processing {'custom ' if job['batch_type'] == 'custom' else ''}batch... "
+            f"({job['position']}/{len(manifest)})\n"
+            f"✅ Processed: {job['processed']}\n"
+            f"⏭️ Skipped: {job['skipped']}\n"
+            f"❌ Errors: {job['errors']}\n\n"
+            f"⏳ **Progress:** `{progress:.1f}%`",
+            keyboard
+        )
+    
+    async def _finish(self, job: Dict, manifest: BatchManifest):
+        """Save the finished manifest as a batch and post its link"""
+        self._remove_checkpoint(job['job_id'])
+        
+        if not job['processed']:
+            where = "messages" if job['batch_type'] == 'custom' else "range"
+            await self._edit_status(job, f"❌ No valid media files found in the specified {where}!")
+            return
+        
+        batch_data = {
+            'user_id': job['user_id'],
+            'channel_id': job['channel_id'],
+            'manifest': manifest,
+            'first_message_id': job['first_message_id'],
+            'last_message_id': job['last_message_id'],
+            'total_files': job['processed'],
+            'channel_link': job['channel_link']
+        }
+        if job['batch_type'] == 'custom':
+            # The manifest already holds the IDs compactly; the plain list only lives in the checkpoint
+            batch_data['batch_type'] = 'custom'
+        
+        # Save batch to database
+        batch_id = await self.client.db.save_batch("", batch_data)
+        
+        # Generate shareable link
+        encoded_data = encode_link(LINK_BATCH, batch_id)
+        share_link = f"https://t.me/{self.client.username}?start={encoded_data}"
+        
+        if job['batch_type'] == 'custom':
+            title = "Custom Batch"
+            scope = f"📊 **Selected Messages:** `{len(manifest)}`"
+        else:
+            title = "Batch"
+            scope = f"📊 **Range:** `{job['first_message_id']}` to `{job['last_message_id']}`"
+        
+        # Create response
+        response_text = f"""
+✅ **{title} Created Successfully!**
+
+📦 **Total Files:** `{job['processed']}`
+✅ **Processed:** `{job['processed']}`
+⏭️ **Skipped:** `{job['skipped']}`
+❌ **Errors:** `{job['errors']}`
+
+{scope}
+📁 **Channel:** `{job['channel_id']}`
+
+🔗 **Batch Link:**
+`{share_link}`
+
+📋 **Quick Copy:**
+{share_link}
+"""
+        
+        # Create keyboard
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔗 Open Batch", url=share_link)],
+            [
+                InlineKeyboardButton("📋 Copy Link", callback_data=f"copy_batch_{encoded_data}"),
+                InlineKeyboardButton("📤 Share", switch_inline_query=share_link)
+            ],
+            [InlineKeyboardButton("🗑️ Delete Batch", callback_data=f"delete_batch_{batch_id}")]
+        ])
+        
+        await self._edit_status(job, response_text, keyboard)
+        
+        logger.info(f"Created {job['batch_type']} batch {batch_id} with {job['processed']} files by user {job['user_id']}")
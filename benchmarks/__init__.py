@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for the FileStore Bot
+
+Benchmarks run without Telegram credentials, so placeholder values are
+provided for the variables that Config validates on import.
+"""
+
+import os
+
+_BENCH_ENV = {
+    "API_HASH": "benchmark",
+    "APP_ID": "1",
+    "TG_BOT_TOKEN": "0:benchmark",
+    "OWNER_ID": "1",
+    "CHANNEL_ID": "-1000000000001",
+}
+
+for _key, _value in _BENCH_ENV.items():
+    os.environ.setdefault(_key, _value)
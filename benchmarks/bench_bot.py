@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end handler benchmarks against the fake Pyrogram client
+
+Drives the real plugin handlers through benchmarks.fake_client.FakeClient:
+
+    python -m benchmarks.bench_bot --latency-ms 2 --flood-rate 0.01 --output bench.json
+    python -m benchmarks.bench_bot --scenario viral_link --requests 5000 --compare bench.json
+
+Scenarios: viral_link, batch_delivery, broadcast, force_sub_start, channel_ingest.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import benchmarks  # noqa: F401  (placeholder Config environment)
+from benchmarks.common import latency_summary, print_report, save_report, compare_reports
+from benchmarks.fake_client import FakeClient
+from config import Config
+from database.models import BatchManifest
+from helper_func import encode_link, LINK_FILE, LINK_BATCH, get_media_meta
+from plugins import broadcast, channel_post, start
+
+async def run_concurrently(count: int, concurrency: int, one: Callable[[int], Awaitable]) -> List[float]:
+    """Run one(i) for i in range(count) with bounded concurrency, returning per-call latencies"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def timed(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await one(i)
+            latencies.append(time.perf_counter() - started)
+    
+    await asyncio.gather(*(timed(i) for i in range(count)))
+    return latencies
+
+def summarize(client: FakeClient, operations: int, elapsed: float, latencies: Optional[List[float]] = None) -> Dict:
+    """Throughput, latency and API call figures of one scenario"""
+    return {
+        'operations': operations,
+        'elapsed_s': elapsed,
+        'throughput_ops': operations / elapsed if elapsed else 0.0,
+        **(latency_summary(latencies) if latencies is not None else {}),
+        'api_calls': sum(client.calls.values()),
+        'flood_waits': sum(client.flood_waits.values()),
+        **{f"calls_{method}": count for method, count in sorted(client.calls.items())},
+    }
+
+async def viral_link(client: FakeClient, args) -> Dict:
+    """Many users opening the same file link at once"""
+    post = client.add_channel_post(Config.CHANNEL_ID, "viral.mp4", 50 * 1024 * 1024)
+    file_id = await client.db.save_file("", {
+        'user_id': 1, 'channel_id': Config.CHANNEL_ID, 'message_id': post.id,
+        'upload_date': "2024-01-01 00:00:00", **get_media_meta(post)
+    })
+    token = encode_link(LINK_FILE, file_id)
+    
+    started = time.perf_counter()
+    latencies = await run_concurrently(args.requests, args.concurrency, lambda i: start.start_command(
+        client, client.make_user_message(10_000 + i, f"/start {token}")
+    ))
+    return summarize(client, args.requests, time.perf_counter() - started, latencies)
+
+async def batch_delivery(client: FakeClient, args) -> Dict:
+    """Users paging through a large manifest batch to the end"""
+    posts = [client.add_channel_post(Config.CHANNEL_ID, f"part{i}.mkv", 700 * 1024 * 1024) for i in range(args.batch_size)]
+    manifest = BatchManifest.from_range(Config.CHANNEL_ID, posts[0].id, posts[-1].id)
+    for position in range(len(manifest)):
+        manifest.set_media(position)
+    
+    batch_id = await client.db.save_batch("", {
+        'user_id': 1, 'channel_id': Config.CHANNEL_ID, 'manifest': manifest,
+        'first_message_id': posts[0].id, 'last_message_id': posts[-1].id,
+        'total_files': len(posts), 'channel_link': ""
+    })
+    token = encode_link(LINK_BATCH, batch_id)
+    
+    async def one(i: int):
+        user_id = 20_000 + i
+        message = client.make_user_message(user_id, f"/start {token}")
+        await start.start_command(client, message)
+        
+        # Keep pressing "More" until the cursor is cleared
+        batch_data = await client.db.get_batch(batch_id, record_access=False)
+        while await client.db.get_batch_cursor(user_id, batch_id):
+            await start.send_batch_to_user(client, message, user_id, batch_id, batch_data)
+    
+    started = time.perf_counter()
+    latencies = await run_concurrently(args.batch_users, args.batch_users, one)
+    result = summarize(client, args.batch_users, time.perf_counter() - started, latencies)
+    result['files_delivered'] = client.calls['copy_message']
+    result['files_per_s'] = result['files_delivered'] / result['elapsed_s'] if result['elapsed_s'] else 0.0
+    return result
+
+async def broadcast_all(client: FakeClient, args) -> Dict:
+    """A broadcast to every stored user"""
+    for user_id in range(1, args.users + 1):
+        await client.db.add_user(user_id)
+    
+    admin_chat = Config.OWNER_ID
+    broadcast_msg = await client.send_message(admin_chat, "📢 Benchmark broadcast")
+    status_msg = await client.send_message(admin_chat, "Starting broadcast...")
+    client.reset_stats()
+    broadcast.BROADCAST_DELAY = args.broadcast_delay
+    
+    started = time.perf_counter()
+    await broadcast.start_broadcast(client, status_msg, broadcast_msg, "normal")
+    elapsed = time.perf_counter() - started
+    
+    # Recipients are served one after another, so only the mean time per recipient is observable
+    result = summarize(client, args.users, elapsed)
+    result['per_recipient_ms'] = elapsed / args.users * 1000 if args.users else 0.0
+    return result
+
+async def force_sub_start(client: FakeClient, args) -> Dict:
+    """Plain /start with several force-subscription channels to check"""
+    for i in range(args.channels):
+        await client.db.add_force_sub_channel(-1_000_000_000_100 - i)
+    await client.db.set_force_sub_enabled(True)
+    
+    started = time.perf_counter()
+    latencies = await run_concurrently(args.requests, args.concurrency, lambda i: start.start_command(
+        client, client.make_user_message(30_000 + i, "/start")
+    ))
+    return summarize(client, args.requests, time.perf_counter() - started, latencies)
+
+async def channel_ingest(client: FakeClient, args) -> Dict:
+    """A burst of new posts in the storage channel"""
+    posts = [client.add_channel_post(Config.CHANNEL_ID, f"upload{i}.pdf", 4 * 1024 * 1024) for i in range(args.posts)]
+    
+    started = time.perf_counter()
+    latencies = await run_concurrently(args.posts, args.concurrency, lambda i: channel_post.handle_channel_post(client, posts[i]))
+    result = summarize(client, args.posts, time.perf_counter() - started, latencies)
+    result['files_stored'] = len(client.db.files)
+    return result
+
+SCENARIOS = {
+    'viral_link': viral_link,
+    'batch_delivery': batch_delivery,
+    'broadcast': broadcast_all,
+    'force_sub_start': force_sub_start,
+    'channel_ingest': channel_ingest,
+}
+
+async def run_scenario(name: str, args) -> Dict:
+    """Run one scenario on a fresh fake client"""
+    client = FakeClient(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        flood_rate=args.flood_rate,
+        flood_seconds=args.flood_seconds,
+        seed=args.seed,
+        delivery_rate=args.delivery_rate,
+        delivery_user_interval=args.delivery_user_interval,
+    )
+    client.db.admins.add(Config.OWNER_ID)
+    client.delivery.start()
+    try:
+        return await SCENARIOS[name](client, args)
+    finally:
+        await client.delivery.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plugin handlers against a fake Pyrogram client")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario (repeatable, default: all)")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Latency of every fake API call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Probability that an API call hits a FloodWait")
+    parser.add_argument("--flood-seconds", type=int, default=1, help="Injected FloodWait length")
+    parser.add_argument("--requests", type=int, default=1000, help="/start requests (viral_link, force_sub_start)")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=500, help="Files in the batch (batch_delivery)")
+    parser.add_argument("--batch-users", type=int, default=20, help="Users paging through the batch")
+    parser.add_argument("--users", type=int, default=100_000, help="Broadcast recipients")
+    parser.add_argument("--broadcast-delay", type=float, default=0.0, help="Pause between broadcast recipients")
+    parser.add_argument("--channels", type=int, default=3, help="Force-sub channels (force_sub_start)")
+    parser.add_argument("--posts", type=int, default=5000, help="Channel posts (channel_ingest)")
+    parser.add_argument("--delivery-rate", type=float, default=10_000.0, help="DeliveryScheduler sends per second")
+    parser.add_argument("--delivery-user-interval", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Compare with a previous JSON report")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.CRITICAL)
+    
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        results[name] = asyncio.run(run_scenario(name, args))
+    
+    print_report("Bot handler benchmark", results)
+    
+    if args.compare:
+        changes = compare_reports(args.compare, results)
+        if changes is not None:
+            print_report(f"Change vs {args.compare}", changes)
+    if args.output:
+        save_report(args.output, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput and memory benchmark for database.Database
+
+Loads a synthetic population of users, files and batches into a fresh
+Database, then times the data layer operations:
+
+    python -m benchmarks.bench_database --users 100000 --files 100000 --batches 10000
+    python -m benchmarks.bench_database --files 1000000 --output db.json --compare db_before.json
+
+The store lives in memory only, so "startup load" is the time to rebuild
+the population from scratch. Memory per record is measured in a separate
+pass under tracemalloc, which would otherwise slow the timed runs.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import benchmarks  # noqa: F401  (placeholder Config environment)
+from benchmarks.common import print_report, save_report, compare_reports
+from config import Config
+from database.database import Database
+from database.models import BatchManifest
+from helper_func import get_size
+
+FILE_TYPES = ("document", "video", "audio", "photo")
+UPLOADERS = 100  # files are spread over this many uploading admins
+
+def synthetic_file(i: int, rng: random.Random) -> Dict:
+    """File record shaped like the ones channel_post.py stores"""
+    file_size = rng.randint(10 * 1024, 2000 * 1024 * 1024)
+    return {
+        'user_id': i % UPLOADERS + 1,
+        'channel_id': Config.CHANNEL_ID,
+        'message_id': i + 1,
+        'file_name': f"Some.Show.S01E{i % 100:02d}.1080p.WEB-DL.{i}.mkv",
+        'file_size': file_size,
+        'file_size_human': get_size(file_size),
+        'file_type': FILE_TYPES[i % len(FILE_TYPES)],
+        'file_hash': f"AgADhash{i:012d}",
+        'upload_date': "2024-01-01 00:00:00"
+    }
+
+def synthetic_batch(i: int, batch_files: int) -> Dict:
+    """Manifest batch over a range of channel posts, as the batch builder saves it"""
+    first = i * batch_files + 1
+    manifest = BatchManifest.from_range(Config.CHANNEL_ID, first, first + batch_files - 1)
+    for position in range(len(manifest)):
+        manifest.set_media(position)
+    
+    return {
+        'user_id': i % UPLOADERS + 1,
+        'channel_id': Config.CHANNEL_ID,
+        'manifest': manifest,
+        'first_message_id': first,
+        'last_message_id': first + batch_files - 1,
+        'total_files': batch_files,
+        'channel_link': ""
+    }
+
+def timed(operations: int, elapsed: float) -> Dict:
+    return {
+        'operations': operations,
+        'elapsed_s': elapsed,
+        'ops_per_s': operations / elapsed if elapsed else 0.0,
+        'us_per_op': elapsed / operations * 1e6 if operations else 0.0
+    }
+
+async def measure(operations: int, step: Callable) -> Dict:
+    """Await step(i) for each i and time the whole run"""
+    started = time.perf_counter()
+    for i in range(operations):
+        await step(i)
+    return timed(operations, time.perf_counter() - started)
+
+async def load(db: Database, args, rng: random.Random) -> Tuple[Dict[str, Dict], List[int]]:
+    """Populate a fresh database, timing each record type; returns the results and the file IDs"""
+    results = {}
+    file_ids: List[int] = []
+    
+    results['load_users'] = await measure(args.users, lambda i: db.add_user(i + 1, "en"))
+    
+    async def save_file(i: int):
+        file_ids.append(await db.save_file("", synthetic_file(i, rng)))
+    results['load_files'] = await measure(args.files, save_file)
+    
+    results['load_batches'] = await measure(
+        args.batches, lambda i: db.save_batch("", synthetic_batch(i, args.batch_files))
+    )
+    
+    total = sum(result['elapsed_s'] for result in results.values())
+    results['startup_load'] = timed(args.users + args.files + args.batches, total)
+    return results, file_ids
+
+async def run_timings(args) -> Dict[str, Dict]:
+    """Time every data layer operation against one populated database"""
+    rng = random.Random(args.seed)
+    db = Database()
+    results, file_ids = await load(db, args, rng)
+    
+    lookups = [rng.choice(file_ids) for _ in range(args.lookups)] if file_ids else []
+    results['get_file'] = await measure(len(lookups), lambda i: db.get_file(lookups[i]))
+    results['get_file_no_access'] = await measure(len(lookups), lambda i: db.get_file(lookups[i], record_access=False))
+    
+    results['get_user_files'] = await measure(args.queries, lambda i: db.get_user_files(i % UPLOADERS + 1))
+    results['get_user_files']['files_per_user'] = args.files // UPLOADERS
+    
+    results['get_stats'] = await measure(args.queries, lambda i: db.get_stats())
+    
+    # Cleanup sweeps: one over a store with nothing expired, one with a tenth of the files expired
+    await db.set_auto_delete_enabled(True)
+    db.auto_delete_time = 3600
+    started = time.perf_counter()
+    await db.cleanup_expired_files()
+    results['cleanup_sweep_none_expired'] = timed(len(db.files), time.perf_counter() - started)
+    
+    expired = file_ids[::10]
+    for file_id in expired:
+        db.files[file_id]['created_at'] -= 7200
+    logging.disable(logging.INFO)  # one log line per deleted file
+    started = time.perf_counter()
+    deleted = await db.cleanup_expired_files()
+    results['cleanup_sweep_10pct_expired'] = timed(len(expired), time.perf_counter() - started)
+    results['cleanup_sweep_10pct_expired']['deleted'] = deleted or 0
+    
+    started = time.perf_counter()
+    await db.cleanup_expired_batches()
+    results['cleanup_sweep_batches'] = timed(len(db.batches), time.perf_counter() - started)
+    logging.disable(logging.NOTSET)
+    
+    # Deletes go last since they shrink the store
+    remaining = [file_id for file_id in file_ids if file_id in db.files]
+    victims = rng.sample(remaining, min(args.deletes, len(remaining)))
+    results['delete_file'] = await measure(len(victims), lambda i: db.delete_file(victims[i]))
+    
+    return results
+
+async def run_memory(args) -> Dict:
+    """Measure bytes retained per user, file and batch under tracemalloc"""
+    rng = random.Random(args.seed)
+    gc.collect()
+    tracemalloc.start()
+    
+    db = Database()
+    baseline = tracemalloc.get_traced_memory()[0]
+    
+    for i in range(args.users):
+        await db.add_user(i + 1, "en")
+    after_users = tracemalloc.get_traced_memory()[0]
+    
+    file_ids = []
+    for i in range(args.files):
+        file_ids.append(await db.save_file("", synthetic_file(i, rng)))
+    after_files = tracemalloc.get_traced_memory()[0]
+    
+    for i in range(args.batches):
+        await db.save_batch("", synthetic_batch(i, args.batch_files))
+    after_batches, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        'bytes_per_user': (after_users - baseline) / args.users if args.users else 0.0,
+        'bytes_per_file': (after_files - after_users) / args.files if args.files else 0.0,
+        'bytes_per_batch': (after_batches - after_files) / args.batches if args.batches else 0.0,
+        'total_mb': (after_batches - baseline) / 1024 / 1024,
+        'traced_peak_mb': peak / 1024 / 1024
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark database.Database throughput and memory")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--batches", type=int, default=10_000)
+    parser.add_argument("--batch-files", type=int, default=50, help="Channel posts per synthetic batch")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Random get_file calls")
+    parser.add_argument("--queries", type=int, default=1_000, help="get_user_files / get_stats calls")
+    parser.add_argument("--deletes", type=int, default=10_000, help="Random delete_file calls")
+    parser.add_argument("--skip-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Compare with a previous JSON report")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    results = asyncio.run(run_timings(args))
+    if not args.skip_memory:
+        gc.collect()
+        results['memory'] = asyncio.run(run_memory(args))
+    results.setdefault('memory', {})['peak_rss_mb'] = peak_rss_mb()
+    
+    print_report(f"Database benchmark ({args.users} users, {args.files} files, {args.batches} batches)", results)
+    
+    if args.compare:
+        changes = compare_reports(args.compare, results)
+        if changes is not None:
+            print_report(f"Change vs {args.compare}", changes)
+    if args.output:
+        save_report(args.output, results)
+
+if __name__ == "__main__":
+    main()
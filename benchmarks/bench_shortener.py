@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shortener throughput and tail-latency benchmark
+
+Runs URLShortener against the local fake shortener server:
+
+    python -m benchmarks.bench_shortener --site is.gd --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import benchmarks  # noqa: F401  (placeholder Config environment)
+from benchmarks.common import latency_summary, print_report, save_report, compare_reports
+from benchmarks.fake_shortener import FakeShortenerServer
+from shortener import URLShortener
+
+async def run_benchmark(site: str, requests: int, concurrency: int, server: FakeShortenerServer) -> Dict:
+    """Shorten `requests` URLs through `site` with `concurrency` workers"""
+    base_url = await server.start()
+    
+    shortener = URLShortener(api_base=base_url)
+    shortener.enabled = True
+    shortener.site = site
+    shortener.api_key = "benchmark"
+    
+    latencies = []
+    shortened = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(i: int):
+        nonlocal shortened
+        long_url = f"https://t.me/FileStoreBot?start=bench{i}"
+        async with semaphore:
+            started = time.perf_counter()
+            result = await shortener.shorten_url(long_url)
+            latencies.append(time.perf_counter() - started)
+        if result != long_url:
+            shortened += 1
+    
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await server.stop()
+    
+    return {
+        'site': site,
+        'requests': requests,
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'throughput_rps': requests / elapsed if elapsed else 0.0,
+        'shortened': shortened,
+        'fallbacks': requests - shortened,
+        **latency_summary(latencies),
+        **{f"server_{k}": v for k, v in server.stats.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark URLShortener against the local fake server")
+    parser.add_argument("--site", action="append", help="Shortener site (repeatable, default: all)")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Compare with a previous JSON report")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    sites = args.site or [site for site in URLShortener().get_supported_sites() if site != "tiny.cc"]
+    results = {}
+    for site in sites:
+        server = FakeShortenerServer(
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit,
+            seed=0,
+        )
+        results[site] = asyncio.run(run_benchmark(site, args.requests, args.concurrency, server))
+    
+    print_report("Shortener benchmark", results)
+    
+    if args.compare:
+        changes = compare_reports(args.compare, results)
+        if changes is not None:
+            print_report(f"Change vs {args.compare}", changes)
+    if args.output:
+        save_report(args.output, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for benchmark reports
+"""
+
+import json
+import math
+from typing import Dict, List, Optional
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Get the pct-th percentile of samples (nearest-rank)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def latency_summary(samples: List[float]) -> Dict:
+    """Summarise latency samples (seconds) in milliseconds"""
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000 if samples else 0.0,
+    }
+
+def print_report(title: str, results: Dict[str, Dict]):
+    """Print benchmark results as an aligned table"""
+    print(f"\n{title}")
+    print("=" * len(title))
+    for name, metrics in results.items():
+        print(f"\n{name}")
+        for key, value in metrics.items():
+            if isinstance(value, float):
+                value = f"{value:,.3f}"
+            print(f"  {key:<24} {value}")
+
+def save_report(path: str, results: Dict[str, Dict]):
+    """Save benchmark results as JSON for comparison across commits"""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def compare_reports(baseline_path: str, results: Dict[str, Dict]) -> Optional[Dict[str, Dict]]:
+    """Compare results with a saved baseline and return relative changes"""
+    try:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    changes = {}
+    for name, metrics in results.items():
+        old = baseline.get(name, {})
+        for key, value in metrics.items():
+            old_value = old.get(key)
+            if isinstance(value, (int, float)) and isinstance(old_value, (int, float)) and old_value:
+                changes.setdefault(name, {})[key] = f"{(value - old_value) / old_value * 100:+.1f}%"
+    return changes
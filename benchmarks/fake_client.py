@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process stand-in for the Pyrogram client
+
+FakeClient implements the client methods the plugins call (get_messages,
+copy_message, send_media_group, get_chat_member, delete_messages,
+edit_message_text and friends) against an in-memory storage channel, with
+configurable per-call latency and FloodWait injection. It carries the same
+db and delivery attributes as Bot, and the messages and callback queries
+it builds are Message and CallbackQuery instances carrying what Pyrogram's
+filters inspect, so plugin handlers can be driven directly or through
+their filters without Telegram.
+"""
+
+import asyncio
+import itertools
+import random
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+from pyrogram.enums import ChatType, MessageMediaType
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message, CallbackQuery
+from database.database import Database
+from delivery import DeliveryScheduler
+
+MEDIA_FIELDS = ('document', 'video', 'audio', 'photo', 'animation', 'voice', 'video_note', 'sticker')
+
+class FakeMessage(Message):
+    """Message with the attributes and bound methods the plugins use"""
+    
+    # Subclassing only satisfies the isinstance checks in Pyrogram's filters; Message.__init__ is not run
+    def __init__(self, client: "FakeClient", chat_id: int, message_id: int, text: Optional[str] = None,
+                 document: Optional[SimpleNamespace] = None, from_user: Optional[SimpleNamespace] = None,
+                 command: Optional[List[str]] = None, empty: bool = False, chat_type: ChatType = ChatType.PRIVATE):
+        self._client = client
+        self.id = message_id
+        self.chat = SimpleNamespace(id=chat_id, title=f"chat {chat_id}", username=None, type=chat_type)
+        self.from_user = from_user
+        self.date = datetime.now()
+        self.text = text
+        self.caption = None
+        self.command = command
+        self.empty = empty
+        self.reply_to_message = None
+        
+        for field in MEDIA_FIELDS:
+            setattr(self, field, None)
+        self.document = document
+        self.media = MessageMediaType.DOCUMENT if document else None
+        self.outgoing = False
+    
+    async def copy(self, chat_id: int, caption: Optional[str] = None, **kwargs) -> "FakeMessage":
+        return await self._client.copy_message(chat_id, self.chat.id, self.id, caption=caption, **kwargs)
+    
+    async def forward(self, chat_id: int, **kwargs) -> "FakeMessage":
+        return await self._client.forward_messages(chat_id, self.chat.id, self.id)
+    
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        return await self._client.send_message(self.chat.id, text, **kwargs)
+    
+    async def reply_photo(self, photo: str, caption: Optional[str] = None, **kwargs) -> "FakeMessage":
+        return await self._client.send_photo(self.chat.id, photo, caption=caption, **kwargs)
+    
+    async def reply_document(self, document: str, **kwargs) -> "FakeMessage":
+        return await self._client.send_document(self.chat.id, document, **kwargs)
+    
+    async def edit_text(self, text: str, **kwargs) -> "FakeMessage":
+        return await self._client.edit_message_text(self.chat.id, self.id, text, **kwargs)
+    
+    async def edit_reply_markup(self, reply_markup=None) -> "FakeMessage":
+        return await self._client.edit_message_reply_markup(self.chat.id, self.id, reply_markup)
+    
+    async def delete(self):
+        return await self._client.delete_messages(self.chat.id, self.id)
+
+class FakeCallbackQuery(CallbackQuery):
+    """Button press on a message"""
+    
+    def __init__(self, client: "FakeClient", from_user: SimpleNamespace, message: FakeMessage, data: str):
+        self._client = client
+        self.id = str(next(client.message_ids))
+        self.from_user = from_user
+        self.message = message
+        self.data = data
+        self.matches = None
+    
+    async def answer(self, text: Optional[str] = None, show_alert: bool = False, **kwargs) -> bool:
+        await self._client._call("answer_callback_query")
+        return True
+    
+    async def edit_message_text(self, text: str, **kwargs) -> FakeMessage:
+        return await self.message.edit_text(text, **kwargs)
+    
+    async def edit_message_reply_markup(self, reply_markup=None) -> FakeMessage:
+        return await self.message.edit_reply_markup(reply_markup)
+
+class FakeClient:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, flood_rate: float = 0.0,
+                 flood_seconds: int = 1, sleep_threshold: int = 5, seed: Optional[int] = None,
+                 delivery_rate: float = 10000.0, delivery_user_interval: float = 0.0):
+        self.latency = latency  # seconds per API call
+        self.jitter = jitter  # +/- seconds added to each call
+        self.flood_rate = flood_rate  # probability that a call hits a FloodWait
+        self.flood_seconds = flood_seconds
+        self.sleep_threshold = sleep_threshold  # waits up to this long are slept, like Bot.invoke
+        self.random = random.Random(seed)
+        
+        self.id = 1000
+        self.username = "FileStoreBenchBot"
+        self.first_name = "FileStore Bench"
+        self.me = SimpleNamespace(id=self.id, username=self.username, first_name=self.first_name)
+        self.executor = None  # sync filters run on the loop's default executor
+        self.db = Database()
+        self.delivery = DeliveryScheduler(delivery_rate, delivery_user_interval)
+        self.trace = None
+        
+        # chat_id -> message_id -> message; the storage channel lives here too
+        self.chats: Dict[int, Dict[int, FakeMessage]] = {}
+        self.message_ids = itertools.count(1)
+        
+        self.calls: Counter = Counter()  # method -> calls
+        self.flood_waits: Counter = Counter()  # method -> injected FloodWaits
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return asyncio.get_running_loop()
+    
+    def reset_stats(self):
+        self.calls.clear()
+        self.flood_waits.clear()
+    
+    async def _call(self, method: str):
+        """Account one API call, sleeping for its latency and injecting FloodWaits"""
+        self.calls[method] += 1
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        while self.flood_rate and self.random.random() < self.flood_rate:
+            self.flood_waits[method] += 1
+            if self.flood_seconds > self.sleep_threshold:
+                raise FloodWait(value=self.flood_seconds)
+            await asyncio.sleep(self.flood_seconds)
+    
+    def _store(self, chat_id: int, **kwargs) -> FakeMessage:
+        message = FakeMessage(self, chat_id, next(self.message_ids), **kwargs)
+        self.chats.setdefault(chat_id, {})[message.id] = message
+        return message
+    
+    def add_channel_post(self, channel_id: int, file_name: str, file_size: int) -> FakeMessage:
+        """Put a document post in a channel without an API call"""
+        message_id = next(self.message_ids)
+        document = SimpleNamespace(
+            file_name=file_name, file_size=file_size, file_unique_id=f"unique{message_id}", mime_type="video/mp4"
+        )
+        message = FakeMessage(self, channel_id, message_id, document=document, chat_type=ChatType.CHANNEL)
+        self.chats.setdefault(channel_id, {})[message_id] = message
+        return message
+    
+    def make_user(self, user_id: int) -> SimpleNamespace:
+        return SimpleNamespace(id=user_id, first_name=f"user{user_id}", username=None, language_code="en", is_bot=False)
+    
+    def make_user_message(self, user_id: int, text: Optional[str], chat_id: Optional[int] = None,
+                          document: Optional[SimpleNamespace] = None) -> FakeMessage:
+        """Incoming message from a user, in private unless a group chat_id is given"""
+        command = text[1:].split() if text and text.startswith("/") else None
+        return FakeMessage(
+            self, chat_id or user_id, next(self.message_ids), text=text, document=document,
+            from_user=self.make_user(user_id), command=command,
+            chat_type=ChatType.SUPERGROUP if chat_id else ChatType.PRIVATE
+        )
+    
+    def make_callback_query(self, user_id: int, data: str) -> FakeCallbackQuery:
+        """Button press by a user on a message the bot sent them"""
+        message = self._store(user_id, text="buttons")
+        return FakeCallbackQuery(self, self.make_user(user_id), message, data)
+    
+    async def get_me(self) -> SimpleNamespace:
+        await self._call("get_me")
+        return SimpleNamespace(id=self.id, username=self.username, first_name=self.first_name)
+    
+    async def get_messages(self, chat_id: int, message_ids: Union[int, List[int]]):
+        await self._call("get_messages")
+        chat = self.chats.get(chat_id, {})
+        
+        def lookup(message_id: int) -> FakeMessage:
+            return chat.get(message_id) or FakeMessage(self, chat_id, message_id, empty=True)
+        
+        if isinstance(message_ids, int):
+            return lookup(message_ids)
+        return [lookup(message_id) for message_id in message_ids]
+    
+    async def copy_message(self, chat_id: int, from_chat_id: int, message_id: int,
+                           caption: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self._call("copy_message")
+        source = self.chats.get(from_chat_id, {}).get(message_id)
+        if source is None:
+            raise ValueError(f"Message {message_id} not found in {from_chat_id}")
+        return self._store(chat_id, document=source.document)
+    
+    async def forward_messages(self, chat_id: int, from_chat_id: int, message_ids: int) -> FakeMessage:
+        await self._call("forward_messages")
+        source = self.chats.get(from_chat_id, {}).get(message_ids)
+        return self._store(chat_id, document=source.document if source else None)
+    
+    async def send_media_group(self, chat_id: int, media: list, **kwargs) -> List[FakeMessage]:
+        await self._call("send_media_group")
+        return [self._store(chat_id) for _ in media]
+    
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        await self._call("send_message")
+        return self._store(chat_id, text=text)
+    
+    async def send_photo(self, chat_id: int, photo: str, caption: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self._call("send_photo")
+        return self._store(chat_id, text=caption)
+    
+    async def send_document(self, chat_id: int, document: str, **kwargs) -> FakeMessage:
+        await self._call("send_document")
+        return self._store(chat_id)
+    
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, **kwargs) -> FakeMessage:
+        await self._call("edit_message_text")
+        message = self.chats.get(chat_id, {}).get(message_id) or self._store(chat_id)
+        message.text = text
+        return message
+    
+    async def edit_message_reply_markup(self, chat_id: int, message_id: int, reply_markup=None):
+        await self._call("edit_message_reply_markup")
+    
+    async def delete_messages(self, chat_id: int, message_ids: Union[int, List[int]]) -> int:
+        await self._call("delete_messages")
+        chat = self.chats.get(chat_id, {})
+        ids = [message_ids] if isinstance(message_ids, int) else message_ids
+        return sum(1 for message_id in ids if chat.pop(message_id, None))
+    
+    async def pin_chat_message(self, chat_id: int, message_id: int, **kwargs) -> bool:
+        await self._call("pin_chat_message")
+        return True
+    
+    async def get_chat_member(self, chat_id: int, user_id: int) -> SimpleNamespace:
+        await self._call("get_chat_member")
+        return SimpleNamespace(status="member", privileges=None)
+    
+    async def get_chat(self, chat_id: int) -> SimpleNamespace:
+        await self._call("get_chat")
+        return SimpleNamespace(id=chat_id, title=f"chat {chat_id}")
+    
+    async def create_chat_invite_link(self, chat_id: int) -> SimpleNamespace:
+        await self._call("create_chat_invite_link")
+        return SimpleNamespace(invite_link=f"https://t.me/+bench{chat_id}")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the supported URL shortener services
+
+Every provider is served under /<site><path>, so pointing
+Config.SHORTENER_API_BASE (or URLShortener(api_base=...)) at this server
+routes all shortener traffic here instead of the internet.
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from typing import Dict, Optional
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Simple token bucket used to emulate provider rate limits"""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+    
+    def take(self) -> bool:
+        """Take one token, returning False if the bucket is empty"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class FakeShortenerServer:
+    """aiohttp server mimicking the request/response shapes of each provider"""
+    
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.counter = itertools.count(1)
+        self.stats: Dict[str, int] = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'unauthorized': 0}
+        
+        self.app = web.Application()
+        self.app.router.add_get("/tinyurl.com/api-create.php", self._plain_handler("tinyurl.com", "https://tinyurl.com/"))
+        self.app.router.add_get("/is.gd/create.php", self._plain_handler("is.gd", "https://is.gd/"))
+        self.app.router.add_get("/v.gd/create.php", self._plain_handler("v.gd", "https://v.gd/"))
+        self.app.router.add_post("/bit.ly/v4/shorten", self._json_handler("bit.ly", "long_url", "link", "https://bit.ly/"))
+        self.app.router.add_post("/short.io/links", self._json_handler("short.io", "originalURL", "shortURL", "https://short.io/"))
+        self.app.router.add_post("/rebrandly.com/v1/links", self._json_handler("rebrandly.com", "destination", "shortUrl", "https://rebrand.ly/"))
+        self.app.router.add_post("/t.ly/api/v1/link/shorten", self._json_handler("t.ly", "long_url", "short_url", "https://t.ly/"))
+        self.app.router.add_get("/cutt.ly/api/api.php", self._cuttly_handler)
+        self.app.router.add_post("/gg.gg/create", self._gggg_handler)
+        
+        self.runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        base_url = f"http://{host}:{self.port}"
+        logger.info(f"Fake shortener listening on {base_url}")
+        return base_url
+    
+    async def stop(self):
+        """Stop serving"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+    
+    def _next_code(self) -> str:
+        """Generate the next short code"""
+        n = next(self.counter)
+        alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+        code = ""
+        while n:
+            n, rem = divmod(n, 62)
+            code = alphabet[rem] + code
+        return code
+    
+    async def _simulate(self, site: str, authorized: bool = True) -> Optional[web.Response]:
+        """Apply latency, auth, rate limit and error injection; return an error response if any"""
+        self.stats['requests'] += 1
+        
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        if not authorized:
+            self.stats['unauthorized'] += 1
+            return web.json_response({"error": "unauthorized"}, status=401)
+        
+        if self.rate_limit:
+            bucket = self.buckets.setdefault(site, TokenBucket(self.rate_limit))
+            if not bucket.take():
+                self.stats['rate_limited'] += 1
+                return web.json_response({"error": "rate limited"}, status=429)
+        
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(text="Internal Server Error", status=500)
+        
+        return None
+    
+    def _plain_handler(self, site: str, prefix: str):
+        """Handler for text/plain providers (tinyurl, is.gd, v.gd)"""
+        async def handler(request: web.Request) -> web.Response:
+            error = await self._simulate(site)
+            if error:
+                return error
+            if not request.query.get("url"):
+                return web.Response(text="Error: missing url", status=400)
+            return web.Response(text=prefix + self._next_code())
+        return handler
+    
+    def _json_handler(self, site: str, request_key: str, response_key: str, prefix: str):
+        """Handler for JSON POST providers with an Authorization/apikey header"""
+        async def handler(request: web.Request) -> web.Response:
+            authorized = bool(request.headers.get("Authorization") or request.headers.get("apikey"))
+            error = await self._simulate(site, authorized)
+            if error:
+                return error
+            data = await request.json()
+            if not data.get(request_key):
+                return web.json_response({"error": f"missing {request_key}"}, status=400)
+            return web.json_response({response_key: prefix + self._next_code()})
+        return handler
+    
+    async def _cuttly_handler(self, request: web.Request) -> web.Response:
+        """Handler for cutt.ly (key and URL in the query string)"""
+        error = await self._simulate("cutt.ly", bool(request.query.get("key")))
+        if error:
+            return error
+        if not request.query.get("short"):
+            return web.json_response({"url": {"status": 1}})
+        return web.json_response({"url": {"status": 7, "shortLink": "https://cutt.ly/" + self._next_code()}})
+    
+    async def _gggg_handler(self, request: web.Request) -> web.Response:
+        """Handler for gg.gg (form POST, HTML response)"""
+        error = await self._simulate("gg.gg")
+        if error:
+            return error
+        form = await request.post()
+        if not form.get("url"):
+            return web.Response(text="<html>missing url</html>", status=400)
+        short_url = "http://gg.gg/" + self._next_code()
+        return web.Response(text=f'<html><a href="{short_url}">{short_url}</a></html>', content_type="text/html")
+
+async def _serve(args):
+    server = FakeShortenerServer(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    base_url = await server.start(args.host, args.port)
+    print(f"Fake shortener running at {base_url} (set SHORTENER_API_BASE={base_url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local stand-in shortener server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Base response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests/sec per site before 429 (0 = unlimited)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_serve(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay a recorded update trace through the plugin handlers
+
+Reads a trace written by tracing.TraceRecorder (TRACE_FILE), recreates the
+files and batches its links point to, and dispatches every update through
+the real plugin handlers and their filters, group by group as Pyrogram
+does, against the fake client. Traces keep commands without their
+arguments and no free text, so such messages replay with placeholder
+text. Updates keep their recorded spacing, compressed by the replay speed:
+
+    python -m benchmarks.replay trace.jsonl --speed 1 --speed 10 --speed 100
+    python -m benchmarks.replay trace.jsonl --speed 10 --latency-ms 20 --output replay.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import pkgutil
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import benchmarks  # noqa: F401  (placeholder Config environment)
+from benchmarks.common import latency_summary, print_report, save_report, compare_reports
+from benchmarks.fake_client import FakeClient
+from pyrogram import StopPropagation, ContinuePropagation
+from pyrogram.enums import ChatType
+from pyrogram.handlers import MessageHandler, CallbackQueryHandler
+from config import Config
+from database.models import BatchManifest
+from helper_func import encode_link, encode_signed_file_link, LINK_FILE, LINK_BATCH
+import plugins
+
+logger = logging.getLogger(__name__)
+
+USER_OFFSET = 1_000_000  # replayed user IDs are USER_OFFSET + pseudonym
+GROUP_OFFSET = -1_000_000_000  # replayed group chat IDs are GROUP_OFFSET - pseudonym
+TRAILING_ID = re.compile(r"(\d+)$")
+PLACEHOLDER_TEXT = "text"  # stands in for free text, which traces do not record
+
+def media_name(meta: Dict) -> str:
+    return f"replay.{meta.get('file_type') or 'document'}"
+
+def load_trace(path: str) -> List[Dict]:
+    """Read a trace, laying consecutive sessions end to end"""
+    events = []
+    offset = 0.0
+    last = 0.0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'v' in record:
+                offset = last
+                continue
+            record['t'] += offset
+            last = record['t']
+            events.append(record)
+    return events
+
+def load_handlers() -> Dict[int, List]:
+    """Collect every plugin handler by dispatch group"""
+    groups: Dict[int, List] = {}
+    seen = set()
+    for module_info in pkgutil.iter_modules(plugins.__path__):
+        module = importlib.import_module(f"plugins.{module_info.name}")
+        for obj in vars(module).values():
+            if not callable(obj) or getattr(obj, "__module__", None) != module.__name__:
+                continue
+            for handler, group in getattr(obj, "handlers", []):
+                if id(handler) not in seen:
+                    seen.add(id(handler))
+                    groups.setdefault(group, []).append(handler)
+    return dict(sorted(groups.items()))
+
+class Replayer:
+    def __init__(self, client: FakeClient, events: List[Dict], max_batch_files: int):
+        self.client = client
+        self.events = events
+        self.max_batch_files = max_batch_files
+        self.groups = load_handlers()
+        
+        # Recorded file/batch IDs -> IDs recreated in the fake store, and the tokens pointing at them
+        self.file_ids: Dict[int, int] = {}
+        self.batch_ids: Dict[int, int] = {}
+        self.tokens: Dict[Tuple, str] = {}
+        
+        self.latencies: Dict[str, List[float]] = {}
+        self.lateness: List[float] = []
+        self.errors: Counter = Counter()
+        self.unhandled: int = 0
+        self.in_flight: int = 0
+        self.peak_in_flight: int = 0
+    
+    async def prepare(self):
+        """Recreate the files and batches the trace links to, and register admins"""
+        for event in self.events:
+            if event.get('a'):
+                await self.client.db.add_admin(self.user_id(event))
+            
+            link = event.get('l')
+            if not link or tuple(link[:2]) in self.tokens:
+                continue
+            
+            kind, item_id = link[0], link[1]
+            if kind == "b":
+                new_id = await self.create_batch(min(link[2] or 1, self.max_batch_files))
+                self.batch_ids[item_id] = new_id
+                self.tokens[(kind, item_id)] = encode_link(LINK_BATCH, new_id)
+            else:
+                post, new_id = await self.create_file(f"replay{item_id}.mkv")
+                self.file_ids[item_id] = new_id
+                if kind == "s" and Config.LINK_SECRET:
+                    self.tokens[(kind, item_id)] = encode_signed_file_link(Config.CHANNEL_ID, post.id)
+                else:
+                    self.tokens[(kind, item_id)] = encode_link(LINK_FILE, new_id)
+    
+    async def create_file(self, file_name: str, file_size: int = 300 * 1024 * 1024):
+        post = self.client.add_channel_post(Config.CHANNEL_ID, file_name, file_size)
+        file_id = await self.client.db.save_file("", {
+            'user_id': 0, 'channel_id': Config.CHANNEL_ID, 'message_id': post.id,
+            'file_name': file_name, 'file_size': file_size, 'file_size_human': f"{file_size / 1024 / 1024:.2f} MB",
+            'file_type': "document", 'file_hash': post.document.file_unique_id, 'upload_date': "Unknown"
+        })
+        return post, file_id
+    
+    async def create_batch(self, files: int) -> int:
+        posts = [self.client.add_channel_post(Config.CHANNEL_ID, f"batch{i}.mkv", 300 * 1024 * 1024) for i in range(files)]
+        manifest = BatchManifest.from_range(Config.CHANNEL_ID, posts[0].id, posts[-1].id)
+        for position in range(len(manifest)):
+            manifest.set_media(position)
+        return await self.client.db.save_batch("", {
+            'user_id': 0, 'channel_id': Config.CHANNEL_ID, 'manifest': manifest,
+            'first_message_id': posts[0].id, 'last_message_id': posts[-1].id,
+            'total_files': files, 'channel_link': ""
+        })
+    
+    def user_id(self, event: Dict) -> int:
+        return Config.OWNER_ID if event.get('o') else USER_OFFSET + event['u']
+    
+    def text(self, event: Dict) -> Optional[str]:
+        """Message text for an event: the command (with a recreated /start token), or placeholder free text"""
+        if 'x' not in event:
+            return None
+        if event['x'] is None:
+            return PLACEHOLDER_TEXT
+        if 'l' in event:
+            return f"/start {self.tokens[tuple(event['l'][:2])]}"
+        return event['x']
+    
+    def build_update(self, event: Dict):
+        """Turn a trace event into a fake update, returning (kind, update)"""
+        kind = event['k']
+        meta = event.get('f')
+        
+        if kind == "p":
+            if meta:
+                post = self.client.add_channel_post(Config.CHANNEL_ID, media_name(meta), meta.get('file_size') or 0)
+            else:
+                post = self.client._store(Config.CHANNEL_ID, chat_type=ChatType.CHANNEL)
+            post.text = self.text(event)
+            return "channel_post", post
+        
+        if kind == "cb":
+            data = event.get('d') or ""
+            match = TRAILING_ID.search(data)
+            if match:
+                recorded = int(match.group(1))
+                new_id = self.batch_ids.get(recorded) or self.file_ids.get(recorded)
+                if new_id:
+                    data = data[:match.start()] + str(new_id)
+            return "callback", self.client.make_callback_query(self.user_id(event), data)
+        
+        text = self.text(event)
+        document = None
+        if meta:
+            document = self.client.add_channel_post(0, media_name(meta), meta.get('file_size') or 0).document
+        
+        chat_id = GROUP_OFFSET - event['c'] if 'c' in event else None
+        message = self.client.make_user_message(self.user_id(event), text, chat_id=chat_id, document=document)
+        if text and text.startswith("/start"):
+            return "start", message
+        return ("command" if text and text.startswith("/") else "message"), message
+    
+    async def check(self, handler, update) -> bool:
+        """Evaluate a handler's filters the way Pyrogram does"""
+        flt = handler.filters
+        if not callable(flt):
+            return True
+        if inspect.iscoroutinefunction(flt.__call__):
+            return await flt(self.client, update)
+        return await self.client.loop.run_in_executor(None, flt, self.client, update)
+    
+    async def dispatch(self, kind: str, update):
+        """Run the first matching handler of every group, honouring Stop/ContinuePropagation"""
+        handler_type = CallbackQueryHandler if kind == "callback" else MessageHandler
+        handled = False
+        
+        for handlers in self.groups.values():
+            for handler in handlers:
+                if type(handler) is not handler_type:
+                    continue
+                # Pyrogram wraps the plugin function to serve conversation listeners first
+                callback = getattr(handler, "original_callback", handler.callback)
+                try:
+                    if not await self.check(handler, update):
+                        continue
+                    await callback(self.client, update)
+                    handled = True
+                except StopPropagation:
+                    return handled
+                except ContinuePropagation:
+                    continue
+                except Exception as e:
+                    self.errors[f"{callback.__module__}.{callback.__name__}"] += 1
+                    logger.debug(f"Handler error during replay: {e}")
+                break
+        return handled
+    
+    async def replay_one(self, event: Dict, scheduled: float):
+        kind, update = self.build_update(event)
+        started = time.perf_counter()
+        self.lateness.append(max(0.0, started - scheduled))
+        
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if not await self.dispatch(kind, update):
+                self.unhandled += 1
+        finally:
+            self.in_flight -= 1
+            self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+    
+    async def run(self, speed: float) -> Dict:
+        """Replay every event at `speed` times the recorded pace"""
+        tasks = []
+        started = time.perf_counter()
+        for event in self.events:
+            scheduled = started + event['t'] / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.replay_one(event, scheduled)))
+        
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        result = {
+            'speed': speed,
+            'events': len(self.events),
+            'trace_s': self.events[-1]['t'] if self.events else 0.0,
+            'elapsed_s': elapsed,
+            'throughput_ops': len(self.events) / elapsed if elapsed else 0.0,
+            **latency_summary(all_latencies),
+            'lateness_p99_ms': latency_summary(self.lateness)['p99_ms'],
+            'peak_in_flight': self.peak_in_flight,
+            'unhandled': self.unhandled,
+            'handler_errors': sum(self.errors.values()),
+            'api_calls': sum(self.client.calls.values()),
+            'flood_waits': sum(self.client.flood_waits.values()),
+        }
+        for kind, latencies in sorted(self.latencies.items()):
+            summary = latency_summary(latencies)
+            result[f"{kind}_count"] = summary['count']
+            result[f"{kind}_p95_ms"] = summary['p95_ms']
+        return result
+
+async def replay(events: List[Dict], speed: float, args) -> Dict:
+    """Replay a trace on a fresh fake client"""
+    client = FakeClient(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        flood_rate=args.flood_rate,
+        flood_seconds=args.flood_seconds,
+        seed=args.seed,
+        delivery_rate=args.delivery_rate,
+        delivery_user_interval=args.delivery_user_interval,
+    )
+    await client.db.initialize(client)
+    replayer = Replayer(client, events, args.max_batch_files)
+    await replayer.prepare()
+    client.reset_stats()
+    
+    client.delivery.start()
+    try:
+        return await replayer.run(speed)
+    finally:
+        await client.delivery.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded update trace through the plugin handlers")
+    parser.add_argument("trace", help="Trace file written with TRACE_FILE")
+    parser.add_argument("--speed", type=float, action="append", help="Replay speed multiplier (repeatable, default: 10)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latency of every fake API call")
+    parser.add_argument("--jitter-ms", type=float, default=2.0)
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Probability that an API call hits a FloodWait")
+    parser.add_argument("--flood-seconds", type=int, default=1, help="Injected FloodWait length")
+    parser.add_argument("--delivery-rate", type=float, default=Config.DELIVERY_RATE, help="DeliveryScheduler sends per second")
+    parser.add_argument("--delivery-user-interval", type=float, default=Config.DELIVERY_USER_INTERVAL)
+    parser.add_argument("--max-batch-files", type=int, default=1000, help="Cap on files recreated per batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Compare with a previous JSON report")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.CRITICAL)
+    
+    events = load_trace(args.trace)
+    results = {}
+    for speed in args.speed or [10.0]:
+        results[f"{speed:g}x"] = asyncio.run(replay(events, speed, args))
+    
+    print_report(f"Replay of {args.trace} ({len(events)} updates)", results)
+    
+    if args.compare:
+        changes = compare_reports(args.compare, results)
+        if changes is not None:
+            print_report(f"Change vs {args.compare}", changes)
+    if args.output:
+        save_report(args.output, results)
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,17 @@ import os
 import asyncio
 import logging
 from pyrogram import Client, __version__
+from pyrogram.errors import FloodWait
 from pyrogram.raw.all import layer
 from config import Config
 from database.database import Database
+from link_server import ShortLinkServer
+from batch_builder import BatchBuilder
+from delivery import DeliveryScheduler
+from metrics import metrics, MetricsServer
+from watchdog import Watchdog
+from tracing import TraceRecorder, trace_handlers
+from shortener import shortener
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +37,27 @@ class Bot(Client):
         # Initialize in-memory database
         self.db = Database()
         
+        # Optional self-hosted short link server
+        self.link_server = None
+        
+        # Optional Prometheus endpoint
+        self.metrics_server = None
+        
+        # Background /batch and /custom_batch scans
+        self.batch_builder = BatchBuilder(self)
+        
+        # Fair-share scheduler for every file sent to users
+        self.delivery = DeliveryScheduler(Config.DELIVERY_RATE, Config.DELIVERY_USER_INTERVAL)
+        
+        # Stall detector, toggled at runtime with /watchdog
+        self.watchdog = Watchdog(Config.WATCHDOG_THRESHOLD)
+        
+        # Periodic sweep of expired files and batches
+        self.cleanup_task = None
+        
+        # Optional recording of incoming updates (see tracing.py)
+        self.trace = TraceRecorder(Config.TRACE_FILE) if Config.TRACE_FILE else None
+        
     async def start(self):
         """Start the bot"""
         await super().start()
@@ -41,11 +70,108 @@ class Bot(Client):
         
         # Initialize database with bot info
         await self.db.initialize(self)
+        self.db.analytics.start()
+        self.cleanup_task = asyncio.create_task(self.db.start_cleanup_task())
+        self.delivery.start()
+        metrics.start()
+        metrics.add_collector(self.collect_metrics)
+        if Config.WATCHDOG_ENABLED:
+            self.watchdog.start()
+        
+        if self.trace:
+            for handler, group in trace_handlers():
+                self.add_handler(handler, group)
+            self.trace.start()
+        
+        # Pick up batch scans interrupted by the last shutdown
+        await self.batch_builder.resume()
+        
+        # Serve short links ourselves instead of calling a third-party shortener
+        if Config.SHORT_LINK_ENABLED:
+            self.link_server = ShortLinkServer(self)
+            await self.link_server.start()
+            shortener.resolver = self.link_server
+        
+        if Config.METRICS_ENABLED:
+            self.metrics_server = MetricsServer(metrics)
+            await self.metrics_server.start()
         
         logger.info(f"Bot started as @{self.username}")
         logger.info(f"Pyrogram v{__version__} (Layer {layer}) started on {me.first_name}")
         
     async def stop(self, *args):
         """Stop the bot"""
+        if self.link_server:
+            await self.link_server.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        await self.batch_builder.stop()
+        if self.cleanup_task:
+            self.cleanup_task.cancel()
+            self.cleanup_task = None
+        await self.delivery.stop()
+        await self.db.analytics.stop()
+        metrics.stop()
+        self.watchdog.stop()
+        if self.trace:
+            self.trace.stop()
         await super().stop()
         logger.info("Bot stopped")
+    
+    def add_handler(self, handler, group: int = 0):
+        """Register a handler, timing its callback per handler"""
+        if asyncio.iscoroutinefunction(handler.callback):
+            handler.callback = metrics.instrument("handler")(handler.callback)
+        return super().add_handler(handler, group)
+    
+    async def invoke(self, query, *args, sleep_threshold: float = None, **kwargs):
+        """Invoke a raw API function, timing it and accounting its FloodWaits per method"""
+        method = type(query).__name__
+        if sleep_threshold is None:
+            sleep_threshold = self.sleep_threshold
+        
+        with metrics.timer("api", method):
+            while True:
+                # Short waits are slept here rather than inside the session so they get counted
+                try:
+                    return await super().invoke(query, *args, sleep_threshold=0, **kwargs)
+                except FloodWait as e:
+                    metrics.inc("flood_waits", method=method)
+                    metrics.inc("flood_wait_seconds", e.value, method=method)
+                    if e.value > sleep_threshold:
+                        raise
+                    logger.warning(f"Waiting for {e.value} seconds before continuing (required by {method})")
+                    await asyncio.sleep(e.value)
+    
+    async def collect_metrics(self):
+        """Publish database, delivery and cache figures for the metrics endpoint"""
+        stats = await self.db.get_stats()
+        metrics.set_gauge("users", stats['total_users'])
+        metrics.set_gauge("banned_users", stats['total_banned'])
+        metrics.set_gauge("admins", stats['total_admins'])
+        metrics.set_gauge("files", stats['current_files'])
+        metrics.set_gauge("batches", stats['current_batches'])
+        metrics.set_gauge("short_links", stats['short_links'])
+        metrics.set_gauge("new_users", stats['new_users_today'], window="1d")
+        metrics.set_gauge("new_users", stats['new_users_7d'], window="7d")
+        metrics.set_gauge("downloads_last_hour", stats['downloads']['last_hour'])
+        metrics.set_gauge("uptime_seconds", stats['uptime'])
+        for file_type, size in stats['bytes_by_type'].items():
+            metrics.set_gauge("stored_bytes", size, type=file_type or "unknown")
+        metrics.set_counter("files_uploaded", stats['total_files'])
+        metrics.set_counter("batches_created", stats['total_batches'])
+        
+        # Outbound queue
+        metrics.set_gauge("delivery_queue_depth", self.delivery.queued)
+        metrics.set_gauge("delivery_active_chats", len(self.delivery.ring))
+        metrics.set_gauge("delivery_paused_seconds", self.delivery.paused_for)
+        metrics.set_counter("delivery_sends", self.delivery.stats['sent'], result="sent")
+        metrics.set_counter("delivery_sends", self.delivery.stats['failed'], result="failed")
+        metrics.set_counter("delivery_flood_waits", self.delivery.stats['flood_waits'])
+        metrics.set_gauge("batch_jobs_running", len(self.batch_builder.jobs))
+        
+        # Caches
+        metrics.set_cache("message_meta", self.db.message_meta_hits, self.db.message_meta_misses)
+        metrics.set_cache("shortener", shortener.cache_hits, shortener.cache_misses)
+        if self.link_server:
+            metrics.set_cache("short_link_redirects", self.link_server.cache_hits, self.link_server.cache_misses)
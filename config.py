@@ -35,18 +35,56 @@ class Config:
     
     PROTECT_CONTENT = os.getenv("PROTECT_CONTENT", "False").lower() == "true"
     
+    # Secret used to sign link tokens (forged tokens are rejected before any lookup)
+    LINK_SECRET = os.getenv("LINK_SECRET", "")
+    
+    # Stateless single-file links: the token carries channel/message ID and is verified with LINK_SECRET
+    STATELESS_LINKS = os.getenv("STATELESS_LINKS", "False").lower() == "true"
+    STATELESS_LINK_TTL = int(os.getenv("STATELESS_LINK_TTL", "0"))  # Link lifetime in seconds, 0 = never expires
+    
     # Force subscription configuration
     FORCE_SUB_CHANNELS = []
     force_sub = os.getenv("FORCE_SUB_CHANNELS", "")
     if force_sub:
         FORCE_SUB_CHANNELS = [int(ch) for ch in force_sub.split()]
     
+    # ID allocation: give every bot process sharing a store its own NODE_ID (0-1023)
+    NODE_ID = int(os.getenv("NODE_ID", "0"))
+    ID_STATE_FILE = os.getenv("ID_STATE_FILE", f"id_allocator_{NODE_ID}.state")
+    
     # Auto delete configuration (in seconds)
     AUTO_DELETE_TIME = int(os.getenv("AUTO_DELETE_TIME", "600"))  # 10 minutes default
+    TOMBSTONE_TTL = int(os.getenv("TOMBSTONE_TTL", "604800"))  # how long deleted channel posts are remembered, 7 days default
+    
+    # Download analytics: access events are buffered and flushed as aggregated increments
+    ANALYTICS_FLUSH_INTERVAL = int(os.getenv("ANALYTICS_FLUSH_INTERVAL", "30"))  # seconds
+    ANALYTICS_RETENTION_HOURS = int(os.getenv("ANALYTICS_RETENTION_HOURS", "168"))  # 7 days of hourly counters
     
     # Bot settings
     MAX_FILE_SIZE = 2000 * 1024 * 1024  # 2GB
     
+    # Batch builder: large ranges are scanned by a resumable background job
+    MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))  # Messages per /batch or /custom_batch
+    BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", "batch_jobs")  # Where in-progress jobs are checkpointed
+    BATCH_PAGE_SIZE = int(os.getenv("BATCH_PAGE_SIZE", "20"))  # Files sent per page of a batch, the rest on "More"
+    BATCH_CURSOR_TTL = int(os.getenv("BATCH_CURSOR_TTL", "86400"))  # Seconds an unfinished batch can be continued with "More"
+    
+    # Delivery scheduler: shared outbound pacing across all users
+    DELIVERY_RATE = float(os.getenv("DELIVERY_RATE", "20"))  # File sends per second, all users combined
+    DELIVERY_USER_INTERVAL = float(os.getenv("DELIVERY_USER_INTERVAL", "1"))  # Seconds between files to one chat
+    
+    # Prometheus metrics endpoint (latency histograms also shown by /perf)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() == "true"
+    METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9091"))
+    
+    # Event loop watchdog: logs the loop thread's stack when it is blocked for longer than the threshold
+    WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "False").lower() == "true"
+    WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", "1"))  # seconds
+    
+    # Update trace for offline load replay (benchmarks/replay.py); empty = not recorded
+    TRACE_FILE = os.getenv("TRACE_FILE", "")
+    
     # URLs and links
     PICS = [
         "https://telegra.ph/file/7e56d907542396289fee4.jpg",
@@ -57,6 +95,13 @@ class Config:
     SHORTENER_ENABLED = os.getenv("SHORTENER_ENABLED", "False").lower() == "true"
     SHORTENER_SITE = os.getenv("SHORTENER_SITE", "tinyurl.com")  # Default shortener
     SHORTENER_API_KEY = os.getenv("SHORTENER_API_KEY", "")
+    SHORTENER_API_BASE = os.getenv("SHORTENER_API_BASE", "")  # Route shortener calls to a local stand-in server
+    
+    # Self-hosted short links (served by the bot itself instead of a third-party shortener)
+    SHORT_LINK_ENABLED = os.getenv("SHORT_LINK_ENABLED", "False").lower() == "true"
+    SHORT_LINK_BASE_URL = os.getenv("SHORT_LINK_BASE_URL", "")  # Public URL of the redirect server
+    SHORT_LINK_HOST = os.getenv("SHORT_LINK_HOST", "0.0.0.0")
+    SHORT_LINK_PORT = int(os.getenv("SHORT_LINK_PORT", "8080"))
     
     # Supported shortener sites
     SUPPORTED_SHORTENERS = {
@@ -89,6 +134,12 @@ class Config:
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
         
+        if cls.STATELESS_LINKS and not cls.LINK_SECRET:
+            raise ValueError("LINK_SECRET is required when STATELESS_LINKS is set")
+        
+        if cls.SHORT_LINK_ENABLED and not cls.SHORT_LINK_BASE_URL:
+            raise ValueError("SHORT_LINK_BASE_URL is required when SHORT_LINK_ENABLED is set")
+        
         return True
 
 # Validate configuration on import
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Buffered access analytics for files and batches
+
+Reads only count an event in memory. A background task periodically folds
+the buffered events into the stored access counts as one increment per
+item and rolls them up into per-file hourly counters, which back the top
+files and download rate figures in /stats.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+
+class AccessAggregator:
+    def __init__(self, db, flush_interval: int = 30, retention_hours: int = 168):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.retention_hours = retention_hours
+        
+        # Events since the last flush
+        self.pending_files: Counter = Counter()
+        self.pending_batches: Counter = Counter()
+        
+        # Hourly time series: hour -> {file_id: downloads} and hour -> total downloads
+        self.hourly_files: Dict[int, Counter] = {}
+        self.hourly_totals: Dict[int, int] = {}
+        
+        self.task: Optional[asyncio.Task] = None
+    
+    def record_file(self, file_id: int):
+        """Count a file access"""
+        self.pending_files[file_id] += 1
+    
+    def record_batch(self, batch_id: int):
+        """Count a batch access"""
+        self.pending_batches[batch_id] += 1
+    
+    async def flush(self) -> int:
+        """Apply buffered events as aggregated increments, returning the number of events"""
+        pending_files, self.pending_files = self.pending_files, Counter()
+        pending_batches, self.pending_batches = self.pending_batches, Counter()
+        
+        hour = int(time.time() // HOUR)
+        if pending_files:
+            await self.db.apply_file_access_counts(pending_files)
+            self.hourly_files.setdefault(hour, Counter()).update(pending_files)
+            self.hourly_totals[hour] = self.hourly_totals.get(hour, 0) + sum(pending_files.values())
+        if pending_batches:
+            await self.db.apply_batch_access_counts(pending_batches)
+        
+        # Drop hours that fell out of the retention window
+        oldest = hour - self.retention_hours
+        for old_hour in [h for h in self.hourly_totals if h <= oldest]:
+            self.hourly_totals.pop(old_hour, None)
+            self.hourly_files.pop(old_hour, None)
+        
+        return sum(pending_files.values()) + sum(pending_batches.values())
+    
+    async def run(self):
+        """Flush buffered events every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing access analytics: {e}")
+    
+    def start(self):
+        """Start the background flush task"""
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        """Stop the flush task and apply whatever is still buffered"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+    
+    def get_download_rates(self) -> Dict[str, float]:
+        """Downloads in the current hour, the last 24 hours and the average per hour"""
+        hour = int(time.time() // HOUR)
+        last_hour = self.hourly_totals.get(hour, 0)
+        last_day = sum(count for h, count in self.hourly_totals.items() if h > hour - 24)
+        
+        return {
+            'last_hour': last_hour,
+            'last_24h': last_day,
+            'per_hour_24h': last_day / 24
+        }
+    
+    def get_top_files(self, hours: int = 24, limit: Optional[int] = 5) -> List[Tuple[int, int]]:
+        """Most downloaded (file_id, downloads) over the last `hours` hours"""
+        hour = int(time.time() // HOUR)
+        totals = Counter()
+        for h, counts in self.hourly_files.items():
+            if h > hour - hours:
+                totals.update(counts)
+        return totals.most_common(limit)
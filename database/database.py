@@ -5,27 +5,81 @@ In-memory database for the FileStore Bot
 """
 
 import asyncio
+import bisect
+import secrets
+import string
 import time
-from typing import Dict, List, Set, Optional
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import AsyncIterator, Dict, List, Set, Optional, Tuple, Union
 from pyrogram import Client
 from pyrogram.types import Message
 import logging
+from database.id_allocator import IdAllocator
+from database.models import UserRecord, BatchManifest
+from database.analytics import AccessAggregator
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Message IDs per bucket of the manifest range index
+MANIFEST_BUCKET_SIZE = 1024
+
 class Database:
     def __init__(self):
         # User data
-        self.users: Set[int] = set()
+        self.users: Dict[int, UserRecord] = {}  # user_id -> profile
+        self.user_order: List[int] = []  # user_ids sorted, so iter_users can resume from a cursor
         self.banned_users: Set[int] = set()
         self.admins: Set[int] = set()
         
         # File storage
-        self.files: Dict[str, Dict] = {}  # file_id -> file_data
-        self.user_files: Dict[int, List[str]] = {}  # user_id -> [file_ids]
+        self.files: Dict[int, Dict] = {}  # file_id -> file_data
+        self.user_files: Dict[int, List[int]] = {}  # user_id -> [file_ids]
+        self.file_hashes: Dict[str, int] = {}  # file_hash (file_unique_id) -> canonical file_id
+        self.file_owners: Dict[int, Set[int]] = {}  # file_id -> {user_ids the file is attributed to}
+        self.file_locations: Dict[int, List[Tuple[Union[int, str], int]]] = {}  # file_id -> [(channel_id, message_id) of duplicate posts]
+        
+        # Secondary file indexes
+        self.files_by_type: Dict[str, Set[int]] = {}  # file_type -> {file_ids}
+        self.files_by_channel: Dict[Union[int, str], Set[int]] = {}  # channel_id -> {file_ids}
+        self.files_by_access: Dict[int, Set[int]] = {}  # access_count -> {file_ids}
+        self.file_order: List[int] = []  # file_ids sorted by ID, i.e. by created_at
+        
+        # Reverse indexes from storage-channel posts to the records pointing at them
+        self.files_by_message: Dict[Tuple[Union[int, str], int], Set[int]] = {}  # (channel_id, message_id) -> {file_ids}
+        self.tombstones: Dict[int, Dict] = {}  # file_id -> why and when its channel post went away
+        self.deleted_messages: Dict[Tuple[Union[int, str], int], float] = {}  # (channel_id, message_id) -> deleted_at
+        self.tombstone_ttl: int = 7 * 86400  # seconds tombstones and deleted posts are kept
+        
+        # Bumped whenever channel edits or deletions change stored files, so cached /stats can be invalidated
+        self.stats_version: int = 0
         
         # Batch storage
-        self.batches: Dict[str, Dict] = {}  # batch_id -> batch_data
+        self.batches: Dict[int, Dict] = {}  # batch_id -> batch_data
+        # (channel_id, message_id // MANIFEST_BUCKET_SIZE) -> {batch_ids with messages in that bucket}
+        self.manifest_buckets: Dict[Tuple[Union[int, str], int], Set[int]] = {}
+        
+        # Per-user batch delivery cursors: batch_id -> {user_id: (next position, files delivered, updated_at)}
+        self.batch_cursors: Dict[int, Dict[int, Tuple[int, int, float]]] = {}
+        self.batch_cursor_ttl: int = 86400  # seconds an idle cursor is kept
+        
+        # Metadata of channel messages resolved on demand for manifest batches (LRU)
+        self.message_meta: "OrderedDict[Tuple[Union[int, str], int], Dict]" = OrderedDict()
+        self.message_meta_size: int = 10000
+        self.message_meta_hits: int = 0
+        self.message_meta_misses: int = 0
+        
+        # File and batch IDs (replaced by a node-aware, persisted allocator in initialize)
+        self.id_allocator = IdAllocator()
+        
+        # Buffered access counts and hourly download counters
+        self.analytics = AccessAggregator(self)
+        
+        # Self-hosted short links
+        self.short_codes: Dict[str, str] = {}  # code -> start payload
+        self.payload_short_codes: Dict[str, str] = {}  # start payload -> code
+        self.short_code_hits: Dict[str, int] = {}  # code -> redirect count
         
         # Force subscription channels
         self.force_sub_channels: Set[int] = set()
@@ -40,6 +94,11 @@ class Database:
         self.total_files: int = 0
         self.total_batches: int = 0
         
+        # Incrementally maintained counters, so /stats and /users never scan collections
+        self.banned_user_count: int = 0  # banned IDs that are also registered users
+        self.bytes_by_type: Dict[str, int] = {}  # file_type -> bytes stored
+        self.daily_new_users: Dict[str, int] = {}  # YYYY-MM-DD -> users who joined that day
+        
         # Bot instance
         self.bot: Optional[Client] = None
         
@@ -52,21 +111,45 @@ class Database:
         self.admins.update(Config.ADMINS)
         self.force_sub_channels.update(Config.FORCE_SUB_CHANNELS)
         self.auto_delete_time = Config.AUTO_DELETE_TIME
+        self.tombstone_ttl = Config.TOMBSTONE_TTL
+        self.batch_cursor_ttl = Config.BATCH_CURSOR_TTL
+        self.id_allocator = IdAllocator(Config.NODE_ID, Config.ID_STATE_FILE)
+        self.analytics.flush_interval = Config.ANALYTICS_FLUSH_INTERVAL
+        self.analytics.retention_hours = Config.ANALYTICS_RETENTION_HOURS
         
         logger.info(f"Database initialized with {len(self.admins)} admins")
     
     # User management
-    async def add_user(self, user_id: int):
-        """Add user to database"""
-        self.users.add(user_id)
+    async def add_user(self, user_id: int, language: Optional[str] = None):
+        """Add user to database, or refresh the profile of a returning user"""
+        now = time.time()
+        record = self.users.get(user_id)
+        if record is None:
+            self.users[user_id] = UserRecord(first_seen=now, last_seen=now, language=language)
+            bisect.insort(self.user_order, user_id)
+            self._count_new_user()
+            if user_id in self.banned_users:
+                self.banned_user_count += 1
+        else:
+            record.last_seen = now
+            if language:
+                record.language = language
+            # Talking to the bot again means it is no longer blocked
+            record.unreachable = False
+            record.failed_deliveries = 0
         if user_id not in self.user_files:
             self.user_files[user_id] = []
     
     async def remove_user(self, user_id: int):
         """Remove user from database"""
-        self.users.discard(user_id)
-        if user_id in self.user_files:
-            del self.user_files[user_id]
+        if self.users.pop(user_id, None) is not None:
+            del self.user_order[bisect.bisect_left(self.user_order, user_id)]
+            if user_id in self.banned_users:
+                self.banned_user_count -= 1
+        for file_id in self.user_files.pop(user_id, ()):
+            owners = self.file_owners.get(file_id)
+            if owners is not None:
+                owners.discard(user_id)
     
     async def get_all_users(self) -> List[int]:
         """Get all users"""
@@ -76,6 +159,88 @@ class Database:
         """Get total users count"""
         return len(self.users)
     
+    async def get_unbanned_users_count(self) -> int:
+        """Get number of users who are not banned"""
+        return len(self.users) - self.banned_user_count
+    
+    def _count_new_user(self):
+        """Bump today's new user counter, keeping 30 days of history"""
+        today = date.today().isoformat()
+        if today not in self.daily_new_users:
+            cutoff = (date.today() - timedelta(days=30)).isoformat()
+            for day in [day for day in self.daily_new_users if day < cutoff]:
+                del self.daily_new_users[day]
+            self.daily_new_users[today] = 0
+        self.daily_new_users[today] += 1
+    
+    async def get_new_users_count(self, days: int = 1) -> int:
+        """Get number of users who joined in the last `days` days (including today)"""
+        today = date.today()
+        return sum(self.daily_new_users.get((today - timedelta(days=i)).isoformat(), 0) for i in range(days))
+    
+    async def get_user(self, user_id: int) -> Optional[UserRecord]:
+        """Get a user's profile record"""
+        return self.users.get(user_id)
+    
+    async def record_file_access(self, user_id: int):
+        """Remember when a user last opened a file or batch link"""
+        record = self.users.get(user_id)
+        if record:
+            record.last_file_access = time.time()
+    
+    async def record_delivery(self, user_id: int, delivered: bool, unreachable: bool = False):
+        """Update a user's delivery health after a broadcast send"""
+        record = self.users.get(user_id)
+        if not record:
+            return
+        
+        if delivered:
+            record.failed_deliveries = 0
+            record.unreachable = False
+        else:
+            record.failed_deliveries += 1
+            record.unreachable = record.unreachable or unreachable
+    
+    def _user_matches(self, user_id: int, exclude_banned: bool, active_since: Optional[float], skip_unreachable: bool) -> bool:
+        """Check a user against the iter_users/count_users filters"""
+        record = self.users.get(user_id)
+        if record is None:
+            return False
+        if exclude_banned and user_id in self.banned_users:
+            return False
+        if skip_unreachable and record.unreachable:
+            return False
+        if active_since is not None and max(record.last_seen, record.last_file_access) < active_since:
+            return False
+        return True
+    
+    async def count_users(self, exclude_banned: bool = True, active_since: Optional[float] = None,
+                          skip_unreachable: bool = False) -> int:
+        """Count users matching the same filters as iter_users"""
+        if active_since is None and not skip_unreachable:
+            return await self.get_unbanned_users_count() if exclude_banned else len(self.users)
+        return sum(
+            1 for user_id in self.users
+            if self._user_matches(user_id, exclude_banned, active_since, skip_unreachable)
+        )
+    
+    async def iter_users(self, chunk_size: int = 500, exclude_banned: bool = True,
+                         active_since: Optional[float] = None,
+                         skip_unreachable: bool = False) -> AsyncIterator[List[int]]:
+        """Stream user IDs in chunks, filtering out banned, inactive or unreachable users as each chunk is produced"""
+        # Walk the sorted IDs a chunk at a time, re-seeking from the last ID yielded so
+        # users joining or leaving while the consumer awaits neither break nor repeat the walk
+        position = 0
+        while position < len(self.user_order):
+            window = self.user_order[position:position + chunk_size]
+            chunk = [
+                user_id for user_id in window
+                if self._user_matches(user_id, exclude_banned, active_since, skip_unreachable)
+            ]
+            if chunk:
+                yield chunk
+            position = bisect.bisect_right(self.user_order, window[-1])
+    
     async def is_user_exist(self, user_id: int) -> bool:
         """Check if user exists"""
         return user_id in self.users
@@ -83,11 +248,17 @@ class Database:
     # Ban management
     async def ban_user(self, user_id: int):
         """Ban a user"""
-        self.banned_users.add(user_id)
+        if user_id not in self.banned_users:
+            self.banned_users.add(user_id)
+            if user_id in self.users:
+                self.banned_user_count += 1
     
     async def unban_user(self, user_id: int):
         """Unban a user"""
-        self.banned_users.discard(user_id)
+        if user_id in self.banned_users:
+            self.banned_users.discard(user_id)
+            if user_id in self.users:
+                self.banned_user_count -= 1
     
     async def is_user_banned(self, user_id: int) -> bool:
         """Check if user is banned"""
@@ -115,9 +286,24 @@ class Database:
         return list(self.admins)
     
     # File management
-    async def save_file(self, file_id: str, file_data: Dict) -> str:
-        """Save file and return unique ID"""
-        unique_id = f"file_{int(time.time())}_{len(self.files)}"
+    async def save_file(self, file_id: str, file_data: Dict) -> int:
+        """Save file and return unique ID (the existing ID if the same media is already stored)"""
+        user_id = file_data.get('user_id')
+        
+        # Deduplicate on file_unique_id: re-linking the same media returns the canonical record
+        file_hash = file_data.get('file_hash')
+        existing_id = self.file_hashes.get(file_hash) if file_hash else None
+        if existing_id is not None and existing_id in self.files:
+            await self.add_user_file(user_id, existing_id)
+            # Keep the duplicate post as a fallback in case the canonical one is deleted
+            existing = self.files[existing_id]
+            location = (file_data.get('channel_id'), file_data.get('message_id'))
+            if location != (existing.get('channel_id'), existing.get('message_id')) and location not in self.file_locations.get(existing_id, ()):
+                self.file_locations.setdefault(existing_id, []).append(location)
+                self.files_by_message.setdefault(location, set()).add(existing_id)
+            return existing_id
+        
+        unique_id = self.id_allocator.next_id()
         
         self.files[unique_id] = {
             **file_data,
@@ -125,37 +311,325 @@ class Database:
             'access_count': 0
         }
         
+        if file_hash:
+            self.file_hashes[file_hash] = unique_id
+        self._index_file(unique_id, self.files[unique_id])
+        
         # Add to user files
-        user_id = file_data.get('user_id')
         if user_id:
             if user_id not in self.user_files:
                 self.user_files[user_id] = []
             self.user_files[user_id].append(unique_id)
+            self.file_owners[unique_id] = {user_id}
         
         self.total_files += 1
         return unique_id
     
-    async def get_file(self, file_id: str) -> Optional[Dict]:
+    async def add_user_file(self, user_id: int, file_id: int):
+        """Attribute an already stored file to another uploader"""
+        if user_id:
+            user_file_ids = self.user_files.setdefault(user_id, [])
+            if file_id not in user_file_ids:
+                user_file_ids.append(file_id)
+            self.file_owners.setdefault(file_id, set()).add(user_id)
+    
+    async def get_file(self, file_id: int, record_access: bool = True) -> Optional[Dict]:
         """Get file by ID"""
         file_data = self.files.get(file_id)
-        if file_data:
-            # Increment access count
-            file_data['access_count'] += 1
+        if file_data and record_access:
+            await self.record_file_download(file_id)
         return file_data
     
-    async def delete_file(self, file_id: str):
+    async def record_file_download(self, file_id: int):
+        """Count a file download"""
+        # Counted in memory, applied to access_count on the next analytics flush
+        self.analytics.record_file(file_id)
+    
+    async def apply_file_access_counts(self, counts: Dict[int, int]):
+        """Apply aggregated access count increments to files"""
+        for file_id, count in counts.items():
+            file_data = self.files.get(file_id)
+            if file_data:
+                self._move_access_bucket(file_id, file_data['access_count'], file_data['access_count'] + count)
+                file_data['access_count'] += count
+    
+    async def delete_file(self, file_id: int):
         """Delete file"""
         if file_id in self.files:
             file_data = self.files[file_id]
-            user_id = file_data.get('user_id')
             
-            # Remove from user files
-            if user_id and user_id in self.user_files:
-                if file_id in self.user_files[user_id]:
+            # Remove from the files of every user it is attributed to
+            for user_id in self.file_owners.pop(file_id, ()):
+                if user_id in self.user_files and file_id in self.user_files[user_id]:
                     self.user_files[user_id].remove(file_id)
             
+            # Drop duplicate posts that were kept as fallbacks
+            for location in self.file_locations.pop(file_id, ()):
+                self._unindex_location(file_id, location)
+            
+            # Remove from hash index
+            file_hash = file_data.get('file_hash')
+            if file_hash and self.file_hashes.get(file_hash) == file_id:
+                del self.file_hashes[file_hash]
+            
+            self._unindex_file(file_id, file_data)
             del self.files[file_id]
     
+    async def tombstone_channel_messages(self, channel_id: Union[int, str], message_ids: List[int]) -> Tuple[List[int], Set[int]]:
+        """Tombstone the files behind deleted channel posts, returning (file_ids, affected batch_ids)"""
+        file_ids = []
+        batch_ids = set()
+        now = time.time()
+        
+        for message_id in message_ids:
+            # Manifest batches only need the message cleared from their media bitmap, and the
+            # range index narrows them down to those with messages near this one
+            for batch_id in list(self.manifest_buckets.get((channel_id, message_id // MANIFEST_BUCKET_SIZE), ())):
+                if await self.discard_batch_message(batch_id, message_id):
+                    batch_ids.add(batch_id)
+            
+            key = (channel_id, message_id)
+            self.deleted_messages[key] = now
+            self.message_meta.pop(key, None)
+            
+            for file_id in list(self.files_by_message.get(key, ())):
+                # Another post still carries the same media, so the file survives on that one
+                if self._fail_over_location(file_id, key):
+                    continue
+                
+                self.tombstones[file_id] = {
+                    'channel_id': channel_id,
+                    'message_id': message_id,
+                    'file_name': self.files[file_id].get('file_name'),
+                    'deleted_at': now
+                }
+                await self.delete_file(file_id)
+                file_ids.append(file_id)
+        
+        if file_ids:
+            self.stats_version += 1
+        return file_ids, batch_ids
+    
+    async def update_channel_message(self, channel_id: Union[int, str], message_id: int, updates: Dict) -> List[int]:
+        """Apply new media metadata from an edited channel post to the files pointing at it"""
+        file_ids = list(self.files_by_message.get((channel_id, message_id), ()))
+        self.message_meta.pop((channel_id, message_id), None)
+        
+        for file_id in file_ids:
+            file_data = self.files[file_id]
+            
+            # A duplicate post changing its media no longer backs the file
+            if (channel_id, message_id) != (file_data.get('channel_id'), file_data.get('message_id')):
+                if updates.get('file_hash') != file_data.get('file_hash'):
+                    self._drop_location(file_id, (channel_id, message_id))
+                continue
+            
+            old_hash = file_data.get('file_hash')
+            if old_hash and self.file_hashes.get(old_hash) == file_id:
+                del self.file_hashes[old_hash]
+            
+            # Re-index so type and size counters follow the new media
+            self._unindex_file(file_id, file_data)
+            file_data.update(updates)
+            self._index_file(file_id, file_data)
+            
+            new_hash = file_data.get('file_hash')
+            if new_hash:
+                self.file_hashes.setdefault(new_hash, file_id)
+            
+            # Duplicate posts still hold the old media
+            if new_hash != old_hash:
+                for location in self.file_locations.pop(file_id, ()):
+                    self._unindex_location(file_id, location)
+        
+        if file_ids:
+            self.stats_version += 1
+        return file_ids
+    
+    async def get_tombstone(self, file_id: int) -> Optional[Dict]:
+        """Get the tombstone of a file whose channel post was deleted"""
+        return self.tombstones.get(file_id)
+    
+    async def is_channel_message_deleted(self, channel_id: Union[int, str], message_id: int) -> bool:
+        """Check if a storage-channel post is known to be deleted"""
+        return (channel_id, message_id) in self.deleted_messages
+    
+    async def find_file_by_hash(self, file_hash: str) -> Optional[Tuple[int, Dict]]:
+        """Get (file_id, file_data) of the stored record for a media file_unique_id"""
+        file_id = self.file_hashes.get(file_hash) if file_hash else None
+        if file_id is None or file_id not in self.files:
+            return None
+        return file_id, self.files[file_id]
+    
+    def _fail_over_location(self, file_id: int, location: Tuple[Union[int, str], int]) -> bool:
+        """Drop a deleted post from a file, moving it to a duplicate post; False if none is left"""
+        file_data = self.files[file_id]
+        locations = self.file_locations.get(file_id)
+        
+        if location != (file_data.get('channel_id'), file_data.get('message_id')):
+            self._drop_location(file_id, location)
+            return True
+        if not locations:
+            return False
+        
+        # Re-index under the fallback post, which then stops being a duplicate
+        channel_id, message_id = locations.pop(0)
+        if not locations:
+            del self.file_locations[file_id]
+        self._unindex_file(file_id, file_data)
+        file_data['channel_id'] = channel_id
+        file_data['message_id'] = message_id
+        self._index_file(file_id, file_data)
+        return True
+    
+    def _drop_location(self, file_id: int, location: Tuple[Union[int, str], int]):
+        """Forget a duplicate post of a file"""
+        locations = self.file_locations[file_id]
+        locations.remove(location)
+        if not locations:
+            del self.file_locations[file_id]
+        self._unindex_location(file_id, location)
+    
+    def _unindex_location(self, file_id: int, location: Tuple[Union[int, str], int]):
+        """Remove a file from the reverse index of one channel post"""
+        ids = self.files_by_message.get(location)
+        if ids is not None:
+            ids.discard(file_id)
+            if not ids:
+                del self.files_by_message[location]
+    
+    def _index_file(self, file_id: int, file_data: Dict):
+        """Add a file to the secondary indexes"""
+        file_type = file_data.get('file_type')
+        self.bytes_by_type[file_type] = self.bytes_by_type.get(file_type, 0) + (file_data.get('file_size') or 0)
+        
+        self.files_by_type.setdefault(file_data.get('file_type'), set()).add(file_id)
+        self.files_by_channel.setdefault(file_data.get('channel_id'), set()).add(file_id)
+        self.files_by_message.setdefault((file_data.get('channel_id'), file_data.get('message_id')), set()).add(file_id)
+        self.files_by_access.setdefault(file_data['access_count'], set()).add(file_id)
+        if not self.file_order or file_id > self.file_order[-1]:
+            self.file_order.append(file_id)
+        else:
+            bisect.insort(self.file_order, file_id)
+    
+    def _unindex_file(self, file_id: int, file_data: Dict):
+        """Remove a file from the secondary indexes"""
+        file_type = file_data.get('file_type')
+        self.bytes_by_type[file_type] = self.bytes_by_type.get(file_type, 0) - (file_data.get('file_size') or 0)
+        if not self.bytes_by_type[file_type]:
+            del self.bytes_by_type[file_type]
+        
+        for index, key in (
+            (self.files_by_type, file_data.get('file_type')),
+            (self.files_by_channel, file_data.get('channel_id')),
+            (self.files_by_message, (file_data.get('channel_id'), file_data.get('message_id'))),
+            (self.files_by_access, file_data['access_count']),
+        ):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del index[key]
+        
+        position = bisect.bisect_left(self.file_order, file_id)
+        if position < len(self.file_order) and self.file_order[position] == file_id:
+            del self.file_order[position]
+    
+    def _move_access_bucket(self, file_id: int, old_count: int, new_count: int):
+        """Move a file between access_count buckets"""
+        ids = self.files_by_access.get(old_count)
+        if ids is not None:
+            ids.discard(file_id)
+            if not ids:
+                del self.files_by_access[old_count]
+        self.files_by_access.setdefault(new_count, set()).add(file_id)
+    
+    def _walk_file_order(self, after: int):
+        """Yield file IDs greater than `after` in order, tolerating concurrent changes"""
+        position = bisect.bisect_right(self.file_order, after)
+        while position < len(self.file_order):
+            file_id = self.file_order[position]
+            yield file_id
+            # The list may change while the consumer awaits, so re-seek from the last ID
+            position = bisect.bisect_right(self.file_order, file_id)
+    
+    async def iter_files(self, filter: Optional[Dict] = None, after: Optional[int] = None,
+                         limit: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict]]:
+        """Stream (file_id, file_data) in creation order, starting after the `after` cursor"""
+        # Supported filter keys: file_type, channel_id, user_id (exact match),
+        # created_after, created_before (timestamps), min_access (access_count >=)
+        filter = filter or {}
+        after = after or 0
+        
+        candidate_sets = []
+        if 'file_type' in filter:
+            candidate_sets.append(self.files_by_type.get(filter['file_type'], set()))
+        if 'channel_id' in filter:
+            candidate_sets.append(self.files_by_channel.get(filter['channel_id'], set()))
+        if 'user_id' in filter:
+            candidate_sets.append(set(self.user_files.get(filter['user_id'], [])))
+        
+        created_after = filter.get('created_after')
+        created_before = filter.get('created_before')
+        min_access = filter.get('min_access')
+        
+        if candidate_sets:
+            smallest = min(candidate_sets, key=len)
+            others = [ids for ids in candidate_sets if ids is not smallest]
+            # Sort a small candidate set; walk the creation order for large ones
+            if len(smallest) * 8 < len(self.file_order):
+                ordered = sorted(fid for fid in smallest if fid > after)
+            else:
+                others.append(smallest)
+                ordered = self._walk_file_order(after)
+        else:
+            others = []
+            ordered = self._walk_file_order(after)
+        
+        yielded = 0
+        for scanned, file_id in enumerate(ordered, 1):
+            file_data = self.files.get(file_id)
+            if file_data is None or any(file_id not in ids for ids in others):
+                continue
+            
+            created_at = file_data['created_at']
+            if created_before is not None and created_at >= created_before:
+                break
+            if created_after is not None and created_at < created_after:
+                continue
+            if min_access is not None and file_data['access_count'] < min_access:
+                continue
+            
+            yield file_id, file_data
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+            
+            # Keep the event loop responsive on long scans
+            if scanned % 1000 == 0:
+                await asyncio.sleep(0)
+    
+    async def get_top_files(self, limit: int = 10) -> List[Tuple[int, Dict]]:
+        """Get the most accessed files using the access_count index"""
+        top = []
+        for count in sorted(self.files_by_access, reverse=True):
+            for file_id in self.files_by_access[count]:
+                top.append((file_id, self.files[file_id]))
+                if len(top) >= limit:
+                    return top
+        return top
+    
+    async def get_trending_files(self, hours: int = 24, limit: int = 5) -> List[Tuple[int, Dict, int]]:
+        """Get the most downloaded (file_id, file_data, downloads) from the hourly analytics counters"""
+        trending = []
+        for file_id, downloads in self.analytics.get_top_files(hours, None):
+            file_data = self.files.get(file_id)
+            if file_data:
+                trending.append((file_id, file_data, downloads))
+                if len(trending) >= limit:
+                    break
+        return trending
+    
     async def get_user_files(self, user_id: int) -> List[Dict]:
         """Get all files for a user"""
         if user_id not in self.user_files:
@@ -165,9 +639,9 @@ class Database:
         return [self.files[fid] for fid in user_file_ids if fid in self.files]
     
     # Batch management
-    async def save_batch(self, batch_id: str, batch_data: Dict) -> str:
+    async def save_batch(self, batch_id: str, batch_data: Dict) -> int:
         """Save batch"""
-        unique_id = f"batch_{int(time.time())}_{len(self.batches)}"
+        unique_id = self.id_allocator.next_id()
         
         self.batches[unique_id] = {
             **batch_data,
@@ -175,22 +649,145 @@ class Database:
             'access_count': 0
         }
         
+        manifest = batch_data.get('manifest')
+        if manifest:
+            for key in self._manifest_bucket_keys(manifest):
+                self.manifest_buckets.setdefault(key, set()).add(unique_id)
+        
         self.total_batches += 1
         return unique_id
     
-    async def get_batch(self, batch_id: str) -> Optional[Dict]:
+    def _manifest_bucket_keys(self, manifest: BatchManifest) -> Set[Tuple[Union[int, str], int]]:
+        """Range index buckets a manifest's messages fall into"""
+        if manifest.message_ids is not None:
+            buckets = {message_id // MANIFEST_BUCKET_SIZE for message_id in manifest.message_ids}
+        else:
+            buckets = range(manifest.first_message_id // MANIFEST_BUCKET_SIZE, manifest.last_message_id // MANIFEST_BUCKET_SIZE + 1)
+        return {(manifest.channel_id, bucket) for bucket in buckets}
+    
+    async def get_batch(self, batch_id: int, record_access: bool = True) -> Optional[Dict]:
         """Get batch by ID"""
         batch_data = self.batches.get(batch_id)
-        if batch_data:
-            # Increment access count
-            batch_data['access_count'] += 1
+        if batch_data and record_access:
+            await self.record_batch_download(batch_id)
         return batch_data
     
-    async def delete_batch(self, batch_id: str):
+    async def record_batch_download(self, batch_id: int):
+        """Count a batch download"""
+        # Counted in memory, applied to access_count on the next analytics flush
+        self.analytics.record_batch(batch_id)
+    
+    async def apply_batch_access_counts(self, counts: Dict[int, int]):
+        """Apply aggregated access count increments to batches"""
+        for batch_id, count in counts.items():
+            batch_data = self.batches.get(batch_id)
+            if batch_data:
+                batch_data['access_count'] += count
+    
+    async def delete_batch(self, batch_id: int):
         """Delete batch"""
         if batch_id in self.batches:
+            manifest = self.batches[batch_id].get('manifest')
+            if manifest:
+                for key in self._manifest_bucket_keys(manifest):
+                    batch_ids = self.manifest_buckets.get(key)
+                    if batch_ids is not None:
+                        batch_ids.discard(batch_id)
+                        if not batch_ids:
+                            del self.manifest_buckets[key]
+            
+            self.batch_cursors.pop(batch_id, None)
             del self.batches[batch_id]
     
+    async def discard_batch_message(self, batch_id: int, message_id: int) -> bool:
+        """Drop a message gone from the channel from a batch, keeping its file count in step"""
+        batch_data = self.batches.get(batch_id)
+        if not batch_data or not batch_data['manifest'].discard(message_id):
+            return False
+        batch_data['total_files'] -= 1
+        return True
+    
+    async def get_batch_cursor(self, user_id: int, batch_id: int) -> Optional[Tuple[int, int]]:
+        """Get a user's (next position, files delivered) cursor in a batch"""
+        cursor = self.batch_cursors.get(batch_id, {}).get(user_id)
+        if cursor is None or time.time() - cursor[2] > self.batch_cursor_ttl:
+            return None
+        return cursor[0], cursor[1]
+    
+    async def set_batch_cursor(self, user_id: int, batch_id: int, position: int, delivered: int):
+        """Remember where a user's paginated batch delivery continues"""
+        self.batch_cursors.setdefault(batch_id, {})[user_id] = (position, delivered, time.time())
+    
+    async def clear_batch_cursor(self, user_id: int, batch_id: int):
+        """Forget a user's cursor once the batch is fully delivered"""
+        cursors = self.batch_cursors.get(batch_id)
+        if cursors is not None:
+            cursors.pop(user_id, None)
+            if not cursors:
+                del self.batch_cursors[batch_id]
+    
+    async def cleanup_batch_cursors(self) -> int:
+        """Forget cursors of batches nobody continued within the cursor TTL"""
+        cutoff = time.time() - self.batch_cursor_ttl
+        expired = 0
+        for batch_id in list(self.batch_cursors):
+            cursors = self.batch_cursors[batch_id]
+            for user_id in [user_id for user_id, cursor in cursors.items() if cursor[2] < cutoff]:
+                del cursors[user_id]
+                expired += 1
+            if not cursors:
+                del self.batch_cursors[batch_id]
+        return expired
+    
+    async def get_message_meta(self, channel_id: Union[int, str], message_id: int) -> Optional[Dict]:
+        """Get cached metadata of a channel message"""
+        key = (channel_id, message_id)
+        meta = self.message_meta.get(key)
+        if meta is not None:
+            self.message_meta.move_to_end(key)
+            self.message_meta_hits += 1
+        else:
+            self.message_meta_misses += 1
+        return meta
+    
+    async def cache_message_meta(self, channel_id: Union[int, str], message_id: int, meta: Dict):
+        """Cache metadata of a channel message resolved for a manifest batch"""
+        self.message_meta[(channel_id, message_id)] = meta
+        self.message_meta.move_to_end((channel_id, message_id))
+        if len(self.message_meta) > self.message_meta_size:
+            self.message_meta.popitem(last=False)
+    
+    # Short link management
+    async def get_short_code(self, payload: str, length: int = 6) -> str:
+        """Get the short code for a start payload, issuing a new base62 code if needed"""
+        code = self.payload_short_codes.get(payload)
+        if code:
+            return code
+        
+        alphabet = string.digits + string.ascii_letters
+        while True:
+            code = ''.join(secrets.choice(alphabet) for _ in range(length))
+            if code not in self.short_codes:
+                break
+        
+        self.short_codes[code] = payload
+        self.payload_short_codes[payload] = code
+        self.short_code_hits[code] = 0
+        return code
+    
+    async def get_short_code_payload(self, code: str) -> Optional[str]:
+        """Get the start payload behind a short code"""
+        return self.short_codes.get(code)
+    
+    async def record_short_code_hit(self, code: str):
+        """Count a redirect served for a short code"""
+        if code in self.short_code_hits:
+            self.short_code_hits[code] += 1
+    
+    async def get_short_code_hits(self, code: str) -> int:
+        """Get number of redirects served for a short code"""
+        return self.short_code_hits.get(code, 0)
+    
     # Force subscription management
     async def add_force_sub_channel(self, channel_id: int):
         """Add force subscription channel"""
@@ -242,6 +839,12 @@ class Database:
             'total_batches': self.total_batches,
             'current_files': len(self.files),
             'current_batches': len(self.batches),
+            'short_links': len(self.short_codes),
+            'bytes_by_type': dict(self.bytes_by_type),
+            'total_bytes': sum(self.bytes_by_type.values()),
+            'new_users_today': await self.get_new_users_count(1),
+            'new_users_7d': await self.get_new_users_count(7),
+            'downloads': self.analytics.get_download_rates(),
             'uptime': uptime,
             'force_sub_channels': len(self.force_sub_channels),
             'force_sub_enabled': self.force_sub_enabled,
@@ -286,13 +889,37 @@ class Database:
         
         return len(expired_batches)
     
+    async def cleanup_tombstones(self) -> int:
+        """Forget deleted channel posts and file tombstones older than the tombstone TTL"""
+        cutoff = time.time() - self.tombstone_ttl
+        
+        expired = [key for key, deleted_at in self.deleted_messages.items() if deleted_at < cutoff]
+        for key in expired:
+            del self.deleted_messages[key]
+        
+        expired_files = [file_id for file_id, tombstone in self.tombstones.items() if tombstone['deleted_at'] < cutoff]
+        for file_id in expired_files:
+            del self.tombstones[file_id]
+        
+        return len(expired) + len(expired_files)
+    
     async def start_cleanup_task(self):
         """Start periodic cleanup task"""
         while True:
             try:
                 await asyncio.sleep(300)  # Run every 5 minutes
-                deleted_files = await self.cleanup_expired_files()
-                deleted_batches = await self.cleanup_expired_batches()
+                with metrics.timer("cleanup", "expired_files"):
+                    deleted_files = await self.cleanup_expired_files()
+                with metrics.timer("cleanup", "expired_batches"):
+                    deleted_batches = await self.cleanup_expired_batches()
+                with metrics.timer("cleanup", "tombstones"):
+                    deleted_tombstones = await self.cleanup_tombstones()
+                with metrics.timer("cleanup", "batch_cursors"):
+                    deleted_cursors = await self.cleanup_batch_cursors()
+                metrics.inc("cleanup_deleted", deleted_files or 0, kind="files")
+                metrics.inc("cleanup_deleted", deleted_batches or 0, kind="batches")
+                metrics.inc("cleanup_deleted", deleted_tombstones, kind="tombstones")
+                metrics.inc("cleanup_deleted", deleted_cursors, kind="batch_cursors")
                 
                 if deleted_files or deleted_batches:
                     logger.info(f"Cleanup completed: {deleted_files} files, {deleted_batches} batches deleted")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact record types for the in-memory database
+"""
+
+import bisect
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple, Union
+
+@dataclass(slots=True)
+class UserRecord:
+    """Per-user profile kept for every bot user"""
+    first_seen: float
+    last_seen: float
+    last_file_access: float = 0.0
+    language: Optional[str] = None
+    
+    # Delivery health, updated by broadcasts
+    failed_deliveries: int = 0  # consecutive failures
+    unreachable: bool = False  # blocked the bot or deleted the account
+
+@dataclass(slots=True)
+class BatchManifest:
+    """Lazily resolved batch: a message range or ID list plus a bitmap of media-bearing positions"""
+    channel_id: Union[int, str]
+    first_message_id: int = 0
+    last_message_id: int = 0
+    message_ids: Optional[array] = None  # explicit IDs for custom batches, None for a plain range
+    media_bitmap: bytearray = field(default_factory=bytearray)
+    
+    @classmethod
+    def from_range(cls, channel_id: Union[int, str], first_message_id: int, last_message_id: int) -> "BatchManifest":
+        """Manifest covering every message from first to last (inclusive)"""
+        size = last_message_id - first_message_id + 1
+        return cls(channel_id, first_message_id, last_message_id, None, bytearray((size + 7) // 8))
+    
+    @classmethod
+    def from_ids(cls, channel_id: Union[int, str], message_ids: List[int]) -> "BatchManifest":
+        """Manifest covering an explicit, sorted list of message IDs"""
+        ids = array('q', message_ids)
+        return cls(channel_id, ids[0], ids[-1], ids, bytearray((len(ids) + 7) // 8))
+    
+    def __len__(self) -> int:
+        if self.message_ids is not None:
+            return len(self.message_ids)
+        return self.last_message_id - self.first_message_id + 1
+    
+    def message_id_at(self, position: int) -> int:
+        """Message ID at a manifest position"""
+        if self.message_ids is not None:
+            return self.message_ids[position]
+        return self.first_message_id + position
+    
+    def position_of(self, message_id: int) -> Optional[int]:
+        """Manifest position of a message ID, or None if it is not covered"""
+        if self.message_ids is not None:
+            position = bisect.bisect_left(self.message_ids, message_id)
+            if position < len(self.message_ids) and self.message_ids[position] == message_id:
+                return position
+            return None
+        if self.first_message_id <= message_id <= self.last_message_id:
+            return message_id - self.first_message_id
+        return None
+    
+    def set_media(self, position: int, has_media: bool = True):
+        """Mark whether the message at a position carries media"""
+        if has_media:
+            self.media_bitmap[position >> 3] |= 1 << (position & 7)
+        else:
+            self.media_bitmap[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+    
+    def has_media(self, position: int) -> bool:
+        """Check whether the message at a position carries media"""
+        return bool(self.media_bitmap[position >> 3] & (1 << (position & 7)))
+    
+    def discard(self, message_id: int) -> bool:
+        """Drop a message (e.g. deleted from the channel), returning True if it was a media entry"""
+        position = self.position_of(message_id)
+        if position is None or not self.has_media(position):
+            return False
+        self.set_media(position, False)
+        return True
+    
+    @property
+    def media_count(self) -> int:
+        """Number of media-bearing messages"""
+        return sum(byte.bit_count() for byte in self.media_bitmap)
+    
+    def media_message_ids(self) -> Iterator[int]:
+        """Iterate the IDs of media-bearing messages in order"""
+        for position in range(len(self)):
+            if self.has_media(position):
+                yield self.message_id_at(position)
+    
+    def media_page(self, position: int, limit: int) -> Tuple[List[int], int]:
+        """Up to `limit` media message IDs from a position, plus the position to continue from"""
+        message_ids = []
+        while position < len(self) and len(message_ids) < limit:
+            if self.has_media(position):
+                message_ids.append(self.message_id_at(position))
+            position += 1
+        return message_ids, position
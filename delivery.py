@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fair-share delivery scheduler for FileStore Bot
+
+Every outgoing file copy goes through one scheduler. Single-file requests
+use a priority lane; batch pages are queued per user and served
+round-robin, so one large batch cannot starve everyone else. Sends are
+paced to a global rate, each chat gets at most one file per
+user_interval, and a FloodWait pauses the whole scheduler instead of
+every task sleeping on its own.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+from pyrogram.errors import FloodWait
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[], Awaitable]
+
+class DeliveryScheduler:
+    def __init__(self, rate: float = 20.0, user_interval: float = 1.0, max_in_flight: int = 20):
+        self.rate = rate  # sends per second across all users
+        self.user_interval = user_interval  # minimum seconds between sends to one chat
+        
+        self.priority: Deque[Tuple[int, Send, asyncio.Future]] = deque()  # single-file lane
+        self.queues: Dict[int, Deque[Tuple[Send, asyncio.Future]]] = {}  # chat_id -> queued batch sends
+        self.ring: Deque[int] = deque()  # chats with queued sends, in round-robin order
+        self.next_allowed: Dict[int, float] = {}  # chat_id -> earliest next send
+        self.queued: int = 0
+        
+        self.next_send: float = 0.0
+        self.paused_until: float = 0.0
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        
+        self.stats: Dict[str, int] = {'sent': 0, 'failed': 0, 'flood_waits': 0}
+    
+    def start(self):
+        """Start the dispatcher"""
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        """Stop the dispatcher and cancel everything still queued"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        
+        for _, _, future in self.priority:
+            future.cancel()
+        for queue in self.queues.values():
+            for _, future in queue:
+                future.cancel()
+        self.priority.clear()
+        self.queues.clear()
+        self.ring.clear()
+        self.queued = 0
+    
+    def enqueue(self, chat_id: int, send: Send, priority: bool = False) -> asyncio.Future:
+        """Queue a send for a chat; the returned future resolves with its result"""
+        future = asyncio.get_running_loop().create_future()
+        
+        if priority:
+            self.priority.append((chat_id, send, future))
+        else:
+            queue = self.queues.get(chat_id)
+            if queue is None:
+                queue = self.queues[chat_id] = deque()
+                self.ring.append(chat_id)
+            queue.append((send, future))
+        
+        self.queued += 1
+        self.wakeup.set()
+        return future
+    
+    def estimate(self, chat_id: int, priority: bool = False) -> Tuple[int, float]:
+        """Estimate (sends ahead, seconds to wait) for a new send to a chat"""
+        if priority:
+            ahead = len(self.priority)
+            wait = ahead / self.rate
+        else:
+            own = len(self.queues.get(chat_id, ()))
+            # Round-robin: each of our queued sends waits for one turn of every active chat
+            ahead = len(self.priority) + (own + 1) * len(self.ring) - (1 if own else 0)
+            wait = max(ahead / self.rate, own * self.user_interval)
+        
+        return ahead, wait + self.paused_for
+    
+    @property
+    def paused_for(self) -> float:
+        """Seconds left of the current FloodWait pause"""
+        return max(0.0, self.paused_until - time.monotonic())
+    
+    def _next(self, now: float) -> Optional[Tuple[int, Send, asyncio.Future]]:
+        """Pick the next send: priority lane first, then round-robin over ready chats"""
+        if self.priority:
+            return self.priority.popleft()
+        
+        for _ in range(len(self.ring)):
+            chat_id = self.ring[0]
+            self.ring.rotate(-1)
+            if self.next_allowed.get(chat_id, 0.0) > now:
+                continue
+            
+            queue = self.queues[chat_id]
+            send, future = queue.popleft()
+            if not queue:
+                # The chat was just rotated to the back of the ring
+                del self.queues[chat_id]
+                self.ring.pop()
+            
+            self.next_allowed[chat_id] = now + self.user_interval
+            return chat_id, send, future
+        
+        return None
+    
+    def _idle_timeout(self, now: float) -> Optional[float]:
+        """Seconds until a queued chat may send again (None if nothing is queued)"""
+        if not self.ring:
+            return None
+        return max(0.0, min(self.next_allowed.get(chat_id, 0.0) for chat_id in self.ring) - now)
+    
+    async def run(self):
+        """Dispatch queued sends at the configured pace"""
+        while True:
+            now = time.monotonic()
+            delay = max(self.next_send, self.paused_until) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            
+            item = self._next(now)
+            if item is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self._idle_timeout(now))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # Forget pacing state of chats that went quiet
+            if len(self.next_allowed) > 10000:
+                self.next_allowed = {chat_id: t for chat_id, t in self.next_allowed.items() if t > now}
+            
+            self.queued -= 1
+            self.next_send = now + 1 / self.rate
+            await self.in_flight.acquire()
+            asyncio.create_task(self._deliver(*item))
+    
+    async def _deliver(self, chat_id: int, send: Send, future: asyncio.Future):
+        """Run one send and resolve its future"""
+        try:
+            result = await send()
+        except FloodWait as e:
+            # Pause everyone and retry this send first once the wait is over
+            self.stats['flood_waits'] += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + e.value)
+            self.priority.appendleft((chat_id, send, future))
+            self.queued += 1
+            self.wakeup.set()
+            logger.warning(f"FloodWait of {e.value}s while delivering to {chat_id}, pausing deliveries")
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.stats['sent'] += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self.in_flight.release()
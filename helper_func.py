@@ -5,15 +5,19 @@ Helper functions for the FileStore Bot
 """
 
 import base64
+import hashlib
+import hmac
 import string
 import random
+import time
 import asyncio
 import aiofiles
-from typing import Union, List
+from typing import Union, List, Dict, Optional, Tuple
 from pyrogram import Client
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram import FloodWait, UserIsBlocked, InputUserDeactivated
+from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated
 from config import Config
+from metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +30,136 @@ def decode(s: str) -> str:
     """Decode base64 string"""
     return base64.urlsafe_b64decode(s.encode("ascii")).decode("ascii")
 
+# Link token kinds (first byte of a link token)
+LINK_FILE = 1
+LINK_BATCH = 2
+LINK_SIGNED_FILE = 3  # Stateless: carries channel_id, message_id and expiry
+
+# Telegram rejects start parameters longer than 64 characters
+MAX_TOKEN_LENGTH = 64
+LINK_MAC_SIZE = 6
+
+def encode_varint(value: int) -> bytes:
+    """Encode a non-negative integer as an unsigned LEB128 varint"""
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def decode_varint(data: bytes, offset: int = 0) -> Tuple[int, int]:
+    """Decode a canonical 64-bit varint at offset, returning (value, next_offset)"""
+    value = 0
+    shift = 0
+    while offset < len(data):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            # A zero final byte after continuation bytes is a longer spelling of a shorter varint
+            if byte == 0 and shift:
+                raise ValueError("Overlong varint")
+            if value >> 64:
+                raise ValueError("Varint overflows 64 bits")
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise ValueError("Varint overflows 64 bits")
+    raise ValueError("Truncated varint")
+
+def zigzag_encode(value: int) -> int:
+    """Map a signed integer to a non-negative one (so negative chat IDs stay short)"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def zigzag_decode(value: int) -> int:
+    """Inverse of zigzag_encode"""
+    return value // 2 if not value & 1 else -(value + 1) // 2
+
+def _link_mac(body: bytes) -> bytes:
+    """Truncated HMAC of a token body"""
+    return hmac.new(Config.LINK_SECRET.encode(), body, hashlib.sha256).digest()[:LINK_MAC_SIZE]
+
+def _b64_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64_decode(token: str) -> bytes:
+    return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+
+def _pack_link(body: bytes) -> str:
+    """Append the HMAC (when a secret is configured) and base64url-encode"""
+    if Config.LINK_SECRET:
+        body += _link_mac(body)
+    return _b64_encode(body)
+
+def encode_link(kind: int, item_id: int) -> str:
+    """Encode a file/batch ID as a compact link token: kind byte + varint ID (+ HMAC)"""
+    return _pack_link(bytes([kind]) + encode_varint(item_id))
+
+def encode_signed_file_link(channel_id: int, message_id: int, expires_at: int = 0) -> str:
+    """Encode a stateless file link that needs no database lookup (requires LINK_SECRET)"""
+    if not Config.LINK_SECRET:
+        raise ValueError("LINK_SECRET is required for stateless links")
+    body = (bytes([LINK_SIGNED_FILE]) + encode_varint(zigzag_encode(channel_id)) +
+            encode_varint(message_id) + encode_varint(expires_at))
+    return _pack_link(body)
+
+def get_file_token(file_id: int, file_data: Dict) -> str:
+    """Get the start token for a file: a signed stateless token when enabled, else the file ID"""
+    channel_id = file_data.get('channel_id')
+    if Config.STATELESS_LINKS and isinstance(channel_id, int):
+        expires_at = int(time.time()) + Config.STATELESS_LINK_TTL if Config.STATELESS_LINK_TTL else 0
+        return encode_signed_file_link(channel_id, file_data['message_id'], expires_at)
+    return encode_link(LINK_FILE, file_id)
+
+def decode_link(token: str) -> Optional[Tuple[int, Union[int, Tuple[int, int, int]]]]:
+    """Decode a link token to (kind, payload); returns None for garbage or forged tokens"""
+    # payload is the item ID for file/batch links and
+    # (channel_id, message_id, expires_at) for stateless file links
+    if not token or len(token) > MAX_TOKEN_LENGTH:
+        return None
+    
+    try:
+        data = _b64_decode(token)
+    except (ValueError, TypeError):
+        return None
+    
+    # Only the canonical encoding is accepted
+    if _b64_encode(data) != token:
+        return None
+    
+    if Config.LINK_SECRET:
+        if len(data) <= LINK_MAC_SIZE:
+            return None
+        data, mac = data[:-LINK_MAC_SIZE], data[-LINK_MAC_SIZE:]
+        if not hmac.compare_digest(mac, _link_mac(data)):
+            return None
+    
+    if len(data) < 2:
+        return None
+    
+    kind = data[0]
+    values = []
+    offset = 1
+    try:
+        while offset < len(data):
+            value, offset = decode_varint(data, offset)
+            values.append(value)
+    except ValueError:
+        return None
+    
+    if kind in (LINK_FILE, LINK_BATCH) and len(values) == 1:
+        return kind, values[0]
+    
+    # Stateless links are only valid when signed
+    if kind == LINK_SIGNED_FILE and Config.LINK_SECRET and len(values) == 3:
+        return kind, (zigzag_decode(values[0]), values[1], values[2])
+    
+    return None
+
 def get_readable_time(seconds: int) -> str:
     """Convert seconds to human readable time"""
     periods = [('d', 86400), ('h', 3600), ('m', 60), ('s', 1)]
@@ -52,7 +186,7 @@ async def send_msg(user_id: int, message: Message, client: Client):
         await message.copy(chat_id=user_id)
         return 200, None
     except FloodWait as e:
-        await asyncio.sleep(e.x)
+        await asyncio.sleep(e.value)
         return await send_msg(user_id, message, client)
     except InputUserDeactivated:
         return 400, f"{user_id} : deactivated"
@@ -127,6 +261,7 @@ def get_random_string(length: int = 8) -> str:
     letters = string.ascii_lowercase + string.digits
     return ''.join(random.choice(letters) for _ in range(length))
 
+@metrics.instrument("step", "force_sub_check")
 async def is_subscribed(client: Client, user_id: int, channels: List[int]) -> tuple:
     """Check if user is subscribed to channels"""
     if not channels:
@@ -144,6 +279,9 @@ async def is_subscribed(client: Client, user_id: int, channels: List[int]) -> tu
     
     return True, None
 
+# Every value get_file_type can return
+FILE_TYPES = ("document", "video", "audio", "photo", "animation", "voice", "video_note", "sticker", "unknown")
+
 def get_file_type(message: Message) -> str:
     """Get file type from message"""
     if message.document:
@@ -165,6 +303,25 @@ def get_file_type(message: Message) -> str:
     else:
         return "unknown"
 
+def has_media(message: Message) -> bool:
+    """Check if a message carries a storable media file"""
+    return bool(message and not message.empty and (
+        message.document or message.video or message.audio or
+        message.photo or message.animation or message.voice or
+        message.video_note or message.sticker
+    ))
+
+def get_media_meta(message: Message) -> Dict:
+    """Get the file metadata stored for a media message"""
+    file_size = get_media_file_size(message)
+    return {
+        'file_name': get_name(message),
+        'file_size': file_size,
+        'file_size_human': get_size(file_size or 0),
+        'file_type': get_file_type(message),
+        'file_hash': get_hash(message)
+    }
+
 async def get_verify_status(user_id: int) -> dict:
     """Get user verification status (placeholder for token verification)"""
     return {
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Self-hosted short link resolver for FileStore Bot
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlsplit, parse_qs
+from aiohttp import web
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ShortLinkServer:
+    def __init__(self, bot, cache_size: int = 10000):
+        self.bot = bot
+        self.db = bot.db
+        self.base_url = Config.SHORT_LINK_BASE_URL.rstrip("/")
+        self.host = Config.SHORT_LINK_HOST
+        self.port = Config.SHORT_LINK_PORT
+        
+        # code -> redirect location (LRU)
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        
+        self.app = web.Application()
+        self.app.router.add_get("/{code}", self.handle_redirect)
+        self.runner: Optional[web.AppRunner] = None
+    
+    async def start(self):
+        """Start the redirect server"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Short link server listening on {self.host}:{self.port} ({self.base_url})")
+    
+    async def stop(self):
+        """Stop the redirect server"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+    
+    async def shorten(self, long_url: str) -> str:
+        """Issue a short link for a bot deep link; other URLs are returned unchanged"""
+        payload = parse_qs(urlsplit(long_url).query).get("start")
+        if not payload:
+            return long_url
+        
+        code = await self.db.get_short_code(payload[0])
+        return f"{self.base_url}/{code}"
+    
+    async def handle_redirect(self, request: web.Request) -> web.Response:
+        """Redirect a short code to the bot deep link"""
+        code = request.match_info["code"]
+        
+        location = self.cache.get(code)
+        if location is None:
+            self.cache_misses += 1
+            payload = await self.db.get_short_code_payload(code)
+            if payload is None:
+                return web.Response(status=404, text="Link not found")
+            
+            location = f"https://t.me/{self.bot.username}?start={payload}"
+            self.cache[code] = location
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(code)
+            self.cache_hits += 1
+        
+        await self.db.record_short_code_hit(code)
+        return web.Response(status=302, headers={"Location": location})
@@ -6,6 +6,7 @@ Main entry point for the Telegram FileStore Bot
 
 import asyncio
 import logging
+import signal
 from bot import Bot
 
 # Configure logging
@@ -18,15 +19,28 @@ logger = logging.getLogger(__name__)
 
 async def main():
     """Main function to run the bot"""
+    logger.info("Starting FileStore Bot...")
+    bot = Bot()
     try:
-        logger.info("Starting FileStore Bot...")
-        bot = Bot()
         await bot.start()
-        logger.info("Bot started successfully!")
-        await asyncio.Event().wait()  # Keep the bot running
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
         raise
+    logger.info("Bot started successfully!")
+    
+    # Keep the bot running until SIGINT/SIGTERM, then stop it cleanly so buffers are flushed
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C cancels the wait below instead
+    
+    try:
+        await stopping.wait()
+    finally:
+        await bot.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
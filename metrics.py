@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latency instrumentation for FileStore Bot
+
+Plugin handlers, outbound Telegram API calls and selected hot-path steps
+record their duration into fixed-bucket histograms, along with call and
+error counts. Components add counters and gauges (FloodWaits, queue depth,
+cache hit ratios, event loop lag) through collectors that run on every
+scrape. The figures back the admin /perf command and are served in
+Prometheus text format when METRICS_ENABLED is set.
+"""
+
+import asyncio
+import bisect
+import functools
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from aiohttp import web
+from pyrogram import StopPropagation, ContinuePropagation
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Control flow exceptions that are not failures
+NOT_ERRORS = (StopPropagation, ContinuePropagation, GeneratorExit)
+
+# kind -> Prometheus label name
+KIND_LABELS = {
+    'handler': 'handler',
+    'api': 'method',
+    'step': 'step',
+    'cleanup': 'sweep'
+}
+
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop lag probes
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def format_value(value: float) -> str:
+    """Render a sample value without losing precision on large totals"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'errors')
+    
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.errors: int = 0
+    
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+    
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+    
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+class Metrics:
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}  # (kind, name) -> histogram
+        self.counters: Dict[Tuple[str, Labels], float] = {}  # (name, labels) -> running total
+        self.gauges: Dict[Tuple[str, Labels], float] = {}  # (name, labels) -> current value
+        self.active: Dict[str, int] = {}  # kind -> timed calls currently running
+        self.collectors: List[Callable] = []  # refresh counters/gauges before each scrape
+        self.started_at = time.time()
+        
+        # Event loop lag: how late a LOOP_LAG_INTERVAL sleep wakes up
+        self.loop_lag: float = 0.0
+        self.loop_lag_max: float = 0.0  # since the last scrape
+        self.lag_task: Optional[asyncio.Task] = None
+    
+    def observe(self, kind: str, name: str, seconds: float, error: bool = False):
+        """Record one timed call"""
+        histogram = self.histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.histograms[(kind, name)] = Histogram()
+        histogram.observe(seconds, error)
+    
+    @contextmanager
+    def timer(self, kind: str, name: str):
+        """Time the enclosed block (works inside coroutines too)"""
+        start = time.perf_counter()
+        error = False
+        self.active[kind] = self.active.get(kind, 0) + 1
+        try:
+            yield
+        except NOT_ERRORS:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.active[kind] -= 1
+            self.observe(kind, name, time.perf_counter() - start, error)
+    
+    def instrument(self, kind: str, name: Optional[str] = None) -> Callable:
+        """Decorator that times every call of a coroutine function"""
+        def decorator(func: Callable) -> Callable:
+            label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+            
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(kind, label):
+                    return await func(*args, **kwargs)
+            
+            return wrapper
+        return decorator
+    
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0.0) + amount
+    
+    def set_counter(self, name: str, value: float, **labels):
+        """Publish a running total kept by another component"""
+        self.counters[(name, tuple(sorted(labels.items())))] = value
+    
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge"""
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def set_cache(self, cache: str, hits: int, misses: int):
+        """Publish hit/miss totals and the hit ratio of a cache"""
+        self.set_counter("cache_hits", hits, cache=cache)
+        self.set_counter("cache_misses", misses, cache=cache)
+        self.set_gauge("cache_hit_ratio", hits / (hits + misses) if hits + misses else 0.0, cache=cache)
+    
+    def add_collector(self, collector: Callable):
+        """Register a (sync or async) callable that refreshes metrics before each scrape"""
+        self.collectors.append(collector)
+    
+    async def collect(self):
+        """Run every collector, logging the ones that fail"""
+        self.set_gauge("event_loop_lag_seconds", self.loop_lag)
+        self.set_gauge("event_loop_lag_max_seconds", self.loop_lag_max)
+        self.loop_lag_max = self.loop_lag
+        for kind, count in self.active.items():
+            self.set_gauge("in_flight", count, kind=kind)
+        
+        for collector in self.collectors:
+            try:
+                result = collector()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error in metrics collector {getattr(collector, '__qualname__', collector)}: {e}")
+    
+    async def monitor_loop_lag(self):
+        """Measure how late the event loop wakes up from a short sleep"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+            self.loop_lag_max = max(self.loop_lag_max, self.loop_lag)
+    
+    def start(self):
+        """Start the event loop lag monitor"""
+        if not self.lag_task:
+            self.lag_task = asyncio.create_task(self.monitor_loop_lag())
+    
+    def stop(self):
+        """Stop the event loop lag monitor"""
+        if self.lag_task:
+            self.lag_task.cancel()
+            self.lag_task = None
+    
+    def reset(self):
+        """Forget every histogram and counter recorded so far"""
+        self.histograms.clear()
+        self.counters.clear()
+        self.started_at = time.time()
+    
+    def top(self, kind: str, limit: int = 10) -> List[Tuple[str, Histogram]]:
+        """(name, histogram) of one kind, busiest first"""
+        rows = [(name, histogram) for (k, name), histogram in self.histograms.items() if k == kind]
+        rows.sort(key=lambda row: -row[1].total)
+        return rows[:limit]
+    
+    def render_prometheus(self) -> str:
+        """Render all histograms in the Prometheus text exposition format"""
+        lines = []
+        for kind, label in KIND_LABELS.items():
+            rows = sorted((name, histogram) for (k, name), histogram in self.histograms.items() if k == kind)
+            family = f"filestore_{kind}_duration_seconds"
+            lines.append(f"# HELP {family} Latency of {kind} calls")
+            lines.append(f"# TYPE {family} histogram")
+            
+            for name, histogram in rows:
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{family}_bucket{{{label}="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{family}_sum{{{label}="{name}"}} {histogram.total:.6f}')
+                lines.append(f'{family}_count{{{label}="{name}"}} {histogram.count}')
+            
+            errors = f"filestore_{kind}_errors_total"
+            lines.append(f"# HELP {errors} Failed {kind} calls")
+            lines.append(f"# TYPE {errors} counter")
+            for name, histogram in rows:
+                lines.append(f'{errors}{{{label}="{name}"}} {histogram.errors}')
+        
+        self._render_series(lines, self.counters, "counter", "_total")
+        self._render_series(lines, self.gauges, "gauge", "")
+        return "\n".join(lines) + "\n"
+    
+    def _render_series(self, lines: List[str], series: Dict[Tuple[str, Labels], float], metric_type: str, suffix: str):
+        """Append counters or gauges, grouped by name"""
+        previous = None
+        for (name, labels), value in sorted(series.items()):
+            family = f"filestore_{name}{suffix}"
+            if name != previous:
+                lines.append(f"# TYPE {family} {metric_type}")
+                previous = name
+            
+            if labels:
+                rendered = ",".join(f'{key}="{label_value}"' for key, label_value in labels)
+                lines.append(f"{family}{{{rendered}}} {format_value(value)}")
+            else:
+                lines.append(f"{family} {format_value(value)}")
+
+class MetricsServer:
+    def __init__(self, registry: "Metrics"):
+        self.registry = registry
+        self.host = Config.METRICS_HOST
+        self.port = Config.METRICS_PORT
+        
+        self.app = web.Application()
+        self.app.router.add_get("/metrics", self.handle_metrics)
+        self.runner: Optional[web.AppRunner] = None
+    
+    async def start(self):
+        """Start the metrics endpoint"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Metrics endpoint listening on {self.host}:{self.port}/metrics")
+    
+    async def stop(self):
+        """Stop the metrics endpoint"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+    
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        await self.registry.collect()
+        return web.Response(
+            text=self.registry.render_prometheus(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+# Global metrics instance
+metrics = Metrics()
@@ -18,7 +18,9 @@ PLUGINS = [
     "batch",
     "channel_post",
     "broadcast",
-    "force_sub"
+    "force_sub",
+    "ban_gate",
+    "shortener_admin"
 ]
 
 def load_plugins():
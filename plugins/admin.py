@@ -4,45 +4,99 @@
 Admin commands plugin
 """
 
+import csv
+import io
 import logging
+import os
+import tempfile
 import time
+import aiofiles
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from helper_func import get_readable_time, get_size
+from auth import admin_only, is_admin
+from helper_func import get_readable_time, get_size, FILE_TYPES
+from metrics import metrics
+from profiler import StackSampler
 
 logger = logging.getLogger(__name__)
 
-# Admin filter
-def admin_filter(_, __, message):
-    return message.from_user.id in Config.ADMINS
+# Longest /profile run, and whether one is running (only one at a time)
+MAX_PROFILE_SECONDS = 300
+profile_running = {'active': False}
 
-admin_only = filters.create(admin_filter)
+# Rendered /stats text is reused for a few seconds so refresh spam stays cheap, until channel edits or deletions change the store
+STATS_CACHE_TTL = 15
+stats_cache = {'text': None, 'expires_at': 0.0, 'version': 0, 'hits': 0, 'misses': 0}
 
-@Client.on_message(filters.command("stats") & admin_only)
-async def stats_command(client: Client, message: Message):
-    """Get bot statistics"""
-    try:
-        stats = await client.db.get_stats()
-        
-        uptime = get_readable_time(int(stats['uptime']))
-        
-        stats_text = f"""
+def collect_stats_cache_metrics():
+    metrics.set_cache("stats", stats_cache['hits'], stats_cache['misses'])
+
+metrics.add_collector(collect_stats_cache_metrics)
+
+async def render_stats(client: Client) -> str:
+    """Render the /stats text, reusing the cached snapshot while it is fresh"""
+    now = time.time()
+    if stats_cache['text'] and now < stats_cache['expires_at'] and stats_cache['version'] == client.db.stats_version:
+        stats_cache['hits'] += 1
+        return stats_cache['text']
+    
+    stats_cache['misses'] += 1
+    stats = await client.db.get_stats()
+    
+    uptime = get_readable_time(int(stats['uptime']))
+    downloads = stats['downloads']
+    
+    # Top files come from the hourly download counters, not a scan of the store
+    trending = await client.db.get_trending_files(hours=24, limit=5)
+    if trending:
+        top_files = "\n".join(
+            f"`{i}.` {file_data.get('file_name') or file_id} - `{count}`"
+            for i, (file_id, file_data, count) in enumerate(trending, 1)
+        )
+    else:
+        top_files = "No downloads yet"
+    
+    storage = "\n".join(
+        f"  • {file_type or 'unknown'}: `{get_size(size)}`"
+        for file_type, size in sorted(stats['bytes_by_type'].items(), key=lambda item: -item[1])
+    ) or "  • Nothing stored yet"
+    
+    stats_text = f"""
 📊 **Bot Statistics**
 
-👥 **Users:** `{stats['total_users']}`
+👥 **Users:** `{stats['total_users']}` (+{stats['new_users_today']} today, +{stats['new_users_7d']} this week)
 🚫 **Banned:** `{stats['total_banned']}`
 👮‍♂️ **Admins:** `{stats['total_admins']}`
 
 📁 **Files:** `{stats['current_files']}`
 📦 **Batches:** `{stats['current_batches']}`
 📤 **Total Uploaded:** `{stats['total_files']}`
+💾 **Stored:** `{get_size(stats['total_bytes'])}`
+{storage}
+
+📥 **Downloads (1h):** `{downloads['last_hour']}`
+📈 **Downloads (24h):** `{downloads['last_24h']}` (`{downloads['per_hour_24h']:.1f}`/hour)
+
+🔥 **Top Files (24h):**
+{top_files}
 
 ⏰ **Uptime:** `{uptime}`
 🔗 **Force Sub Channels:** `{stats['force_sub_channels']}`
 🗑️ **Auto Delete:** `{'✅ Enabled' if stats['auto_delete_enabled'] else '❌ Disabled'}`
 ⏱️ **Delete Time:** `{get_readable_time(stats['auto_delete_time'])}`
 """
+    
+    stats_cache['text'] = stats_text
+    stats_cache['expires_at'] = now + STATS_CACHE_TTL
+    stats_cache['version'] = client.db.stats_version
+    return stats_text
+
+@Client.on_message(filters.command("stats") & admin_only)
+async def stats_command(client: Client, message: Message):
+    """Get bot statistics"""
+    try:
+        stats_text = await render_stats(client)
         
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_stats")]
@@ -54,16 +108,146 @@ async def stats_command(client: Client, message: Message):
         logger.error(f"Error getting stats: {e}")
         await message.reply_text("❌ Error getting statistics!")
 
+def render_perf_rows(kind: str, limit: int = 8) -> str:
+    """One line per busiest handler/method: calls, error rate and latency percentiles"""
+    rows = metrics.top(kind, limit)
+    if not rows:
+        return "  • No calls recorded yet"
+    
+    return "\n".join(
+        f"  • `{name}`: {histogram.count} calls, {histogram.errors / histogram.count * 100:.1f}% err, "
+        f"p50 `{histogram.quantile(0.5) * 1000:.0f}ms` p95 `{histogram.quantile(0.95) * 1000:.0f}ms` "
+        f"avg `{histogram.mean * 1000:.0f}ms`"
+        for name, histogram in rows
+    )
+
+def render_flood_waits() -> str:
+    """FloodWait seconds incurred per API method"""
+    waits = sorted(
+        ((dict(labels)['method'], seconds) for (name, labels), seconds in metrics.counters.items()
+         if name == "flood_wait_seconds"),
+        key=lambda row: -row[1]
+    )
+    return "\n".join(f"  • `{method}`: `{seconds:.0f}s`" for method, seconds in waits) or "  • None"
+
+@Client.on_message(filters.command("perf") & admin_only)
+async def perf_command(client: Client, message: Message):
+    """Show handler, step and API latency histograms (/perf reset clears them)"""
+    if len(message.command) > 1 and message.command[1].lower() == "reset":
+        metrics.reset()
+        await message.reply_text("✅ Performance counters reset!")
+        return
+    
+    text = f"""
+⏱️ **Performance** (since {get_readable_time(int(time.time() - metrics.started_at))} ago)
+
+🧩 **Handlers:**
+{render_perf_rows('handler')}
+
+🔍 **Hot path steps:**
+{render_perf_rows('step')}
+
+📡 **Telegram API:**
+{render_perf_rows('api')}
+
+🌊 **FloodWaits:**
+{render_flood_waits()}
+
+🐢 **Event loop lag:** `{metrics.loop_lag * 1000:.0f}ms` (max `{metrics.loop_lag_max * 1000:.0f}ms`)
+"""
+    
+    await message.reply_text(text)
+
+@Client.on_message(filters.command("watchdog") & admin_only)
+async def watchdog_command(client: Client, message: Message):
+    """Toggle or inspect the event loop watchdog (/watchdog on|off|status)"""
+    action = message.command[1].lower() if len(message.command) > 1 else "status"
+    watchdog = client.watchdog
+    
+    if action == "on":
+        watchdog.start()
+        await message.reply_text(f"✅ Watchdog enabled (threshold `{watchdog.threshold}s`)")
+        return
+    if action == "off":
+        watchdog.stop()
+        await message.reply_text("✅ Watchdog disabled")
+        return
+    if action != "status":
+        await message.reply_text("❌ Usage: `/watchdog on|off|status`")
+        return
+    
+    text = f"""
+🐕 **Watchdog:** `{'✅ Enabled' if watchdog.enabled else '❌ Disabled'}`
+
+⏱️ **Threshold:** `{watchdog.threshold}s`
+🧩 **Handlers in flight:** `{metrics.active.get('handler', 0)}`
+🐢 **Event loop lag:** `{metrics.loop_lag * 1000:.0f}ms`
+🚨 **Stalls:** `{watchdog.stats['stalls']}` (`{watchdog.stats['stall_seconds']:.1f}s` total, longest `{watchdog.stats['longest_stall']:.1f}s`)
+"""
+    if watchdog.last_stall:
+        text += f"\n📍 **Last stall:**\n```\n{watchdog.last_stall[-1500:]}```"
+    
+    await message.reply_text(text)
+
+@Client.on_message(filters.command("profile") & filters.user(Config.OWNER_ID))
+async def profile_command(client: Client, message: Message):
+    """Sample the running bot for a few seconds and send the collapsed stacks"""
+    try:
+        seconds = int(message.command[1]) if len(message.command) > 1 else 30
+    except ValueError:
+        await message.reply_text("❌ Usage: `/profile <seconds>`")
+        return
+    
+    if not 1 <= seconds <= MAX_PROFILE_SECONDS:
+        await message.reply_text(f"❌ Profile length must be between 1 and {MAX_PROFILE_SECONDS} seconds!")
+        return
+    
+    if profile_running['active']:
+        await message.reply_text("⚠️ A profile is already running!")
+        return
+    
+    profile_running['active'] = True
+    status_msg = await message.reply_text(f"🔬 Profiling for `{seconds}s`...")
+    
+    fd, path = tempfile.mkstemp(suffix=".collapsed")
+    os.close(fd)
+    
+    try:
+        sampler = StackSampler()
+        await sampler.profile(seconds)
+        
+        async with aiofiles.open(path, "w") as f:
+            await f.write(sampler.collapsed())
+        
+        hot_spots = "\n".join(
+            f"  • `{frame}`: `{share:.1f}%`" for frame, share in sampler.hot_spots()
+        ) or "  • Nothing in plugins/ or database/ was sampled"
+        
+        await message.reply_document(
+            path,
+            file_name=f"profile_{int(time.time())}.collapsed",
+            caption=f"🔬 **Profile:** `{seconds}s`, `{sampler.sample_count}` samples\n\n"
+                    f"🔥 **Hot spots:**\n{hot_spots}\n\n"
+                    f"Open with speedscope or flamegraph.pl"
+        )
+        await status_msg.delete()
+        
+    except Exception as e:
+        logger.error(f"Error profiling: {e}")
+        await status_msg.edit_text("❌ Error while profiling!")
+    finally:
+        profile_running['active'] = False
+        os.remove(path)
+
 @Client.on_message(filters.command("users") & admin_only)
 async def users_command(client: Client, message: Message):
     """Get users information"""
     try:
-        all_users = await client.db.get_all_users()
-        banned_users = await client.db.get_banned_users()
-        
-        total_users = len(all_users)
-        total_banned = len(banned_users)
-        active_users = total_users - total_banned
+        total_users = await client.db.get_users_count()
+        active_users = await client.db.get_unbanned_users_count()
+        total_banned = total_users - active_users
+        new_today = await client.db.get_new_users_count(1)
+        new_week = await client.db.get_new_users_count(7)
         
         text = f"""
 👥 **Users Information**
@@ -72,7 +256,7 @@ async def users_command(client: Client, message: Message):
 ✅ **Active Users:** `{active_users}`
 🚫 **Banned Users:** `{total_banned}`
 
-📈 **User Growth:** +{total_users} users
+📈 **User Growth:** +{new_today} today, +{new_week} in the last 7 days
 📅 **Last Updated:** `{time.strftime('%Y-%m-%d %H:%M:%S')}`
 """
         
@@ -103,7 +287,7 @@ async def ban_unban_user(client: Client, message: Message):
         user_id = int(message.command[1])
         
         if cmd == "ban":
-            if user_id in Config.ADMINS:
+            if is_admin(client, user_id):
                 await message.reply_text("❌ Cannot ban an admin!")
                 return
             
@@ -283,11 +467,93 @@ async def auto_delete_commands(client: Client, message: Message):
             logger.error(f"Error checking delete time: {e}")
             await message.reply_text("❌ Error getting delete settings!")
 
+FILES_PAGE_SIZE = 10
+FILES_USAGE = f"❌ **Usage:** `/{{}} [type]`\n\n**Types:** `all`, {', '.join(f'`{file_type}`' for file_type in FILE_TYPES)}"
+
+async def render_files_page(client: Client, file_type: str, after: int):
+    """Render one page of stored files after the cursor"""
+    query = {} if file_type == "all" else {'file_type': file_type}
+    
+    # Fetch one extra record to know whether there is a next page
+    page = [item async for item in client.db.iter_files(query, after=after, limit=FILES_PAGE_SIZE + 1)]
+    has_more = len(page) > FILES_PAGE_SIZE
+    page = page[:FILES_PAGE_SIZE]
+    
+    if not page:
+        return "📂 **No files found!**", None
+    
+    text = f"📂 **Stored Files** (`{file_type}`)\n\n"
+    for file_id, file_data in page:
+        text += f"`{file_id}` **{file_data.get('file_name', 'Unknown')}**\n"
+        text += f"    {file_data.get('file_type', 'unknown')} • {file_data.get('file_size_human', 'Unknown')} • 👁 {file_data['access_count']}\n"
+    
+    buttons = [InlineKeyboardButton("⏮ First", callback_data=f"files_page_{file_type}_0")]
+    if has_more:
+        buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"files_page_{file_type}_{page[-1][0]}"))
+    
+    return text, InlineKeyboardMarkup([buttons])
+
+@Client.on_message(filters.command("files") & admin_only)
+async def files_command(client: Client, message: Message):
+    """List stored files page by page"""
+    file_type = message.command[1].lower() if len(message.command) > 1 else "all"
+    if file_type != "all" and file_type not in FILE_TYPES:
+        await message.reply_text(FILES_USAGE.format("files"))
+        return
+    
+    try:
+        text, keyboard = await render_files_page(client, file_type, 0)
+        await message.reply_text(text, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Error listing files: {e}")
+        await message.reply_text("❌ Error listing files!")
+
+@Client.on_message(filters.command("export_files") & admin_only)
+async def export_files_command(client: Client, message: Message):
+    """Export stored files as CSV without building the full list in memory"""
+    file_type = message.command[1].lower() if len(message.command) > 1 else "all"
+    if file_type != "all" and file_type not in FILE_TYPES:
+        await message.reply_text(FILES_USAGE.format("export_files"))
+        return
+    
+    query = {} if file_type == "all" else {'file_type': file_type}
+    columns = ['file_id', 'file_name', 'file_type', 'file_size', 'channel_id', 'message_id', 'user_id', 'created_at', 'access_count']
+    
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    
+    try:
+        count = 0
+        async with aiofiles.open(path, "w") as f:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            
+            async for file_id, file_data in client.db.iter_files(query):
+                writer.writerow([file_id] + [file_data.get(column, "") for column in columns[1:]])
+                count += 1
+                
+                # Flush in chunks to keep memory flat
+                if count % 500 == 0:
+                    await f.write(buffer.getvalue())
+                    buffer.seek(0)
+                    buffer.truncate()
+            
+            await f.write(buffer.getvalue())
+        
+        await message.reply_document(path, file_name=f"files_{file_type}.csv", caption=f"📤 **Exported {count} files**")
+        
+    except Exception as e:
+        logger.error(f"Error exporting files: {e}")
+        await message.reply_text("❌ Error exporting files!")
+    finally:
+        os.remove(path)
+
 # Callback query handlers
 @Client.on_callback_query(filters.regex("refresh_stats"))
 async def refresh_stats_callback(client: Client, callback_query):
     """Refresh stats callback"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -297,7 +563,7 @@ async def refresh_stats_callback(client: Client, callback_query):
 @Client.on_callback_query(filters.regex(r"toggle_auto_delete_(.+)"))
 async def toggle_auto_delete_callback(client: Client, callback_query):
     """Toggle auto delete callback"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -309,3 +575,20 @@ async def toggle_auto_delete_callback(client: Client, callback_query):
     
     # Refresh the message
     await auto_delete_commands(client, callback_query.message)
+
+@Client.on_callback_query(filters.regex(r"files_page_(\w+)_(\d+)"))
+async def files_page_callback(client: Client, callback_query):
+    """Show another page of stored files"""
+    if not is_admin(client, callback_query.from_user.id):
+        await callback_query.answer("❌ Only admins can use this!", show_alert=True)
+        return
+    
+    file_type, after = callback_query.matches[0].groups()
+    if file_type != "all" and file_type not in FILE_TYPES:
+        await callback_query.answer("❌ Unknown file type!", show_alert=True)
+        return
+    
+    text, keyboard = await render_files_page(client, file_type, int(after))
+    
+    await callback_query.message.edit_text(text, reply_markup=keyboard)
+    await callback_query.answer()
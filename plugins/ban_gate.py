@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ban gate plugin: stops updates from banned users before any handler runs
+"""
+
+import logging
+from pyrogram import Client, StopPropagation
+from pyrogram.enums import ChatType
+from pyrogram.types import Message, CallbackQuery
+from auth import banned
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# After the update trace (tracing.TRACE_GROUP), ahead of every handler in group 0
+BAN_GATE_GROUP = -1
+
+@Client.on_message(banned, group=BAN_GATE_GROUP)
+async def reject_banned_message(client: Client, message: Message):
+    """Tell banned users off once per command, and drop everything else silently"""
+    metrics.inc("banned_updates", kind="message")
+    
+    if message.chat.type == ChatType.PRIVATE and message.text and message.text.startswith("/"):
+        try:
+            await message.reply_text("⚠️ You are banned from using this bot!")
+        except Exception as e:
+            logger.debug(f"Could not notify banned user {message.from_user.id}: {e}")
+    
+    raise StopPropagation
+
+@Client.on_callback_query(banned, group=BAN_GATE_GROUP)
+async def reject_banned_callback(client: Client, callback_query: CallbackQuery):
+    """Refuse button presses from banned users"""
+    metrics.inc("banned_updates", kind="callback")
+    
+    try:
+        await callback_query.answer("⚠️ You are banned from using this bot!", show_alert=True)
+    except Exception as e:
+        logger.debug(f"Could not answer banned user {callback_query.from_user.id}: {e}")
+    
+    raise StopPropagation
@@ -6,19 +6,38 @@ Broadcast plugin for sending messages to all users
 
 import logging
 import asyncio
+import re
+import time
+from typing import Optional
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram import FloodWait, UserIsBlocked, InputUserDeactivated, PeerIdInvalid
-from config import Config
+from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated, PeerIdInvalid
+from auth import admin_only, is_admin
 from helper_func import send_msg, get_readable_time
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-# Admin filter
-def admin_filter(_, __, message):
-    return message.from_user.id in Config.ADMINS
+# Pause between recipients to avoid flooding
+BROADCAST_DELAY = 0.1
 
-admin_only = filters.create(admin_filter)
+INVALID_SEGMENT = "❌ **Invalid segment:** use a number of days such as `7d`, or no argument to target all users."
+
+def get_segment_days(message: Message) -> Optional[int]:
+    """Parse an optional activity segment such as `7d` (0 = all users, None = unparsable)"""
+    if len(message.command) < 2:
+        return 0
+    
+    match = re.fullmatch(r"(\d+)d?", message.command[1].lower())
+    return int(match.group(1)) if match else None
+
+def get_segment_since(days: int) -> Optional[float]:
+    """Convert a segment in days to an activity cut-off timestamp"""
+    return time.time() - days * 86400 if days else None
+
+def get_segment_name(days: int) -> str:
+    """Human readable segment name"""
+    return f"Active in last {days}d" if days else "All users"
 
 @Client.on_message(filters.command("broadcast") & admin_only)
 async def broadcast_command(client: Client, message: Message):
@@ -27,25 +46,32 @@ async def broadcast_command(client: Client, message: Message):
     
     if not message.reply_to_message:
         await message.reply_text(
-            "❌ **Usage:** Reply to a message with `/broadcast`\n\n"
+            "❌ **Usage:** Reply to a message with `/broadcast [days]`\n\n"
             "📝 **Note:** The replied message will be sent to all bot users.\n"
+            "🎯 **Segment:** `/broadcast 7d` only targets users active in the last 7 days.\n"
             "⚠️ **Warning:** This action cannot be undone!"
         )
         return
     
+    days = get_segment_days(message)
+    if days is None:
+        await message.reply_text(INVALID_SEGMENT)
+        return
+    
     # Get confirmation
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_broadcast_{message.reply_to_message.id}"),
+            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_broadcast_{message.reply_to_message.id}_{days}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")
         ]
     ])
     
-    users_count = await client.db.get_users_count()
+    users_count = await client.db.count_users(active_since=get_segment_since(days), skip_unreachable=True)
     
     await message.reply_text(
         f"📢 **Broadcast Confirmation**\n\n"
         f"👥 **Target Users:** `{users_count}`\n"
+        f"🎯 **Segment:** `{get_segment_name(days)}`\n"
         f"📝 **Message Preview:** [Click to view](https://t.me/c/{str(message.chat.id)[4:]}/{message.reply_to_message.id})\n\n"
         f"⚠️ Are you sure you want to broadcast this message?",
         reply_markup=keyboard
@@ -58,8 +84,9 @@ async def delayed_broadcast_command(client: Client, message: Message):
     
     if not message.reply_to_message:
         await message.reply_text(
-            "❌ **Usage:** Reply to a message with `/dbroadcast`\n\n"
+            "❌ **Usage:** Reply to a message with `/dbroadcast [days]`\n\n"
             "📝 **Note:** The message will be sent to all users and auto-deleted after the configured time.\n"
+            "🎯 **Segment:** `/dbroadcast 7d` only targets users active in the last 7 days.\n"
             "⚠️ **Warning:** This action cannot be undone!"
         )
         return
@@ -68,19 +95,25 @@ async def delayed_broadcast_command(client: Client, message: Message):
     delete_time = await client.db.get_auto_delete_time()
     readable_time = get_readable_time(delete_time)
     
+    days = get_segment_days(message)
+    if days is None:
+        await message.reply_text(INVALID_SEGMENT)
+        return
+    
     # Get confirmation
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_dbroadcast_{message.reply_to_message.id}"),
+            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_dbroadcast_{message.reply_to_message.id}_{days}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")
         ]
     ])
     
-    users_count = await client.db.get_users_count()
+    users_count = await client.db.count_users(active_since=get_segment_since(days), skip_unreachable=True)
     
     await message.reply_text(
         f"📢 **Auto-Delete Broadcast Confirmation**\n\n"
         f"👥 **Target Users:** `{users_count}`\n"
+        f"🎯 **Segment:** `{get_segment_name(days)}`\n"
         f"🗑️ **Auto-Delete Time:** `{readable_time}`\n"
         f"📝 **Message Preview:** [Click to view](https://t.me/c/{str(message.chat.id)[4:]}/{message.reply_to_message.id})\n\n"
         f"⚠️ Are you sure you want to broadcast this message?",
@@ -94,39 +127,48 @@ async def pin_broadcast_command(client: Client, message: Message):
     
     if not message.reply_to_message:
         await message.reply_text(
-            "❌ **Usage:** Reply to a message with `/pbroadcast`\n\n"
+            "❌ **Usage:** Reply to a message with `/pbroadcast [days]`\n\n"
             "📝 **Note:** The message will be sent and pinned to all users' private chats.\n"
+            "🎯 **Segment:** `/pbroadcast 7d` only targets users active in the last 7 days.\n"
             "⚠️ **Warning:** This action cannot be undone!"
         )
         return
     
+    days = get_segment_days(message)
+    if days is None:
+        await message.reply_text(INVALID_SEGMENT)
+        return
+    
     # Get confirmation
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_pbroadcast_{message.reply_to_message.id}"),
+            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_pbroadcast_{message.reply_to_message.id}_{days}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")
         ]
     ])
     
-    users_count = await client.db.get_users_count()
+    users_count = await client.db.count_users(active_since=get_segment_since(days), skip_unreachable=True)
     
     await message.reply_text(
         f"📌 **Pin Broadcast Confirmation**\n\n"
         f"👥 **Target Users:** `{users_count}`\n"
+        f"🎯 **Segment:** `{get_segment_name(days)}`\n"
         f"📝 **Message Preview:** [Click to view](https://t.me/c/{str(message.chat.id)[4:]}/{message.reply_to_message.id})\n\n"
         f"⚠️ Are you sure you want to pin broadcast this message?",
         reply_markup=keyboard
     )
 
 # Callback handlers
-@Client.on_callback_query(filters.regex(r"confirm_broadcast_(\d+)"))
+@Client.on_callback_query(filters.regex(r"confirm_broadcast_(\d+)(?:_(\d+))?"))
 async def confirm_broadcast_callback(client: Client, callback_query):
     """Handle broadcast confirmation"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
-    message_id = int(callback_query.data.split("_")[2])
+    message_id, days = callback_query.matches[0].groups()
+    message_id = int(message_id)
+    days = int(days or 0)
     
     try:
         # Get the message to broadcast
@@ -137,20 +179,22 @@ async def confirm_broadcast_callback(client: Client, callback_query):
         
         # Start broadcasting
         await callback_query.answer("✅ Broadcasting started!")
-        await start_broadcast(client, callback_query.message, broadcast_msg, "normal")
+        await start_broadcast(client, callback_query.message, broadcast_msg, "normal", days)
         
     except Exception as e:
         logger.error(f"Error in broadcast confirmation: {e}")
         await callback_query.answer("❌ Error starting broadcast!", show_alert=True)
 
-@Client.on_callback_query(filters.regex(r"confirm_dbroadcast_(\d+)"))
+@Client.on_callback_query(filters.regex(r"confirm_dbroadcast_(\d+)(?:_(\d+))?"))
 async def confirm_dbroadcast_callback(client: Client, callback_query):
     """Handle delayed broadcast confirmation"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
-    message_id = int(callback_query.data.split("_")[2])
+    message_id, days = callback_query.matches[0].groups()
+    message_id = int(message_id)
+    days = int(days or 0)
     
     try:
         # Get the message to broadcast
@@ -161,20 +205,22 @@ async def confirm_dbroadcast_callback(client: Client, callback_query):
         
         # Start broadcasting
         await callback_query.answer("✅ Auto-delete broadcasting started!")
-        await start_broadcast(client, callback_query.message, broadcast_msg, "auto_delete")
+        await start_broadcast(client, callback_query.message, broadcast_msg, "auto_delete", days)
         
     except Exception as e:
         logger.error(f"Error in dbroadcast confirmation: {e}")
         await callback_query.answer("❌ Error starting broadcast!", show_alert=True)
 
-@Client.on_callback_query(filters.regex(r"confirm_pbroadcast_(\d+)"))
+@Client.on_callback_query(filters.regex(r"confirm_pbroadcast_(\d+)(?:_(\d+))?"))
 async def confirm_pbroadcast_callback(client: Client, callback_query):
     """Handle pin broadcast confirmation"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
-    message_id = int(callback_query.data.split("_")[2])
+    message_id, days = callback_query.matches[0].groups()
+    message_id = int(message_id)
+    days = int(days or 0)
     
     try:
         # Get the message to broadcast
@@ -185,7 +231,7 @@ async def confirm_pbroadcast_callback(client: Client, callback_query):
         
         # Start broadcasting
         await callback_query.answer("✅ Pin broadcasting started!")
-        await start_broadcast(client, callback_query.message, broadcast_msg, "pin")
+        await start_broadcast(client, callback_query.message, broadcast_msg, "pin", days)
         
     except Exception as e:
         logger.error(f"Error in pbroadcast confirmation: {e}")
@@ -201,21 +247,21 @@ async def cancel_broadcast_callback(client: Client, callback_query):
         reply_markup=None
     )
 
-async def start_broadcast(client: Client, status_message: Message, broadcast_msg: Message, broadcast_type: str):
+async def start_broadcast(client: Client, status_message: Message, broadcast_msg: Message, broadcast_type: str, days: int = 0):
     """Start the broadcasting process"""
     
-    # Get all users
-    all_users = await client.db.get_all_users()
-    banned_users = await client.db.get_banned_users()
-    
-    # Filter out banned users
-    target_users = [user for user in all_users if user not in banned_users]
+    # Users who blocked the bot or never came back within the segment are skipped
+    active_since = get_segment_since(days)
     
-    total_users = len(target_users)
+    # Count target users; the users themselves are streamed in chunks below
+    total_users = await client.db.count_users(active_since=active_since, skip_unreachable=True)
+    processed = 0
     success_count = 0
     failed_count = 0
     blocked_count = 0
     deleted_count = 0
+    started_at = time.time()
+    metrics.inc("broadcasts", type=broadcast_type)
     
     # Update status message
     await status_message.edit_text(
@@ -231,70 +277,86 @@ async def start_broadcast(client: Client, status_message: Message, broadcast_msg
     # Track messages for auto-delete
     sent_messages = []
     
-    # Start broadcasting
-    for i, user_id in enumerate(target_users):
-        try:
-            if broadcast_type == "pin":
-                # Send and pin the message
-                sent_msg = await broadcast_msg.copy(user_id)
-                try:
-                    await client.pin_chat_message(user_id, sent_msg.id, disable_notification=True)
-                except:
-                    pass  # Ignore pin errors
-            else:
-                # Regular send
-                sent_msg = await broadcast_msg.copy(user_id)
-            
-            success_count += 1
-            
-            # Store message for auto-delete
-            if broadcast_type == "auto_delete":
-                sent_messages.append((user_id, sent_msg.id))
-            
-        except FloodWait as e:
-            await asyncio.sleep(e.x)
+    # Start broadcasting (banned and out-of-segment users are filtered out as chunks are produced)
+    async for chunk in client.db.iter_users(active_since=active_since, skip_unreachable=True):
+        for user_id in chunk:
+            delivered = False
+            unreachable = False
             try:
-                sent_msg = await broadcast_msg.copy(user_id)
+                if broadcast_type == "pin":
+                    # Send and pin the message
+                    sent_msg = await broadcast_msg.copy(user_id)
+                    try:
+                        await client.pin_chat_message(user_id, sent_msg.id, disable_notification=True)
+                    except:
+                        pass  # Ignore pin errors
+                else:
+                    # Regular send
+                    sent_msg = await broadcast_msg.copy(user_id)
+                
                 success_count += 1
+                delivered = True
                 
+                # Store message for auto-delete
                 if broadcast_type == "auto_delete":
                     sent_messages.append((user_id, sent_msg.id))
+                
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+                try:
+                    sent_msg = await broadcast_msg.copy(user_id)
+                    success_count += 1
+                    delivered = True
                     
-            except Exception:
-                failed_count += 1
+                    if broadcast_type == "auto_delete":
+                        sent_messages.append((user_id, sent_msg.id))
+                        
+                except Exception:
+                    failed_count += 1
+                    
+            except UserIsBlocked:
+                blocked_count += 1
+                unreachable = True
                 
-        except UserIsBlocked:
-            blocked_count += 1
-            
-        except InputUserDeactivated:
-            deleted_count += 1
+            except InputUserDeactivated:
+                deleted_count += 1
+                unreachable = True
+                
+            except PeerIdInvalid:
+                deleted_count += 1
+                unreachable = True
+                
+            except Exception as e:
+                failed_count += 1
+                logger.error(f"Error broadcasting to {user_id}: {e}")
             
-        except PeerIdInvalid:
-            deleted_count += 1
+            # Unreachable users are skipped by later broadcasts until they /start again
+            await client.db.record_delivery(user_id, delivered, unreachable)
+            processed += 1
+            metrics.inc("broadcast_messages", result="sent" if delivered else "unreachable" if unreachable else "failed")
             
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Error broadcasting to {user_id}: {e}")
-        
-        # Update progress every 50 users or at the end
-        if (i + 1) % 50 == 0 or i == total_users - 1:
-            progress = ((i + 1) / total_users) * 100
+            # Update progress every 50 users
+            if processed % 50 == 0:
+                progress = min(processed / total_users * 100, 100) if total_users else 100
+                metrics.set_gauge("broadcast_rate", processed / max(time.time() - started_at, 1e-6))
+                
+                try:
+                    await status_message.edit_text(
+                        f"📢 **Broadcasting in Progress...**\n\n"
+                        f"👥 **Total Users:** `{total_users}`\n"
+                        f"✅ **Sent:** `{success_count}`\n"
+                        f"❌ **Failed:** `{failed_count}`\n"
+                        f"🚫 **Blocked:** `{blocked_count}`\n"
+                        f"👻 **Deleted:** `{deleted_count}`\n\n"
+                        f"⏳ **Progress:** `{progress:.1f}%`"
+                    )
+                except:
+                    pass
             
-            try:
-                await status_message.edit_text(
-                    f"📢 **Broadcasting in Progress...**\n\n"
-                    f"👥 **Total Users:** `{total_users}`\n"
-                    f"✅ **Sent:** `{success_count}`\n"
-                    f"❌ **Failed:** `{failed_count}`\n"
-                    f"🚫 **Blocked:** `{blocked_count}`\n"
-                    f"👻 **Deleted:** `{deleted_count}`\n\n"
-                    f"⏳ **Progress:** `{progress:.1f}%`"
-                )
-            except:
-                pass
-        
-        # Small delay to avoid flooding
-        await asyncio.sleep(0.1)
+            # Small delay to avoid flooding
+            await asyncio.sleep(BROADCAST_DELAY)
+    
+    metrics.set_gauge("broadcast_rate", 0)
     
     # Final status update
     broadcast_type_name = {
@@ -307,6 +369,7 @@ async def start_broadcast(client: Client, status_message: Message, broadcast_msg
 ✅ **{broadcast_type_name} Completed!**
 
 📊 **Results:**
+🎯 **Segment:** `{get_segment_name(days)}`
 👥 **Total Users:** `{total_users}`
 ✅ **Successfully Sent:** `{success_count}`
 ❌ **Failed:** `{failed_count}`
@@ -5,10 +5,12 @@ Channel post handler for automatic link generation
 """
 
 import logging
+from typing import List
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from helper_func import encode, get_name, get_media_file_size, get_file_type, get_hash, get_size
+from auth import is_admin
+from helper_func import get_file_token, get_name, get_media_file_size, get_file_type, get_hash, get_size
 from shortener import shortener
 
 logger = logging.getLogger(__name__)
@@ -48,7 +50,7 @@ async def handle_channel_post(client: Client, message: Message):
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = get_file_token(file_id, file_data)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         logger.info(f"Auto-generated link for channel post {message.id}: {file_id}")
@@ -111,7 +113,7 @@ async def handle_genlink_hashtag(client: Client, message: Message):
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = get_file_token(file_id, file_data)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Create response message
@@ -163,36 +165,42 @@ async def handle_group_genlink_request(client: Client, message: Message):
     
     # Check if user is admin
     user_id = message.from_user.id
-    if user_id not in Config.ADMINS:
+    if not is_admin(client, user_id):
         await message.reply_text("❌ Only admins can generate links!")
         return
     
     try:
-        # Forward the media to the storage channel first
-        forwarded_msg = await replied_msg.forward(Config.CHANNEL_ID)
-        
-        # Prepare file data
-        file_data = {
-            'user_id': user_id,
-            'channel_id': Config.CHANNEL_ID,
-            'message_id': forwarded_msg.id,
-            'file_name': get_name(replied_msg),
-            'file_size': get_media_file_size(replied_msg),
-            'file_type': get_file_type(replied_msg),
-            'file_hash': get_hash(replied_msg),
-            'from_group': True,
-            'group_id': message.chat.id,
-            'upload_date': replied_msg.date.strftime("%Y-%m-%d %H:%M:%S") if replied_msg.date else "Unknown"
-        }
-        
-        # Add human readable file size
-        file_data['file_size_human'] = get_size(file_data['file_size'])
-        
-        # Save file to database
-        file_id = await client.db.save_file("", file_data)
+        # Reuse the stored copy if this media was linked before
+        existing = await client.db.find_file_by_hash(get_hash(replied_msg))
+        if existing:
+            file_id, file_data = existing
+            await client.db.add_user_file(user_id, file_id)
+        else:
+            # Forward the media to the storage channel first
+            forwarded_msg = await replied_msg.forward(Config.CHANNEL_ID)
+            
+            # Prepare file data
+            file_data = {
+                'user_id': user_id,
+                'channel_id': Config.CHANNEL_ID,
+                'message_id': forwarded_msg.id,
+                'file_name': get_name(replied_msg),
+                'file_size': get_media_file_size(replied_msg),
+                'file_type': get_file_type(replied_msg),
+                'file_hash': get_hash(replied_msg),
+                'from_group': True,
+                'group_id': message.chat.id,
+                'upload_date': replied_msg.date.strftime("%Y-%m-%d %H:%M:%S") if replied_msg.date else "Unknown"
+            }
+            
+            # Add human readable file size
+            file_data['file_size_human'] = get_size(file_data['file_size'])
+            
+            # Save file to database
+            file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = get_file_token(file_id, file_data)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Create response message
@@ -227,7 +235,7 @@ async def handle_private_genlink_request(client: Client, message: Message):
     user_id = message.from_user.id
     
     # Check if user is admin
-    if user_id not in Config.ADMINS:
+    if not is_admin(client, user_id):
         await message.reply_text(
             "❌ Only admins can generate links!\n\n"
             "📝 **Available Commands:**\n"
@@ -250,3 +258,36 @@ async def handle_private_genlink_request(client: Client, message: Message):
         "📋 **Reply Method:**\n"
         "Forward a channel post and reply with `/link`"
     )
+
+@Client.on_deleted_messages(filters.chat(Config.CHANNEL_ID))
+async def handle_channel_deletions(client: Client, messages: List[Message]):
+    """Tombstone links whose storage-channel posts were deleted"""
+    try:
+        message_ids = [message.id for message in messages]
+        file_ids, batch_ids = await client.db.tombstone_channel_messages(Config.CHANNEL_ID, message_ids)
+        
+        if file_ids:
+            logger.info(f"Channel posts {message_ids} deleted: tombstoned {len(file_ids)} files, updated {len(batch_ids)} batches")
+        
+    except Exception as e:
+        logger.error(f"Error processing deleted channel posts: {e}")
+
+@Client.on_edited_message(filters.chat(Config.CHANNEL_ID) & filters.media)
+async def handle_channel_edit(client: Client, message: Message):
+    """Refresh stored metadata when a storage-channel post's media is replaced"""
+    try:
+        updates = {
+            'file_name': get_name(message),
+            'file_size': get_media_file_size(message),
+            'file_type': get_file_type(message),
+            'file_hash': get_hash(message)
+        }
+        updates['file_size_human'] = get_size(updates['file_size'])
+        
+        file_ids = await client.db.update_channel_message(message.chat.id, message.id, updates)
+        
+        if file_ids:
+            logger.info(f"Channel post {message.id} edited: refreshed {len(file_ids)} files")
+        
+    except Exception as e:
+        logger.error(f"Error processing edited channel post: {e}")
@@ -7,17 +7,11 @@ Force subscription management plugin
 import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from pyrogram import ChatAdminRequired, ChannelInvalid, PeerIdInvalid
-from config import Config
+from pyrogram.errors import ChatAdminRequired, ChannelInvalid, PeerIdInvalid
+from auth import admin_only, is_admin
 
 logger = logging.getLogger(__name__)
 
-# Admin filter
-def admin_filter(_, __, message):
-    return message.from_user.id in Config.ADMINS
-
-admin_only = filters.create(admin_filter)
-
 @Client.on_message(filters.command("addchnl") & admin_only)
 async def add_channel_command(client: Client, message: Message):
     """Add a channel for force subscription"""
@@ -261,58 +255,59 @@ async def delete_requests_command(client: Client, message: Message):
             await message.reply_text("❌ No force subscription channels configured!")
             return
         
-        all_users = await client.db.get_all_users()
+        total_users = await client.db.get_users_count()
         
         status_msg = await message.reply_text("🔄 Checking user subscriptions... Please wait!")
         
-        removed_users = []
+        removed_count = 0
         checked_count = 0
         
-        for user_id in all_users:
-            try:
-                # Check if user is still subscribed to all channels
-                for channel_id in force_sub_channels:
-                    try:
-                        member = await client.get_chat_member(channel_id, user_id)
-                        if member.status in ["kicked", "left"]:
-                            # User left the channel, remove from database
+        async for chunk in client.db.iter_users(exclude_banned=False):
+            for user_id in chunk:
+                try:
+                    # Check if user is still subscribed to all channels
+                    for channel_id in force_sub_channels:
+                        try:
+                            member = await client.get_chat_member(channel_id, user_id)
+                            if member.status in ["kicked", "left"]:
+                                # User left the channel, remove from database
+                                await client.db.remove_user(user_id)
+                                removed_count += 1
+                                break
+                        except Exception:
+                            # User not found in channel, remove from database
                             await client.db.remove_user(user_id)
-                            removed_users.append(user_id)
+                            removed_count += 1
                             break
-                    except Exception:
-                        # User not found in channel, remove from database
-                        await client.db.remove_user(user_id)
-                        removed_users.append(user_id)
-                        break
-                
-                checked_count += 1
-                
-                # Update progress every 50 users
-                if checked_count % 50 == 0:
-                    await status_msg.edit_text(
-                        f"🔄 Checking user subscriptions...\n\n"
-                        f"✅ Checked: {checked_count}/{len(all_users)}\n"
-                        f"🗑️ Removed: {len(removed_users)}"
-                    )
-                
-            except Exception as e:
-                logger.error(f"Error checking user {user_id}: {e}")
-                continue
+                    
+                    checked_count += 1
+                    
+                    # Update progress every 50 users
+                    if checked_count % 50 == 0:
+                        await status_msg.edit_text(
+                            f"🔄 Checking user subscriptions...\n\n"
+                            f"✅ Checked: {checked_count}/{total_users}\n"
+                            f"🗑️ Removed: {removed_count}"
+                        )
+                    
+                except Exception as e:
+                    logger.error(f"Error checking user {user_id}: {e}")
+                    continue
         
         # Final result
         response_text = f"""
 ✅ **Cleanup Completed!**
 
 👥 **Users Checked:** {checked_count}
-🗑️ **Users Removed:** {len(removed_users)}
-📊 **Remaining Users:** {len(all_users) - len(removed_users)}
+🗑️ **Users Removed:** {removed_count}
+📊 **Remaining Users:** {await client.db.get_users_count()}
 
 📝 **Note:** Removed users who left force subscription channels.
 """
         
         await status_msg.edit_text(response_text)
         
-        logger.info(f"Cleanup completed: {len(removed_users)} users removed by {message.from_user.id}")
+        logger.info(f"Cleanup completed: {removed_count} users removed by {message.from_user.id}")
         
     except Exception as e:
         logger.error(f"Error in cleanup: {e}")
@@ -322,7 +317,7 @@ async def delete_requests_command(client: Client, message: Message):
 @Client.on_callback_query(filters.regex(r"toggle_fsub_(.+)"))
 async def toggle_fsub_callback(client: Client, callback_query: CallbackQuery):
     """Toggle force subscription callback"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -338,7 +333,7 @@ async def toggle_fsub_callback(client: Client, callback_query: CallbackQuery):
 @Client.on_callback_query(filters.regex("list_fsub_channels"))
 async def list_fsub_channels_callback(client: Client, callback_query: CallbackQuery):
     """List force sub channels callback"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -348,7 +343,7 @@ async def list_fsub_channels_callback(client: Client, callback_query: CallbackQu
 @Client.on_callback_query(filters.regex("clear_all_fsub_channels"))
 async def clear_all_fsub_channels_callback(client: Client, callback_query: CallbackQuery):
     """Clear all force sub channels callback"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -372,7 +367,7 @@ async def clear_all_fsub_channels_callback(client: Client, callback_query: Callb
 @Client.on_callback_query(filters.regex("confirm_clear_fsub"))
 async def confirm_clear_fsub_callback(client: Client, callback_query: CallbackQuery):
     """Confirm clear all force sub channels"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -432,7 +427,7 @@ async def show_addchnl_help_callback(client: Client, callback_query: CallbackQue
 @Client.on_callback_query(filters.regex("refresh_fsub_settings"))
 async def refresh_fsub_settings_callback(client: Client, callback_query: CallbackQuery):
     """Refresh force sub settings"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -7,29 +7,18 @@ Generate link plugin for single posts
 import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from config import Config
-from helper_func import encode, get_name, get_media_file_size, get_file_type, get_hash, get_size
+from auth import admin_only, is_admin
+from helper_func import get_file_token, get_name, get_media_file_size, get_file_type, get_hash, get_size
 from shortener import shortener
 import re
 
 logger = logging.getLogger(__name__)
 
-# Admin filter
-def admin_filter(_, __, message):
-    return message.from_user.id in Config.ADMINS
-
-admin_only = filters.create(admin_filter)
-
 @Client.on_message(filters.command("genlink") & admin_only)
 async def genlink_command(client: Client, message: Message):
     """Generate link for a single post"""
     user_id = message.from_user.id
     
-    # Check if user is banned
-    if await client.db.is_user_banned(user_id):
-        await message.reply_text("⚠️ You are banned from using this bot!")
-        return
-    
     if len(message.command) < 2:
         await message.reply_text(
             "❌ **Usage:** `/genlink <channel_post_link>`\n\n"
@@ -88,7 +77,7 @@ async def genlink_command(client: Client, message: Message):
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = get_file_token(file_id, file_data)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Apply URL shortener if enabled
@@ -164,15 +153,15 @@ async def copy_link_callback(client: Client, callback_query):
     
     await callback_query.answer(f"📋 Link copied to clipboard!\n\n{link}", show_alert=True)
 
-@Client.on_callback_query(filters.regex(r"delete_file_(.+)"))
+@Client.on_callback_query(filters.regex(r"delete_file_(\d+)"))
 async def delete_file_callback(client: Client, callback_query):
     """Handle delete file callback"""
     # Check if user is admin
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can delete files!", show_alert=True)
         return
     
-    file_id = callback_query.data.split("_", 2)[2]
+    file_id = int(callback_query.data.split("_", 2)[2])
     
     try:
         # Delete file from database
@@ -198,11 +187,6 @@ async def link_reply_command(client: Client, message: Message):
     """Generate link by replying to a channel post"""
     user_id = message.from_user.id
     
-    # Check if user is banned
-    if await client.db.is_user_banned(user_id):
-        await message.reply_text("⚠️ You are banned from using this bot!")
-        return
-    
     replied_message = message.reply_to_message
     
     # Check if the replied message is forwarded from a channel
@@ -244,7 +228,7 @@ async def link_reply_command(client: Client, message: Message):
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = get_file_token(file_id, file_data)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Apply URL shortener if enabled
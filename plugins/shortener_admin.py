@@ -9,16 +9,11 @@ import os
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from config import Config
+from auth import admin_only, is_admin
 from shortener import shortener
 
 logger = logging.getLogger(__name__)
 
-# Admin filter
-def admin_filter(_, __, message):
-    return message.from_user.id in Config.ADMINS
-
-admin_only = filters.create(admin_filter)
-
 @Client.on_message(filters.command("shortener") & admin_only)
 async def shortener_settings_command(client: Client, message: Message):
     """Manage shortener settings"""
@@ -38,6 +33,7 @@ async def shortener_settings_command(client: Client, message: Message):
 🌐 **Current Site:** `{current_site}`
 🔑 **API Key:** {key_status}
 ⚙️ **Key Required:** {'Yes' if requires_key else 'No'}
+🏠 **Self-Hosted Links:** {f'✅ {Config.SHORT_LINK_BASE_URL}' if shortener.resolver else '❌ Disabled'}
 
 📝 **Available Commands:**
 • `/shortener_toggle` - Enable/disable shortener
@@ -287,7 +283,7 @@ async def test_shortener_command(client: Client, message: Message):
 @Client.on_callback_query(filters.regex(r"toggle_shortener_(.+)"))
 async def toggle_shortener_callback(client: Client, callback_query: CallbackQuery):
     """Toggle shortener callback"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -307,7 +303,7 @@ async def toggle_shortener_callback(client: Client, callback_query: CallbackQuer
 @Client.on_callback_query(filters.regex("refresh_shortener_settings"))
 async def refresh_shortener_settings_callback(client: Client, callback_query: CallbackQuery):
     """Refresh shortener settings"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -317,7 +313,7 @@ async def refresh_shortener_settings_callback(client: Client, callback_query: Ca
 @Client.on_callback_query(filters.regex("shortener_show_sites"))
 async def shortener_show_sites_callback(client: Client, callback_query: CallbackQuery):
     """Show supported sites"""
-    if callback_query.from_user.id not in Config.ADMINS:
+    if not is_admin(client, callback_query.from_user.id):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
@@ -7,31 +7,51 @@ Start command and file handling plugin
 import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from pyrogram import FloodWait, UserIsBlocked, InputUserDeactivated
+from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated
 from config import Config
+from auth import is_admin
 from helper_func import (
-    encode, decode, get_name, get_media_file_size, get_hash, 
-    get_file_type, is_subscribed, get_start_message
+    get_file_token, decode_link, LINK_FILE, LINK_BATCH, LINK_SIGNED_FILE, get_name, get_media_file_size,
+    get_hash, get_file_type, get_size, get_readable_time, has_media, get_media_meta, is_subscribed, get_start_message
 )
+from batch_builder import MANIFEST_CHUNK_SIZE
 from shortener import shortener
+from singleflight import SingleFlight
+from metrics import metrics
 import asyncio
 import random
+import time
+from functools import partial
 
 logger = logging.getLogger(__name__)
 
+# (user_id, batch_id) pairs with a page currently being sent
+delivering_batches = set()
+
+# Concurrent opens of the same link share one lookup, and concurrent
+# deliveries of the same channel post share one get_messages call
+link_flights = SingleFlight()
+message_flights = SingleFlight()
+
+def collect_flight_metrics():
+    for flight, single_flight in (("link", link_flights), ("channel_message", message_flights)):
+        metrics.set_counter("singleflight_calls", single_flight.stats['calls'], flight=flight)
+        metrics.set_counter("singleflight_coalesced", single_flight.stats['coalesced'], flight=flight)
+        metrics.set_gauge("singleflight_in_flight", single_flight.in_flight, flight=flight)
+
+metrics.add_collector(collect_flight_metrics)
+
+# Show queue position and wait time once the expected wait reaches this many seconds
+QUEUE_NOTICE_SECONDS = 5
+
 @Client.on_message(filters.command("start") & filters.private)
 async def start_command(client: Client, message: Message):
     """Handle /start command"""
     user_id = message.from_user.id
     first_name = message.from_user.first_name
     
-    # Add user to database
-    await client.db.add_user(user_id)
-    
-    # Check if user is banned
-    if await client.db.is_user_banned(user_id):
-        await message.reply_text("⚠️ You are banned from using this bot!")
-        return
+    # Add user to database (or refresh their last-seen time)
+    await client.db.add_user(user_id, message.from_user.language_code)
     
     # Check for file/batch access
     if len(message.command) > 1:
@@ -84,28 +104,54 @@ async def handle_file_access(client: Client, message: Message, data: str):
     user_id = message.from_user.id
     
     try:
-        # Decode the data
-        decoded_data = decode(data)
+        # Decode the token; forged or garbage tokens are rejected before any lookup
+        link, record = await link_flights.do(data, partial(resolve_link, client, data))
+        if not link:
+            await message.reply_text("❌ Invalid link!")
+            return
+        
+        kind, item_id = link
+        await client.db.record_file_access(user_id)
         
-        if decoded_data.startswith("file_"):
+        if kind == LINK_SIGNED_FILE:
+            # Stateless file access, served without any database read
+            channel_id, message_id, expires_at = item_id
+            if expires_at and time.time() > expires_at:
+                await message.reply_text("❌ This link has expired!")
+                return
+            if await client.db.is_channel_message_deleted(channel_id, message_id):
+                await message.reply_text("❌ This file was removed from the storage channel!")
+                return
+            
+            await send_file_to_user(client, message, {'channel_id': channel_id, 'message_id': message_id})
+            
+        elif kind == LINK_FILE:
             # Single file access
-            file_data = await client.db.get_file(decoded_data)
+            file_data = record
             if not file_data:
-                await message.reply_text("❌ File not found or expired!")
+                if await client.db.get_tombstone(item_id):
+                    await message.reply_text("❌ This file was removed from the storage channel!")
+                else:
+                    await message.reply_text("❌ File not found or expired!")
                 return
             
+            # Every request counts as a download, even when it shared the lookup
+            await client.db.record_file_download(item_id)
+            
             # Send the file
             await send_file_to_user(client, message, file_data)
             
-        elif decoded_data.startswith("batch_"):
+        elif kind == LINK_BATCH:
             # Batch access
-            batch_data = await client.db.get_batch(decoded_data)
+            batch_data = record
             if not batch_data:
                 await message.reply_text("❌ Batch not found or expired!")
                 return
             
-            # Send all files in batch
-            await send_batch_to_user(client, message, batch_data)
+            await client.db.record_batch_download(item_id)
+            
+            # Opening the link starts the batch from the first page
+            await send_batch_to_user(client, message, user_id, item_id, batch_data, restart=True)
             
         else:
             await message.reply_text("❌ Invalid link!")
@@ -114,30 +160,59 @@ async def handle_file_access(client: Client, message: Message, data: str):
         logger.error(f"Error handling file access: {e}")
         await message.reply_text("❌ Error processing your request!")
 
+@metrics.instrument("step", "resolve_link")
+async def resolve_link(client: Client, token: str):
+    """Decode a link token and look up the file or batch it points to"""
+    link = decode_link(token)
+    if not link:
+        return None, None
+    
+    # Access is recorded per request by the caller, not once per shared lookup
+    kind, item_id = link
+    if kind == LINK_FILE:
+        return link, await client.db.get_file(item_id, record_access=False)
+    if kind == LINK_BATCH:
+        return link, await client.db.get_batch(item_id, record_access=False)
+    return link, None
+
 async def send_file_to_user(client: Client, message: Message, file_data: dict):
     """Send a single file to user"""
     try:
         channel_id = file_data['channel_id']
         message_id = file_data['message_id']
         
-        # Get the file message from channel
-        file_msg = await client.get_messages(channel_id, message_id)
+        # Get the file message from channel, joining any fetch already in flight for it
+        with metrics.timer("step", "fetch_channel_message"):
+            file_msg = await message_flights.do(
+                (channel_id, message_id), partial(client.get_messages, channel_id, message_id)
+            )
         
         if not file_msg:
             await message.reply_text("❌ File not found in channel!")
             return
         
+        # Stateless links carry no metadata, so fall back to the channel message
+        file_name = file_data.get('file_name') or get_name(file_msg)
+        file_size_human = file_data.get('file_size_human') or get_size(get_media_file_size(file_msg) or 0)
+        upload_date = file_data.get('upload_date') or (
+            file_msg.date.strftime("%Y-%m-%d %H:%M:%S") if file_msg.date else "Unknown"
+        )
+        
         # Copy the file to user
-        caption = f"📁 **File Name:** `{file_data.get('file_name', 'Unknown')}`\n"
-        caption += f"📊 **Size:** `{file_data.get('file_size_human', 'Unknown')}`\n"
-        caption += f"📅 **Uploaded:** `{file_data.get('upload_date', 'Unknown')}`\n\n"
+        caption = f"📁 **File Name:** `{file_name}`\n"
+        caption += f"📊 **Size:** `{file_size_human}`\n"
+        caption += f"📅 **Uploaded:** `{upload_date}`\n\n"
         caption += "**Powered by:** @YourBotUsername"
         
-        await file_msg.copy(
-            chat_id=message.chat.id,
-            caption=caption,
-            protect_content=Config.PROTECT_CONTENT
-        )
+        # Single files take the scheduler's priority lane
+        await notify_queue_position(client, message, priority=True)
+        with metrics.timer("step", "deliver_file"):
+            await client.delivery.enqueue(message.chat.id, partial(
+                file_msg.copy,
+                chat_id=message.chat.id,
+                caption=caption,
+                protect_content=Config.PROTECT_CONTENT
+            ), priority=True)
         
         # Schedule auto-delete if enabled
         if await client.db.is_auto_delete_enabled():
@@ -148,43 +223,46 @@ async def send_file_to_user(client: Client, message: Message, file_data: dict):
         logger.error(f"Error sending file to user: {e}")
         await message.reply_text("❌ Error sending file!")
 
-async def send_batch_to_user(client: Client, message: Message, batch_data: dict):
-    """Send batch files to user"""
+async def send_batch_to_user(client: Client, message: Message, user_id: int, batch_id: int, batch_data: dict,
+                             restart: bool = False):
+    """Send the next page of a batch to user (the first one on restart), offering a "More" button while files remain"""
+    key = (user_id, batch_id)
+    if key in delivering_batches:
+        if restart:
+            await message.reply_text("⏳ A page of this batch is still being sent. Open the link again once it arrives to restart the batch.")
+        return
+    delivering_batches.add(key)
+    
     try:
-        file_ids = batch_data.get('file_ids', [])
+        # Reset only while holding the slot, so an in-flight page cannot overwrite it
+        if restart:
+            await client.db.clear_batch_cursor(user_id, batch_id)
+        
+        manifest = batch_data['manifest']
+        total_files = batch_data['total_files']
         
-        if not file_ids:
+        if not total_files:
             await message.reply_text("❌ No files found in this batch!")
             return
         
-        await message.reply_text(f"📦 **Batch Files:** {len(file_ids)} files\n\nSending files...")
+        position, delivered = await client.db.get_batch_cursor(user_id, batch_id) or (0, 0)
+        if position == 0:
+            await message.reply_text(f"📦 **Batch Files:** {total_files} files\n\nSending files...")
+        await notify_queue_position(client, message)
         
-        for i, file_id in enumerate(file_ids, 1):
-            file_data = await client.db.get_file(file_id)
-            if file_data:
-                try:
-                    channel_id = file_data['channel_id']
-                    message_id = file_data['message_id']
-                    
-                    file_msg = await client.get_messages(channel_id, message_id)
-                    if file_msg:
-                        caption = f"📁 **File {i}/{len(file_ids)}**\n"
-                        caption += f"**Name:** `{file_data.get('file_name', 'Unknown')}`\n"
-                        caption += f"**Size:** `{file_data.get('file_size_human', 'Unknown')}`"
-                        
-                        await file_msg.copy(
-                            chat_id=message.chat.id,
-                            caption=caption,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                        
-                        # Small delay between files
-                        await asyncio.sleep(1)
-                        
-                except Exception as e:
-                    logger.error(f"Error sending file {i}: {e}")
-                    continue
+        page, next_position = manifest.media_page(position, Config.BATCH_PAGE_SIZE)
+        delivered += await send_manifest_files(client, message, batch_id, batch_data, page, delivered)
+        total_files = batch_data['total_files']
+        
+        if next_position < len(manifest) and delivered < total_files:
+            await client.db.set_batch_cursor(user_id, batch_id, next_position, delivered)
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton(f"➡️ More ({total_files - delivered} left)", callback_data=f"batch_more_{batch_id}")]
+            ])
+            await message.reply_text(f"📦 **Sent {delivered}/{total_files} files**", reply_markup=keyboard)
+            return
         
+        await client.db.clear_batch_cursor(user_id, batch_id)
         await message.reply_text("✅ All files sent successfully!")
         
         # Schedule auto-delete if enabled
@@ -195,6 +273,91 @@ async def send_batch_to_user(client: Client, message: Message, batch_data: dict)
     except Exception as e:
         logger.error(f"Error sending batch to user: {e}")
         await message.reply_text("❌ Error sending batch files!")
+    finally:
+        delivering_batches.discard(key)
+
+async def send_manifest_files(client: Client, message: Message, batch_id: int, batch_data: dict, message_ids: list, offset: int) -> int:
+    """Send files of a manifest batch, resolving metadata on demand, and return how many were sent"""
+    channel_id = batch_data['manifest'].channel_id
+    
+    # Only messages whose metadata is not cached need a fetch, and those go in one call
+    metas = {msg_id: await client.db.get_message_meta(channel_id, msg_id) for msg_id in message_ids}
+    missing = [msg_id for msg_id, meta in metas.items() if meta is None]
+    for start in range(0, len(missing), MANIFEST_CHUNK_SIZE):
+        for file_msg in await client.get_messages(channel_id, missing[start:start + MANIFEST_CHUNK_SIZE]):
+            if has_media(file_msg):
+                metas[file_msg.id] = get_media_meta(file_msg)
+                await client.db.cache_message_meta(channel_id, file_msg.id, metas[file_msg.id])
+    
+    # Messages gone from the channel since the batch was created leave the batch (and its total) first
+    present = []
+    for msg_id in message_ids:
+        if metas.get(msg_id) is None:
+            await client.db.discard_batch_message(batch_id, msg_id)
+        else:
+            present.append(msg_id)
+    total = batch_data['total_files']
+    
+    sends = []
+    for i, msg_id in enumerate(present, offset + 1):
+        meta = metas[msg_id]
+        caption = f"📁 **File {i}/{total}**\n"
+        caption += f"**Name:** `{meta.get('file_name', 'Unknown')}`\n"
+        caption += f"**Size:** `{meta.get('file_size_human', 'Unknown')}`"
+        
+        sends.append((i, client.delivery.enqueue(message.chat.id, partial(
+            client.copy_message,
+            chat_id=message.chat.id,
+            from_chat_id=channel_id,
+            message_id=msg_id,
+            caption=caption,
+            protect_content=Config.PROTECT_CONTENT
+        ))))
+    
+    await wait_for_sends(sends)
+    return len(sends)
+
+async def wait_for_sends(sends: list):
+    """Wait for queued batch sends, logging the ones that failed"""
+    results = await asyncio.gather(*(future for _, future in sends), return_exceptions=True)
+    for (i, _), result in zip(sends, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error sending file {i}: {result}")
+
+async def notify_queue_position(client: Client, message: Message, priority: bool = False):
+    """Tell the user how long they will wait when the delivery queue is busy"""
+    ahead, wait = client.delivery.estimate(message.chat.id, priority)
+    if wait >= QUEUE_NOTICE_SECONDS:
+        await message.reply_text(
+            f"⏳ **You're in the queue!**\n\n"
+            f"📬 **Deliveries ahead:** `{ahead}`\n"
+            f"⏱️ **Estimated wait:** `{get_readable_time(max(1, int(wait)))}`"
+        )
+
+@Client.on_callback_query(filters.regex(r"batch_more_(\d+)"))
+async def batch_more_callback(client: Client, callback_query: CallbackQuery):
+    """Send the next page of a batch"""
+    user_id = callback_query.from_user.id
+    batch_id = int(callback_query.matches[0].group(1))
+    
+    batch_data = await client.db.get_batch(batch_id, record_access=False)
+    if not batch_data:
+        await callback_query.answer("❌ Batch not found or expired!", show_alert=True)
+        return
+    
+    if not await client.db.get_batch_cursor(user_id, batch_id):
+        await callback_query.answer("❌ Open the batch link again to restart it!", show_alert=True)
+        return
+    
+    await callback_query.answer("📦 Sending more files...")
+    
+    # Drop the button so the same page cannot be requested twice
+    try:
+        await callback_query.message.edit_reply_markup(None)
+    except Exception:
+        pass
+    
+    await send_batch_to_user(client, callback_query.message, user_id, batch_id, batch_data)
 
 async def schedule_message_delete(client: Client, chat_id: int, delay: int):
     """Schedule message deletion after delay"""
@@ -241,18 +404,13 @@ async def handle_private_media(client: Client, message: Message):
     user_id = message.from_user.id
     
     # Check if user is admin or owner
-    if not await client.db.is_admin(user_id):
+    if not is_admin(client, user_id):
         await message.reply_text(
             "❌ Only admins can upload files!\n\n"
             "Use /genlink command to generate links for existing channel posts."
         )
         return
     
-    # Check if user is banned
-    if await client.db.is_user_banned(user_id):
-        await message.reply_text("⚠️ You are banned from using this bot!")
-        return
-    
     # Check file size
     file_size = get_media_file_size(message)
     if file_size > Config.MAX_FILE_SIZE:
@@ -260,26 +418,32 @@ async def handle_private_media(client: Client, message: Message):
         return
     
     try:
-        # Forward file to channel
-        forwarded_msg = await message.forward(Config.CHANNEL_ID)
-        
-        # Save file data
-        file_data = {
-            'user_id': user_id,
-            'channel_id': Config.CHANNEL_ID,
-            'message_id': forwarded_msg.id,
-            'file_name': get_name(message),
-            'file_size': file_size,
-            'file_size_human': f"{file_size / (1024*1024):.2f} MB" if file_size > 1024*1024 else f"{file_size / 1024:.2f} KB",
-            'file_type': get_file_type(message),
-            'file_hash': get_hash(message),
-            'upload_date': message.date.strftime("%Y-%m-%d %H:%M:%S") if message.date else "Unknown"
-        }
-        
-        file_id = await client.db.save_file("", file_data)
+        # Reuse the stored copy if this media was linked before
+        existing = await client.db.find_file_by_hash(get_hash(message))
+        if existing:
+            file_id, file_data = existing
+            await client.db.add_user_file(user_id, file_id)
+        else:
+            # Forward file to channel
+            forwarded_msg = await message.forward(Config.CHANNEL_ID)
+            
+            # Save file data
+            file_data = {
+                'user_id': user_id,
+                'channel_id': Config.CHANNEL_ID,
+                'message_id': forwarded_msg.id,
+                'file_name': get_name(message),
+                'file_size': file_size,
+                'file_size_human': f"{file_size / (1024*1024):.2f} MB" if file_size > 1024*1024 else f"{file_size / 1024:.2f} KB",
+                'file_type': get_file_type(message),
+                'file_hash': get_hash(message),
+                'upload_date': message.date.strftime("%Y-%m-%d %H:%M:%S") if message.date else "Unknown"
+            }
+            
+            file_id = await client.db.save_file("", file_data)
         
         # Generate link
-        encoded_data = encode(file_id)
+        encoded_data = get_file_token(file_id, file_data)
         link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Apply URL shortener if enabled
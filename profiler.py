@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sampling profiler for FileStore Bot
+
+Samples the stack of the event loop thread at a fixed interval of CPU time
+and counts identical stacks. On Unix a SIGPROF interval timer interrupts
+the loop thread exactly where it is running; elsewhere (or off the main
+thread) a background thread snapshots every thread with
+sys._current_frames, which only sees the loop when it releases the GIL.
+The result is written in the collapsed-stack format read by
+flamegraph.pl, speedscope and similar tools, one "frame;frame;frame count"
+line per stack.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Paths under the bot's directory are shown relative to it (plugins/start.py)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+class StackSampler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval  # seconds between samples
+        self.samples: Counter = Counter()  # collapsed stack -> times seen
+        self.sample_count: int = 0
+        self.labels: Dict[object, str] = {}  # code object -> frame label
+    
+    @property
+    def uses_signals(self) -> bool:
+        """Whether the SIGPROF timer can be used from the calling thread"""
+        return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    
+    def frame_label(self, code) -> str:
+        """Label of a frame: function (file)"""
+        label = self.labels.get(code)
+        if label is None:
+            path = code.co_filename
+            if path.startswith(ROOT):
+                path = os.path.relpath(path, ROOT)
+            else:
+                path = os.path.basename(path)
+            label = self.labels[code] = f"{code.co_name} ({path})"
+        return label
+    
+    def record(self, frame, thread_name: str):
+        """Count one stack, outermost frame first"""
+        stack = []
+        while frame is not None:
+            stack.append(self.frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(thread_name)
+        
+        self.samples[";".join(reversed(stack))] += 1
+    
+    def on_signal(self, signum, frame):
+        """SIGPROF handler: runs on the main thread with the interrupted frame"""
+        self.record(frame, "MainThread")
+        self.sample_count += 1
+    
+    def run(self, seconds: float):
+        """Snapshot every other thread until the time is up (blocking, run in a thread)"""
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.record(frame, thread_names.get(thread_id, f"thread-{thread_id}"))
+            self.sample_count += 1
+            time.sleep(self.interval)
+    
+    async def profile(self, seconds: float):
+        """Sample the running process without blocking the event loop"""
+        if not self.uses_signals:
+            await asyncio.get_running_loop().run_in_executor(None, self.run, seconds)
+            return
+        
+        previous = signal.signal(signal.SIGPROF, self.on_signal)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous)
+    
+    def collapsed(self) -> str:
+        """All samples in collapsed-stack format"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+    
+    def hot_spots(self, prefixes: Tuple[str, ...] = ("plugins/", "database/"), limit: int = 5) -> List[Tuple[str, float]]:
+        """Frames under the given paths by share of samples they appear in"""
+        seen = Counter()
+        for stack, count in self.samples.items():
+            for frame in set(stack.split(";")):
+                if frame.endswith(")") and frame.rsplit("(", 1)[-1].startswith(prefixes):
+                    seen[frame] += count
+        
+        total = self.sample_count or 1
+        return [(frame, count / total * 100) for frame, count in seen.most_common(limit)]
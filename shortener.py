@@ -7,20 +7,39 @@ URL Shortener module for FileStore Bot
 import aiohttp
 import asyncio
 import logging
+from collections import OrderedDict
 from typing import Optional
+from urllib.parse import urlsplit
 from config import Config
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 class URLShortener:
-    def __init__(self):
+    def __init__(self, api_base: Optional[str] = None):
         self.enabled = Config.SHORTENER_ENABLED
         self.site = Config.SHORTENER_SITE
         self.api_key = Config.SHORTENER_API_KEY
         self.supported_sites = Config.SUPPORTED_SHORTENERS
+        
+        # Optional base URL that replaces every provider host (e.g. a local stand-in server)
+        self.api_base = (api_base if api_base is not None else Config.SHORTENER_API_BASE).rstrip("/")
+        
+        # Self-hosted resolver (link_server.ShortLinkServer); takes precedence over third-party sites
+        self.resolver = None
+        
+        # (site, long_url) -> short URL; deduplicated file links make repeats common
+        self.cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self.cache_size = 1024
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
     
+    @metrics.instrument("step", "shortener")
     async def shorten_url(self, long_url: str) -> str:
         """Shorten a URL using the configured shortener service"""
+        if self.resolver is not None:
+            return await self.resolver.shorten(long_url)
+        
         if not self.enabled:
             return long_url
         
@@ -35,6 +54,23 @@ class URLShortener:
             logger.error(f"API key required for {self.site} but not provided")
             return long_url
         
+        cache_key = (self.site, long_url)
+        cached = self.cache.get(cache_key)
+        if cached:
+            self.cache.move_to_end(cache_key)
+            self.cache_hits += 1
+            return cached
+        
+        self.cache_misses += 1
+        short_url = await self._shorten(long_url)
+        if short_url != long_url:
+            self.cache[cache_key] = short_url
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return short_url
+    
+    async def _shorten(self, long_url: str) -> str:
+        """Call the configured shortener service"""
         try:
             if self.site == "tinyurl.com":
                 return await self._shorten_tinyurl(long_url)
@@ -62,11 +98,18 @@ class URLShortener:
             logger.error(f"Error shortening URL with {self.site}: {e}")
             return long_url
     
+    def _api_url(self, site: str, default_url: str) -> str:
+        """Get the endpoint for a site, routed through api_base when configured"""
+        if not self.api_base:
+            return default_url
+        path = urlsplit(default_url).path
+        return f"{self.api_base}/{site}{path}"
+    
     async def _shorten_tinyurl(self, long_url: str) -> str:
         """Shorten URL using TinyURL"""
         async with aiohttp.ClientSession() as session:
             params = {"url": long_url}
-            async with session.get("https://tinyurl.com/api-create.php", params=params) as response:
+            async with session.get(self._api_url("tinyurl.com", "https://tinyurl.com/api-create.php"), params=params) as response:
                 if response.status == 200:
                     short_url = await response.text()
                     if short_url.startswith("http"):
@@ -77,7 +120,7 @@ class URLShortener:
         """Shorten URL using is.gd"""
         async with aiohttp.ClientSession() as session:
             params = {"format": "simple", "url": long_url}
-            async with session.get("https://is.gd/create.php", params=params) as response:
+            async with session.get(self._api_url("is.gd", "https://is.gd/create.php"), params=params) as response:
                 if response.status == 200:
                     short_url = await response.text()
                     if short_url.startswith("http"):
@@ -88,7 +131,7 @@ class URLShortener:
         """Shorten URL using v.gd"""
         async with aiohttp.ClientSession() as session:
             params = {"format": "simple", "url": long_url}
-            async with session.get("https://v.gd/create.php", params=params) as response:
+            async with session.get(self._api_url("v.gd", "https://v.gd/create.php"), params=params) as response:
                 if response.status == 200:
                     short_url = await response.text()
                     if short_url.startswith("http"):
@@ -103,7 +146,7 @@ class URLShortener:
                 "Content-Type": "application/json"
             }
             data = {"long_url": long_url}
-            async with session.post("https://api-ssl.bitly.com/v4/shorten", 
+            async with session.post(self._api_url("bit.ly", "https://api-ssl.bitly.com/v4/shorten"), 
                                   headers=headers, json=data) as response:
                 if response.status == 200:
                     result = await response.json()
@@ -118,7 +161,7 @@ class URLShortener:
                 "Content-Type": "application/json"
             }
             data = {"originalURL": long_url}
-            async with session.post("https://api.short.io/links", 
+            async with session.post(self._api_url("short.io", "https://api.short.io/links"), 
                                   headers=headers, json=data) as response:
                 if response.status == 200:
                     result = await response.json()
@@ -133,7 +176,7 @@ class URLShortener:
                 "Content-Type": "application/json"
             }
             data = {"destination": long_url}
-            async with session.post("https://api.rebrandly.com/v1/links", 
+            async with session.post(self._api_url("rebrandly.com", "https://api.rebrandly.com/v1/links"), 
                                   headers=headers, json=data) as response:
                 if response.status == 200:
                     result = await response.json()
@@ -147,7 +190,7 @@ class URLShortener:
                 "key": self.api_key,
                 "short": long_url
             }
-            async with session.get("https://cutt.ly/api/api.php", params=params) as response:
+            async with session.get(self._api_url("cutt.ly", "https://cutt.ly/api/api.php"), params=params) as response:
                 if response.status == 200:
                     result = await response.json()
                     if result.get("url", {}).get("status") == 7:
@@ -162,7 +205,7 @@ class URLShortener:
                 "Content-Type": "application/json"
             }
             data = {"long_url": long_url}
-            async with session.post("https://t.ly/api/v1/link/shorten", 
+            async with session.post(self._api_url("t.ly", "https://t.ly/api/v1/link/shorten"), 
                                   headers=headers, json=data) as response:
                 if response.status == 200:
                     result = await response.json()
@@ -173,7 +216,7 @@ class URLShortener:
         """Shorten URL using gg.gg"""
         async with aiohttp.ClientSession() as session:
             data = {"url": long_url}
-            async with session.post("http://gg.gg/create", data=data) as response:
+            async with session.post(self._api_url("gg.gg", "http://gg.gg/create"), data=data) as response:
                 if response.status == 200:
                     # gg.gg returns HTML, need to parse the short URL
                     html = await response.text()
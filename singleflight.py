@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request coalescing for FileStore Bot
+
+When many users open the same link at once, only the first caller for a
+key does the work; everyone else arriving while it is in flight awaits the
+same result. Nothing is cached once the call completes, so later requests
+always see fresh data.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}  # key -> in-flight call
+        self.stats: Dict[str, int] = {'calls': 0, 'coalesced': 0}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        """Run fn for key, or join the call already in flight for it"""
+        future = self.calls.get(key)
+        if future is None:
+            self.stats['calls'] += 1
+            # Run as its own task so a cancelled caller does not cancel the others
+            future = self.calls[key] = asyncio.ensure_future(fn())
+            future.add_done_callback(lambda _: self.calls.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        
+        return await asyncio.shield(future)
+    
+    @property
+    def in_flight(self) -> int:
+        """Number of keys currently being resolved"""
+        return len(self.calls)
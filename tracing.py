@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Update trace recorder for FileStore Bot
+
+When TRACE_FILE is set, every incoming command, callback and storage
+channel post is appended to the file as one compact JSON line with its
+offset from the start of the session. Only the shape of each update is
+kept: user and chat IDs become small pseudonyms, commands keep just their
+name, /start links their kind and target, media its type and size, and
+free text is reduced to a flag. Traces can therefore leave the server;
+benchmarks/replay.py feeds them back through the plugin handlers against
+a fake client.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, IO, List, Optional, Tuple
+from pyrogram import Client, filters
+from pyrogram.enums import ChatType
+from pyrogram.handlers import MessageHandler, CallbackQueryHandler
+from pyrogram.types import Message, CallbackQuery
+from config import Config
+from auth import is_admin
+from helper_func import decode_link, LINK_FILE, LINK_BATCH, LINK_SIGNED_FILE, has_media, get_media_file_size, get_file_type
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 2
+FLUSH_INTERVAL = 5  # seconds between flushes
+
+# Trace handlers run ahead of every plugin handler (lower groups are dispatched first)
+TRACE_GROUP = -100
+
+class TraceRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.file: Optional[IO] = None
+        self.started: float = 0.0
+        self.flush_task: Optional[asyncio.Task] = None
+        
+        self.pseudonyms: Dict[int, int] = {}  # user/chat ID -> pseudonym
+        self.events: int = 0
+    
+    def start(self):
+        """Open the trace file, write a session header and flush periodically"""
+        self.file = open(self.path, "a")
+        self.started = time.monotonic()
+        self._write({'v': TRACE_VERSION, 'session': int(time.time())})
+        self.flush_task = asyncio.create_task(self.flush_periodically())
+        logger.info(f"Recording update trace to {self.path}")
+    
+    def stop(self):
+        """Flush and close the trace file"""
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        if self.file:
+            self.file.close()
+            self.file = None
+            logger.info(f"Recorded {self.events} updates to {self.path}")
+    
+    async def flush_periodically(self):
+        """Bound how much of the trace a crash can lose"""
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+    
+    def flush(self):
+        if self.file:
+            try:
+                self.file.flush()
+            except OSError as e:
+                logger.error(f"Error flushing update trace: {e}")
+    
+    def pseudonym(self, real_id: int) -> int:
+        """Stable per-session stand-in for a user or chat ID"""
+        pseudonym = self.pseudonyms.get(real_id)
+        if pseudonym is None:
+            pseudonym = self.pseudonyms[real_id] = len(self.pseudonyms) + 1
+        return pseudonym
+    
+    def record(self, event: Dict):
+        """Append one event, stamped with its offset in seconds"""
+        if not self.file:
+            return
+        
+        event['t'] = round(time.monotonic() - self.started, 3)
+        self._write(event)
+        self.events += 1
+    
+    def _write(self, data: Dict):
+        try:
+            self.file.write(json.dumps(data, separators=(",", ":"), ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"Error writing update trace, recording stopped: {e}")
+            self.file = None
+
+def describe_user(client: Client, user_id: int) -> Dict:
+    """Pseudonymous user fields of an event, flagging the owner and admins"""
+    fields = {'u': client.trace.pseudonym(user_id)}
+    if user_id == Config.OWNER_ID:
+        fields['o'] = 1
+    elif is_admin(client, user_id):
+        fields['a'] = 1
+    return fields
+
+async def describe_text(client: Client, text: Optional[str]) -> Dict:
+    """Text fields of an event: the command name and /start link target; free text is recorded as x: null"""
+    if not text:
+        return {}
+    if not text.startswith("/"):
+        return {'x': None}
+    
+    parts = text.split(maxsplit=1)
+    fields = {'x': parts[0].split("@", 1)[0].lower()}
+    link = await describe_link(client, parts[1]) if fields['x'] == "/start" and len(parts) > 1 else None
+    if link:
+        fields['l'] = link
+    return fields
+
+async def describe_link(client: Client, token: str) -> Optional[List]:
+    """What a /start payload points to, so replay can recreate it: [kind, id, files]"""
+    link = decode_link(token)
+    if not link:
+        return None
+    
+    kind, item_id = link
+    if kind == LINK_FILE:
+        return ["f", item_id]
+    if kind == LINK_BATCH:
+        batch_data = await client.db.get_batch(item_id, record_access=False)
+        return ["b", item_id, batch_data.get('total_files', 0) if batch_data else 0]
+    if kind == LINK_SIGNED_FILE:
+        return ["s", item_id[1]]
+    return None
+
+def describe_media(message: Message) -> Dict:
+    """Media fields of an event: type and size, never names or file IDs"""
+    if not has_media(message):
+        return {}
+    return {'f': {'file_type': get_file_type(message), 'file_size': get_media_file_size(message)}}
+
+async def trace_channel_post(client: Client, message: Message):
+    """Record posts in the storage channel"""
+    if message.chat.id != Config.CHANNEL_ID:
+        return
+    
+    client.trace.record({
+        'k': "p", 'm': message.id,
+        **await describe_text(client, message.text or message.caption),
+        **describe_media(message)
+    })
+
+async def trace_message(client: Client, message: Message):
+    """Record commands and uploads sent to the bot"""
+    if not message.from_user:
+        return
+    
+    event = {'k': "m", **describe_user(client, message.from_user.id)}
+    if message.chat.type not in (ChatType.PRIVATE, ChatType.BOT):
+        event['c'] = client.trace.pseudonym(message.chat.id)
+    event.update(await describe_text(client, message.text or message.caption))
+    event.update(describe_media(message))
+    
+    client.trace.record(event)
+
+async def trace_callback(client: Client, callback_query: CallbackQuery):
+    """Record button presses"""
+    client.trace.record({'k': "cb", **describe_user(client, callback_query.from_user.id), 'd': callback_query.data})
+
+def trace_handlers() -> List[Tuple]:
+    """(handler, group) pairs recording every update, registered only while tracing is enabled"""
+    return [
+        (MessageHandler(trace_channel_post, filters.channel), TRACE_GROUP),
+        (MessageHandler(trace_message, ~filters.channel), TRACE_GROUP),
+        (CallbackQueryHandler(trace_callback), TRACE_GROUP),
+    ]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Event loop watchdog for FileStore Bot
+
+A heartbeat task touches a timestamp on the event loop while a daemon
+thread watches it. When the loop goes quiet for longer than the threshold,
+the thread logs what the loop thread is executing right then (the slow
+callback or coroutine step) together with the number of handlers in
+flight at the last heartbeat. Once the loop recovers, the stall is
+counted in the metrics, from the loop thread.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 0.1  # seconds between heartbeats on the loop
+STACK_DEPTH = 8  # frames logged per stall
+
+class Watchdog:
+    def __init__(self, threshold: float = 1.0):
+        self.threshold = threshold  # seconds without a heartbeat that count as a stall
+        
+        self.last_beat: float = time.monotonic()
+        self.handlers_in_flight: int = 0  # as of the last heartbeat
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.beat_task: Optional[asyncio.Task] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+        
+        self.stats: Dict[str, float] = {'stalls': 0, 'stall_seconds': 0.0, 'longest_stall': 0.0}
+        self.last_stall: Optional[str] = None  # stack snippet of the most recent stall
+    
+    @property
+    def enabled(self) -> bool:
+        return self.beat_task is not None
+    
+    def start(self):
+        """Start the heartbeat and the watching thread"""
+        if self.enabled:
+            return
+        
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.beat_task = asyncio.create_task(self.heartbeat())
+        
+        # A fresh event per thread, so a quick off/on never leaves the old thread running
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.watch, args=(self.stopping,), name="loop-watchdog", daemon=True)
+        self.thread.start()
+        metrics.set_gauge("watchdog_enabled", 1)
+        logger.info(f"Watchdog started (threshold {self.threshold}s)")
+    
+    def stop(self):
+        """Stop the heartbeat and the watching thread"""
+        if not self.enabled:
+            return
+        
+        self.beat_task.cancel()
+        self.beat_task = None
+        self.stopping.set()
+        self.thread = None
+        metrics.set_gauge("watchdog_enabled", 0)
+        logger.info("Watchdog stopped")
+    
+    async def heartbeat(self):
+        """Touch the heartbeat timestamp from the event loop"""
+        while True:
+            self.last_beat = time.monotonic()
+            self.handlers_in_flight = metrics.active.get('handler', 0)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+    
+    def watch(self, stopping: threading.Event):
+        """Watch the heartbeat from a separate thread, reporting stalls"""
+        stalled_since = None
+        while not stopping.wait(HEARTBEAT_INTERVAL):
+            gap = time.monotonic() - self.last_beat
+            
+            if gap > self.threshold and stalled_since is None:
+                # Report once per stall, while the loop is still stuck
+                stalled_since = self.last_beat
+                self.report_stall(gap)
+            elif gap <= self.threshold and stalled_since is not None:
+                self.record_stall(self.last_beat - stalled_since - HEARTBEAT_INTERVAL)
+                stalled_since = None
+    
+    def report_stall(self, gap: float):
+        """Log the loop thread's current stack"""
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_DEPTH)) if frame else "  <no frame>\n"
+        self.last_stall = stack
+        
+        logger.warning(
+            f"Event loop blocked for {gap:.2f}s with {self.handlers_in_flight} handlers in flight; "
+            f"loop thread is executing:\n{stack}"
+        )
+    
+    def record_stall(self, duration: float):
+        """Count a finished stall"""
+        self.stats['stalls'] += 1
+        self.stats['stall_seconds'] += duration
+        self.stats['longest_stall'] = max(self.stats['longest_stall'], duration)
+        logger.warning(f"Event loop recovered after a {duration:.2f}s stall")
+        
+        # The metrics registry belongs to the loop thread
+        try:
+            self.loop.call_soon_threadsafe(self.export_stall, duration, self.stats['longest_stall'])
+        except RuntimeError:
+            pass  # loop already closed
+    
+    def export_stall(self, duration: float, longest: float):
+        """Add a finished stall to the metrics, on the event loop"""
+        metrics.inc("watchdog_stalls")
+        metrics.inc("watchdog_stall_seconds", duration)
+        metrics.set_gauge("watchdog_longest_stall_seconds", longest)